@@ -0,0 +1,150 @@
+"""
+Byaj accrued but not yet collected on every rin lagani as of a day. Banki
+sawa and last sawa asuli of all the rin laganis as of the day are loaded in
+one query and byaj is computed over integer paisa arrays with the same rule
+as the sawa asuli window.
+
+Computed accruals are saved as a snapshot of the day. Triggers remove the
+snapshots as of a day a transaction is added, changed or removed on or
+before, so a saved snapshot is always the one that would be computed.
+"""
+from array import array
+from dataclasses import dataclass
+from decimal import Decimal
+
+from sqlalchemy import exc, func, select
+
+from bs_calendar import ordinal_to_str
+from database import (Member, RinLagani, SawaAsuli, AccrualSnapshot,
+                      AccrualSnapshotRow)
+from database_access import BYAJ_RATE
+from expected_collection import calculate_byaj_paisa, to_paisa, to_rupees
+from util import date_to_ordinal
+
+
+@dataclass
+class AccrualDto:
+    rin_lagani_id: int
+    member_id: int
+    account_no: int
+    member_name: str
+    banki_sawa: Decimal
+    start_date: str  # first day of accrued byaj
+    days: int
+    byaj: Decimal
+
+
+def calculate_accruals(session, as_of_ordinal, rate=BYAJ_RATE):
+    """
+    Calculate byaj accrued on every rin lagani with banki sawa as of a day
+    :param session: current database session
+    :param as_of_ordinal: ordinal of the day, accrual includes the day
+    :param rate: yearly byaj rate
+    :return: AccrualDto list ordered by account number
+    """
+    paid = select(
+        SawaAsuli.rin_lagani_id, func.sum(SawaAsuli.amount).label('paid'),
+        func.max(SawaAsuli.date_ordinal).label('last_paid')).where(
+        SawaAsuli.rin_lagani_id != None,
+        SawaAsuli.date_ordinal <= as_of_ordinal).group_by(
+        SawaAsuli.rin_lagani_id).subquery()
+    rows = session.execute(select(
+        RinLagani.id, RinLagani.member_id, Member.account_no, Member.name,
+        RinLagani.amount, RinLagani.date_ordinal, paid.c.paid,
+        paid.c.last_paid).join(
+        Member, Member.id == RinLagani.member_id).outerjoin(
+        paid, paid.c.rin_lagani_id == RinLagani.id).where(
+        RinLagani.date_ordinal <= as_of_ordinal).order_by(
+        Member.account_no, RinLagani.date_ordinal)).all()
+    zero = Decimal(0)
+    banki_sawa = array('q', (a - p for a, p in zip(
+        to_paisa(row.amount for row in rows),
+        to_paisa(zero if row.paid is None else row.paid for row in rows))))
+    # byaj runs from the rin lagani date or the day after last sawa asuli
+    start = array('q', (row.date_ordinal if row.last_paid is None
+                        else row.last_paid + 1 for row in rows))
+    days = array('q', (max(as_of_ordinal - s + 1, 0) for s in start))
+    byaj = calculate_byaj_paisa(banki_sawa, days, rate)
+    return [AccrualDto(
+        rin_lagani_id=row.id, member_id=row.member_id,
+        account_no=row.account_no, member_name=row.name,
+        banki_sawa=to_rupees(banki_sawa[i]),
+        start_date=ordinal_to_str(start[i]), days=days[i],
+        byaj=to_rupees(byaj[i]))
+        for i, row in enumerate(rows) if banki_sawa[i] > 0]
+
+
+def accrual_totals(accruals):
+    return {
+        'banki_sawa': sum((a.banki_sawa for a in accruals), Decimal(0)),
+        'byaj': sum((a.byaj for a in accruals), Decimal(0)),
+    }
+
+
+def read_snapshot(session, as_of_ordinal):
+    """
+    Read accruals saved in the snapshot as of a day
+    :param session: current database session
+    :param as_of_ordinal: ordinal of the day
+    :return: AccrualDto list ordered by account number or None if there is
+    no snapshot of the day
+    """
+    if session.get(AccrualSnapshot, as_of_ordinal) is None:
+        return None
+    rows = session.execute(select(
+        AccrualSnapshotRow, Member.account_no, Member.name).join(
+        Member, Member.id == AccrualSnapshotRow.member_id).where(
+        AccrualSnapshotRow.as_of_ordinal == as_of_ordinal).order_by(
+        Member.account_no, AccrualSnapshotRow.start_ordinal)).all()
+    return [AccrualDto(
+        rin_lagani_id=row.rin_lagani_id, member_id=row.member_id,
+        account_no=account_no, member_name=name, banki_sawa=row.banki_sawa,
+        start_date=ordinal_to_str(row.start_ordinal), days=row.days,
+        byaj=row.byaj) for row, account_no, name in rows]
+
+
+def save_snapshot(session, as_of_ordinal, accruals):
+    """
+    Save accruals as the snapshot of a day
+    :param session: current database session
+    :param as_of_ordinal: ordinal of the day
+    :param accruals: AccrualDto list
+    """
+    totals = accrual_totals(accruals)
+    session.execute(AccrualSnapshot.__table__.insert().values(
+        as_of_ordinal=as_of_ordinal, as_of_date=ordinal_to_str(as_of_ordinal),
+        banki_sawa=totals['banki_sawa'], byaj=totals['byaj']))
+    if accruals:
+        session.execute(AccrualSnapshotRow.__table__.insert(), [
+            {'as_of_ordinal': as_of_ordinal,
+             'rin_lagani_id': accrual.rin_lagani_id,
+             'member_id': accrual.member_id,
+             'banki_sawa': accrual.banki_sawa,
+             'start_ordinal': date_to_ordinal(accrual.start_date),
+             'days': accrual.days, 'byaj': accrual.byaj}
+            for accrual in accruals])
+
+
+def get_accruals(session, as_of_date):
+    """
+    Get byaj accrued on every rin lagani as of a day from its snapshot,
+    calculating and saving the snapshot if there is none. Read only
+    databases are calculated every time.
+    :param session: current database session
+    :param as_of_date: date in format %Y-%m-%d
+    :return: AccrualDto list, totals and whether the snapshot was read
+    """
+    as_of_ordinal = date_to_ordinal(as_of_date)
+    if as_of_ordinal is None:
+        raise ValueError('Invalid date')
+    accruals = read_snapshot(session, as_of_ordinal)
+    from_snapshot = accruals is not None
+    if not from_snapshot:
+        accruals = calculate_accruals(session, as_of_ordinal)
+        try:
+            with session.begin_nested():
+                save_snapshot(session, as_of_ordinal, accruals)
+        except exc.OperationalError as e:
+            if 'readonly' not in str(e.orig):
+                raise
+    return accruals, accrual_totals(accruals), from_snapshot
@@ -0,0 +1,153 @@
+from pathlib import Path
+
+import nepali_datetime
+from PySide2.QtCore import QAbstractTableModel, Qt, Slot
+from PySide2.QtGui import QFont
+from PySide2.QtWidgets import (QMainWindow, QWidget, QTableView, QVBoxLayout,
+                               QHBoxLayout, QLabel, QLineEdit, QPushButton,
+                               QStatusBar, QFileDialog)
+from openpyxl import Workbook
+
+from accrual import get_accruals
+from database import Session
+from util import date_to_str, table_models_to_excel_sheet
+
+
+class AccrualModel(QAbstractTableModel):
+    """Byaj accrued on every rin lagani as of a day with total in last row"""
+    HEADERS = ['Account no', 'Member name', 'Banki sawa', 'Start date',
+               'Days', 'Byaj']
+
+    def __init__(self, *args, **kwargs):
+        super(AccrualModel, self).__init__(*args, **kwargs)
+        self.accruals = []
+        self.totals = {}
+
+    def load_data(self, as_of_date):
+        """
+        Load accruals as of a day
+        :param as_of_date: date in format %Y-%m-%d
+        :return: None if the date is invalid, else whether accruals were read
+        from a saved snapshot
+        """
+        try:
+            with Session.begin() as session:
+                self.accruals, self.totals, from_snapshot = get_accruals(
+                    session, as_of_date)
+        except ValueError:
+            return None
+        self.layoutChanged.emit()
+        return from_snapshot
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+        row = index.row()
+        col = index.column()
+        # total row
+        if row == len(self.accruals):
+            if role == Qt.FontRole:
+                font = QFont()
+                font.setBold(True)
+                return font
+            if role != Qt.DisplayRole:
+                return None
+            if col == 0: return 'Total'
+            if col == 2: return str(self.totals['banki_sawa'])
+            if col == 5: return str(self.totals['byaj'])
+            return None
+        if role != Qt.DisplayRole:
+            return None
+        accrual = self.accruals[row]
+        if col == 0: return str(accrual.account_no)
+        if col == 1: return accrual.member_name
+        if col == 2: return str(accrual.banki_sawa)
+        if col == 3: return accrual.start_date
+        if col == 4: return str(accrual.days)
+        if col == 5: return str(accrual.byaj)
+
+    def headerData(self, section, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+
+    def columnCount(self, parent):
+        return len(self.HEADERS)
+
+    def rowCount(self, parent):
+        return len(self.accruals) + 1 if self.totals else 0
+
+
+class AccrualWindow(QMainWindow):
+    """Show byaj accrued but not yet collected as of a day"""
+
+    def __init__(self, *args, **kwargs):
+        super(AccrualWindow, self).__init__(*args, **kwargs)
+        self.__setup_ui()
+        self.load_data()
+
+    def __setup_ui(self):
+        self.setWindowTitle('Accrued byaj')
+        # as of date
+        date_label = QLabel('As of:')
+        self.date_input = QLineEdit()
+        self.date_input.setInputMask('9999-00-00')
+        self.date_input.setMaximumWidth(120)
+        self.date_input.setText(date_to_str(nepali_datetime.date.today()))
+        show_button = QPushButton('Show')
+        show_button.clicked.connect(self.load_data)
+        export_button = QPushButton('Export')
+        export_button.clicked.connect(self.handle_export)
+        # create layout for date and buttons
+        hbox_layout = QHBoxLayout()
+        hbox_layout.addWidget(date_label)
+        hbox_layout.addWidget(self.date_input)
+        hbox_layout.addWidget(show_button)
+        hbox_layout.addWidget(export_button)
+        hbox_layout.addStretch()
+        # create table
+        self.model = AccrualModel()
+        self.accrual_table = QTableView()
+        self.accrual_table.setModel(self.model)
+        # create layout
+        vbox_layout = QVBoxLayout()
+        vbox_layout.addLayout(hbox_layout)
+        vbox_layout.addWidget(self.accrual_table)
+        # create wrapper widget
+        widget = QWidget()
+        widget.setLayout(vbox_layout)
+        # set central widget
+        self.setCentralWidget(widget)
+        self.setStatusBar(QStatusBar())
+
+    def status_bar_message(self, msg):
+        self.statusBar().clearMessage()
+        self.statusBar().showMessage(msg, 5000)
+
+    @Slot()
+    def load_data(self):
+        from_snapshot = self.model.load_data(self.date_input.text())
+        if from_snapshot is None:
+            self.status_bar_message('Invalid date.')
+            return
+        self.accrual_table.resizeColumnsToContents()
+        self.status_bar_message('Loaded saved snapshot.' if from_snapshot
+                                else 'Calculated accrued byaj.')
+
+    @Slot()
+    def handle_export(self):
+        name = f'accrued-byaj-{self.date_input.text()}'
+        default_path = str(Path.home().joinpath(name + '.xlsx'))
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save", default_path,
+                                                   "Excel (*.xlsx )")
+        # if no file selected return
+        if file_name == '':
+            return
+        # save model to workbook
+        wb = Workbook()
+        ws = wb.active
+        ws.title = name
+        table_models_to_excel_sheet([self.model], ws)
+        try:
+            wb.save(file_name)
+        except IOError as ex:
+            self.status_bar_message('Could not save file')
@@ -0,0 +1,136 @@
+"""
+Closed years are copied to a read only archive database before complete_year
+removes their history from the live database. Archives are catalogued in the
+archives table of the live database.
+"""
+import os
+import stat
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.schema import CreateTable
+
+from database import (Settings, Member, RinLagani, SawaAsuli, BankTransaction,
+                      MemberTotals, DailyRollup, track_money_storage)
+from bs_calendar import ordinal_to_str
+from util import date_to_ordinal
+
+# tables copied to the archive, the ledger as it was when the year was
+# closed. Settings record whether the archive stores money as paisa.
+ARCHIVED_TABLES = [model.__table__ for model in (
+    Settings, Member, RinLagani, SawaAsuli, BankTransaction, MemberTotals,
+    DailyRollup)]
+
+
+def archive_directory(engine):
+    """
+    Return the directory where archives of the engine's database are kept
+    :param engine: live database engine
+    :return: path of archives directory next to the database file
+    """
+    database = engine.url.database
+    if not database:
+        raise ValueError('in memory database has no archive directory')
+    return os.path.join(os.path.dirname(os.path.abspath(database)),
+                        'archives')
+
+
+def archive_path(directory, year_start_date):
+    """
+    Return path of the archive for the year ending before year start date
+    :param directory: archives directory
+    :param year_start_date: start date of the next year in format %Y-%m-%d
+    :return: archive file path
+    """
+    year_end_date = ordinal_to_str(date_to_ordinal(year_start_date) - 1)
+    return os.path.join(directory, f'data_until_{year_end_date}.db')
+
+
+def archive_year(engine, year_start_date, directory=None):
+    """
+    Copy the ledger to a compacted, indexed and read only archive database.
+    Must run before complete_year, outside any transaction of the engine.
+    :param engine: live database engine
+    :param year_start_date: start date of the next year in format %Y-%m-%d
+    :param directory: archives directory, next to the database by default
+    :return: archive file path
+    """
+    if date_to_ordinal(year_start_date) is None:
+        raise ValueError('Invalid year start date')
+    if directory is None:
+        directory = archive_directory(engine)
+    os.makedirs(directory, exist_ok=True)
+    path = archive_path(directory, year_start_date)
+    if os.path.exists(path):
+        raise FileExistsError(f'archive {path} already exists')
+    staging = path + '.tmp'
+    if os.path.exists(staging):
+        os.remove(staging)
+
+    staging_engine = create_engine(f'sqlite:///{staging}')
+    try:
+        # create tables without indexes, they are built after the bulk copy
+        with staging_engine.begin() as connection:
+            for table in ARCHIVED_TABLES:
+                connection.execute(CreateTable(table))
+        staging_engine.dispose()
+        copy_tables(engine, staging)
+        with staging_engine.begin() as connection:
+            for table in ARCHIVED_TABLES:
+                for index in table.indexes:
+                    index.create(connection)
+            connection.execute(text('ANALYZE'))
+        # compact into the final file
+        with staging_engine.connect() as connection:
+            connection.execute(text('VACUUM INTO :path'), {'path': path})
+    finally:
+        staging_engine.dispose()
+        if os.path.exists(staging):
+            os.remove(staging)
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+    return path
+
+
+def remove_archive(path):
+    """
+    Delete an archive which was not catalogued, when closing the year failed
+    after archive_year
+    :param path: archive file path
+    """
+    # read only files can not be deleted on Windows
+    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+    os.remove(path)
+
+
+def copy_tables(engine, path):
+    """
+    Copy archived tables of the live database to the database at path with
+    ATTACH and INSERT ... SELECT in a single transaction.
+    :param engine: live database engine
+    :param path: archive database path having the archived tables
+    """
+    # writes to the attached archive are not mirrored by a working copy
+    with engine.connect().execution_options(mirror=False) as connection:
+        connection.execute(text('ATTACH DATABASE :path AS archive'),
+                           {'path': path})
+        try:
+            with connection.begin():
+                for table in ARCHIVED_TABLES:
+                    columns = ', '.join(column.name
+                                        for column in table.columns)
+                    connection.execute(text(
+                        f'INSERT INTO archive.{table.name} ({columns}) '
+                        f'SELECT {columns} FROM main.{table.name}'))
+        finally:
+            connection.execute(text('DETACH DATABASE archive'))
+
+
+def open_archive(path):
+    """
+    Create a read only engine for an archive database. Money is read in the
+    unit the archive was written in, whatever the live database uses now.
+    :param path: archive file path
+    :return: database engine
+    """
+    engine = create_engine(f'sqlite:///file:{path}?mode=ro&uri=true')
+    track_money_storage(engine)
+    return engine
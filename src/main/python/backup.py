@@ -0,0 +1,153 @@
+"""
+Online backups of the database file. The sqlite3 backup API copies the
+database a few pages at a time while the application keeps using it. Copies
+are checked with PRAGMA integrity_check, compressed with gzip and rotated.
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from PySide2.QtCore import QObject, QTimer, Signal
+
+from working_copy import flush_working_copy
+
+# pages copied in a single backup step
+BACKUP_PAGES = 64
+# pause between steps so that writers are not kept waiting
+BACKUP_STEP_PAUSE = 0.005
+# number of backups kept for a database
+BACKUPS_KEPT = 10
+# minutes between scheduled backups
+BACKUP_INTERVAL = 60
+
+
+def backup_directory(path):
+    """
+    Return the directory where backups of the database file are kept
+    :param path: database file path
+    :return: path of backups directory next to the database file
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), 'backups')
+
+
+def backup_database(path, directory=None, keep=BACKUPS_KEPT, progress=None,
+                    pages=BACKUP_PAGES):
+    """
+    Back up a database file while it is in use. Writes of its working copy
+    still queued in write-behind mode are written to the file first.
+    :param path: database file path
+    :param directory: backups directory, next to the database by default
+    :param keep: number of newest backups of the database to keep
+    :param progress: optional callable taking copied and total pages
+    :param pages: pages copied in a single step
+    :return: path of the compressed backup
+    """
+    if directory is None:
+        directory = backup_directory(path)
+    os.makedirs(directory, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    timestamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    copy_path = os.path.join(directory, f'{name}_{timestamp}.db')
+    backup_path = copy_path + '.gz'
+    flush_working_copy(path)
+
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+        time.sleep(BACKUP_STEP_PAUSE)
+
+    source = sqlite3.connect(path)
+    copy = sqlite3.connect(copy_path)
+    try:
+        source.backup(copy, pages=pages, progress=step)
+        result = copy.execute('PRAGMA integrity_check').fetchall()
+        if result != [('ok',)]:
+            raise sqlite3.DatabaseError(
+                f'backup failed integrity check: {result}')
+        copy.close()
+        with open(copy_path, 'rb') as copy_file, \
+                gzip.open(backup_path, 'wb') as backup_file:
+            shutil.copyfileobj(copy_file, backup_file)
+    except Exception:
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
+        raise
+    finally:
+        source.close()
+        copy.close()
+        os.remove(copy_path)
+    rotate_backups(directory, name, keep)
+    return backup_path
+
+
+def rotate_backups(directory, name, keep):
+    """
+    Delete all but the newest backups of a database
+    :param directory: backups directory
+    :param name: database file name without extension
+    :param keep: number of newest backups to keep
+    """
+    # timestamps in file names sort in creation order
+    backups = sorted(glob.glob(os.path.join(directory, f'{name}_*.db.gz')))
+    for backup in backups[:-keep]:
+        os.remove(backup)
+
+
+def restore_backup(backup_path, path):
+    """
+    Decompress a backup to the given database file path
+    :param backup_path: compressed backup path
+    :param path: database file path to write, must not exist
+    """
+    with gzip.open(backup_path, 'rb') as backup_file, \
+            open(path, 'xb') as database_file:
+        shutil.copyfileobj(backup_file, database_file)
+
+
+class BackupService(QObject):
+    """Runs scheduled backups in a background thread"""
+    backup_finished = Signal(str)
+    backup_failed = Signal(str)
+
+    def __init__(self, database_path, interval=BACKUP_INTERVAL, *args,
+                 **kwargs):
+        """
+        :param database_path: callable returning path of the database file to
+        back up, or None when there is no file
+        :param interval: minutes between backups
+        """
+        super(BackupService, self).__init__(*args, **kwargs)
+        self.database_path = database_path
+        self.thread = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.start_backup)
+        self.timer.start(interval * 60 * 1000)
+
+    def start_backup(self):
+        """Start a backup unless one is running."""
+        path = self.database_path()
+        if path is None or self.is_running():
+            return
+        self.thread = threading.Thread(target=self.run_backup, args=(path,),
+                                       daemon=True)
+        self.thread.start()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def wait(self):
+        """Wait for the running backup to finish."""
+        if self.thread is not None:
+            self.thread.join()
+
+    def run_backup(self, path):
+        # signals are delivered to the GUI thread
+        try:
+            self.backup_finished.emit(backup_database(path))
+        except Exception as e:
+            self.backup_failed.emit(str(e))
@@ -0,0 +1,148 @@
+"""
+Bikram Sambat calendar tables built once from the bundled calendar_bs.csv.
+Day ordinals match nepali_datetime.date.toordinal().
+"""
+import csv
+import os
+from array import array
+from bisect import bisect_right
+
+from nepali_datetime import config
+
+# bundled resource while running from source, nepali_datetime's own copy of
+# the same file otherwise (fbs places bundled resources there when frozen)
+CALENDAR_PATHS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                 'resources', 'base', 'nepali_datetime', 'data',
+                 'calendar_bs.csv'),
+    config.CALENDAR_PATH
+]
+
+
+def load_calendar():
+    """
+    Read days in every month of every year from calendar_bs.csv.
+    :return: first year and list of days in each month of every year
+    """
+    path = next(p for p in CALENDAR_PATHS if os.path.exists(p))
+    with open(path) as calendar_file:
+        reader = csv.reader(calendar_file)
+        next(reader)  # skip header
+        rows = [[int(value) for value in row] for row in reader if row]
+    return rows[0][0], [row[1:] for row in rows]
+
+
+MIN_YEAR, _years = load_calendar()
+MAX_YEAR = MIN_YEAR + len(_years) - 1
+# days in month at index (year - MIN_YEAR) * 12 + month - 1
+_days_in_month = array('i', [days for year in _years for days in year])
+# ordinal of the first day of month at the same index, with one extra entry
+# for the day after the last month
+_month_start = array('i', [1])
+for _days in _days_in_month:
+    _month_start.append(_month_start[-1] + _days)
+MAX_ORDINAL = _month_start[-1] - 1
+
+
+def _month_index(year, month):
+    return (year - MIN_YEAR) * 12 + month - 1
+
+
+def is_valid(year, month, day):
+    """
+    Check if year, month and day make a date inside the calendar
+    :return: True or False
+    """
+    if not (MIN_YEAR <= year <= MAX_YEAR and 1 <= month <= 12):
+        return False
+    return 1 <= day <= _days_in_month[_month_index(year, month)]
+
+
+def days_in_month(year, month):
+    """
+    Return the number of days in the given month
+    :param year: BS year
+    :param month: BS month
+    :return: number of days
+    """
+    return _days_in_month[_month_index(year, month)]
+
+
+def to_ordinal(year, month, day):
+    """
+    Convert year, month and day to day ordinal. The date is not validated.
+    :return: day ordinal
+    """
+    return _month_start[_month_index(year, month)] + day - 1
+
+
+def from_ordinal(ordinal):
+    """
+    Convert day ordinal to year, month and day
+    :param ordinal: day ordinal
+    :return: tuple of year, month and day
+    """
+    if not 1 <= ordinal <= MAX_ORDINAL:
+        raise ValueError(f'ordinal {ordinal} out of range')
+    index = bisect_right(_month_start, ordinal) - 1
+    year, month = divmod(index, 12)
+    return MIN_YEAR + year, month + 1, ordinal - _month_start[index] + 1
+
+
+def parse_ordinal(date_string):
+    """
+    Convert a string in format %Y-%m-%d to day ordinal
+    :param date_string: date string to be converted
+    :return: day ordinal or None if the date string is not valid
+    """
+    values = date_string.split('-')
+    if len(values) != 3:
+        return None
+    try:
+        year, month, day = int(values[0]), int(values[1]), int(values[2])
+    except ValueError:
+        return None
+    if not is_valid(year, month, day):
+        return None
+    return to_ordinal(year, month, day)
+
+
+def ordinal_to_str(ordinal):
+    """
+    Convert day ordinal to string in format %Y-%m-%d
+    :param ordinal: day ordinal
+    :return: date string
+    """
+    return '%04d-%02d-%02d' % from_ordinal(ordinal)
+
+
+def month_start_ordinal(ordinal):
+    """
+    Return ordinal of the first day of the given day's month
+    :param ordinal: day ordinal
+    :return: day ordinal
+    """
+    return _month_start[bisect_right(_month_start, ordinal) - 1]
+
+
+def month_end_ordinal(ordinal):
+    """
+    Return ordinal of the last day of the given day's month
+    :param ordinal: day ordinal
+    :return: day ordinal
+    """
+    return _month_start[bisect_right(_month_start, ordinal)] - 1
+
+
+def days_between(start_date_string, end_date_string):
+    """
+    Return the number of days from start date to end date
+    :param start_date_string: start date in format %Y-%m-%d
+    :param end_date_string: end date in format %Y-%m-%d
+    :return: number of days or None if any date is not valid
+    """
+    start = parse_ordinal(start_date_string)
+    end = parse_ordinal(end_date_string)
+    if start is None or end is None:
+        return None
+    return end - start
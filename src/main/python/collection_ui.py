@@ -0,0 +1,216 @@
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+import nepali_datetime
+from PySide2.QtCore import QAbstractTableModel, Qt, Slot, Signal
+from PySide2.QtGui import QColor, QIcon
+from PySide2.QtWidgets import (QMainWindow, QWidget, QTableView, QVBoxLayout,
+                               QHBoxLayout, QLabel, QLineEdit, QPushButton,
+                               QStatusBar, QFileDialog)
+from openpyxl import Workbook
+
+from database import Session
+from database_access import save_sawa_asulis_bulk
+from expected_collection import get_expected_collections, to_sawa_asulis
+from util import date_to_str, table_models_to_excel_sheet
+
+
+class CollectionModel(QAbstractTableModel):
+    """Sawa asuli of every member for a collection day"""
+    HEADERS = ['Account no', 'Member name', 'Lagani rin', 'Start date',
+               'Days', 'Amount', 'Byaj', 'Harjana', 'Bachat', 'Remarks',
+               'Error']
+    # editable columns and SawaAsuliDto fields they edit
+    EDITABLE = {5: 'amount', 6: 'byaj', 7: 'harjana', 8: 'bachat',
+                9: 'remarks'}
+
+    def __init__(self, *args, **kwargs):
+        super(CollectionModel, self).__init__(*args, **kwargs)
+        self.collections = []
+        self.sawa_asulis = []
+        self.errors = {}
+
+    def load_data(self, date):
+        """
+        Pre-fill sawa asulis of all members with the expected collection
+        :param date: collection date in format %Y-%m-%d
+        :return: False if the date is invalid
+        """
+        try:
+            with Session.begin() as session:
+                self.collections = get_expected_collections(session, date)
+        except ValueError:
+            return False
+        self.sawa_asulis = to_sawa_asulis(self.collections, date)
+        self.errors = {}
+        self.layoutChanged.emit()
+        return True
+
+    def entered_sawa_asulis(self):
+        """
+        Get sawa asulis having any amount entered
+        :return: list of row and SawaAsuliDto
+        """
+        zero = Decimal(0)
+        return [(row, sawa_asuli)
+                for row, sawa_asuli in enumerate(self.sawa_asulis)
+                if (sawa_asuli.amount > zero or sawa_asuli.byaj > zero
+                    or sawa_asuli.harjana > zero or sawa_asuli.bachat > zero)]
+
+    def set_errors(self, errors):
+        """
+        Show errors of rows
+        :param errors: dict of row and errors
+        """
+        self.errors = errors
+        self.layoutChanged.emit()
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+        row = index.row()
+        col = index.column()
+        collection = self.collections[row]
+        sawa_asuli = self.sawa_asulis[row]
+        if role == Qt.BackgroundRole and row in self.errors:
+            return QColor('#f8d7da')
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        if col == 0: return str(collection.account_no)
+        if col == 1: return collection.member_name
+        if col == 2: return str(collection.banki_sawa)
+        if col == 3: return collection.start_date
+        if col == 4: return str(collection.days)
+        if col in self.EDITABLE:
+            value = getattr(sawa_asuli, self.EDITABLE[col])
+            return value if col == 9 else str(value)
+        if col == 10: return '\n'.join(self.errors.get(row, {}).values())
+
+    def setData(self, index, value, role):
+        if role != Qt.EditRole or index.column() not in self.EDITABLE:
+            return False
+        field = self.EDITABLE[index.column()]
+        if field != 'remarks':
+            try:
+                value = Decimal(value)
+            except InvalidOperation:
+                return False
+        setattr(self.sawa_asulis[index.row()], field, value)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() in self.EDITABLE:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def headerData(self, section, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+
+    def columnCount(self, parent):
+        return len(self.HEADERS)
+
+    def rowCount(self, parent):
+        return len(self.sawa_asulis)
+
+
+class CollectionWindow(QMainWindow):
+    """Enter sawa asulis of many members for a day and save them at once"""
+    collections_saved = Signal()
+
+    def __init__(self, app_ctxt, *args, **kwargs):
+        super(CollectionWindow, self).__init__(*args, **kwargs)
+        self.app_ctxt = app_ctxt
+        self.__setup_ui()
+        self.load_data()
+
+    def __setup_ui(self):
+        self.setWindowTitle('Collection day')
+        # collection date
+        date_label = QLabel('Date:')
+        self.date_input = QLineEdit()
+        self.date_input.setInputMask('9999-00-00')
+        self.date_input.setMaximumWidth(120)
+        self.date_input.setText(date_to_str(nepali_datetime.date.today()))
+        fill_button = QPushButton('Fill')
+        fill_button.clicked.connect(self.load_data)
+        save_icon = QIcon(self.app_ctxt.get_resource('save-32.png'))
+        save_button = QPushButton(save_icon, 'Save all')
+        save_button.clicked.connect(self.save_collections)
+        export_button = QPushButton('Export')
+        export_button.clicked.connect(self.handle_export)
+        # create layout for date and buttons
+        hbox_layout = QHBoxLayout()
+        hbox_layout.addWidget(date_label)
+        hbox_layout.addWidget(self.date_input)
+        hbox_layout.addWidget(fill_button)
+        hbox_layout.addWidget(save_button)
+        hbox_layout.addWidget(export_button)
+        hbox_layout.addStretch()
+        # create table
+        self.model = CollectionModel()
+        self.collection_table = QTableView()
+        self.collection_table.setModel(self.model)
+        # create layout
+        vbox_layout = QVBoxLayout()
+        vbox_layout.addLayout(hbox_layout)
+        vbox_layout.addWidget(self.collection_table)
+        # create wrapper widget
+        widget = QWidget()
+        widget.setLayout(vbox_layout)
+        # set central widget
+        self.setCentralWidget(widget)
+        self.setStatusBar(QStatusBar())
+
+    def status_bar_message(self, msg):
+        self.statusBar().clearMessage()
+        self.statusBar().showMessage(msg, 5000)
+
+    @Slot()
+    def load_data(self):
+        if not self.model.load_data(self.date_input.text()):
+            self.status_bar_message('Invalid date.')
+            return
+        self.collection_table.resizeColumnsToContents()
+
+    @Slot()
+    def save_collections(self):
+        entered = self.model.entered_sawa_asulis()
+        if not entered:
+            self.status_bar_message('No sawa asuli entered.')
+            return
+        # sawa asulis are validated and saved in a single transaction
+        with Session.begin() as session:
+            errors = save_sawa_asulis_bulk(
+                session, [sawa_asuli for _, sawa_asuli in entered])
+        # map errors back to table rows
+        self.model.set_errors({entered[index][0]: error
+                               for index, error in errors.items()})
+        if errors:
+            self.status_bar_message(
+                f'{len(errors)} sawa asulis have errors, nothing saved.')
+        else:
+            self.status_bar_message(f'Saved {len(entered)} sawa asulis.')
+            self.collections_saved.emit()
+            self.load_data()
+
+    @Slot()
+    def handle_export(self):
+        name = f'collection-{self.date_input.text()}'
+        default_path = str(Path.home().joinpath(name + '.xlsx'))
+        file_name, _ = QFileDialog.getSaveFileName(self, "Save", default_path,
+                                                   "Excel (*.xlsx )")
+        # if no file selected return
+        if file_name == '':
+            return
+        # save model to workbook
+        wb = Workbook()
+        ws = wb.active
+        ws.title = name
+        table_models_to_excel_sheet([self.model], ws)
+        try:
+            wb.save(file_name)
+        except IOError as ex:
+            self.status_bar_message('Could not save file')
@@ -1,17 +1,229 @@
 import enum
-from decimal import Decimal
+import os
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
 
 from sqlalchemy import (
     create_engine, Column, Integer, String, Numeric, Boolean,
-    Enum, CheckConstraint, ForeignKey
+    Enum, CheckConstraint, ForeignKey, Index, FetchedValue, event, inspect,
+    select, text
 )
 from sqlalchemy.orm import relationship, declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.types import TypeDecorator
+
+from util import date_to_ordinal
+
+# pragmas applied on every connection, see apply_storage_profile
+STORAGE_PROFILES = {
+    # readers do not block writers, fsync only at checkpoints
+    'default': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative size is in KiB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # fsync every commit, no memory mapped I/O
+    'durability': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'mmap_size': 0,
+        'cache_size': -16 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 10000,
+    },
+}
+
+
+def apply_storage_profile(engine, profile='default'):
+    """
+    Apply pragmas of a storage profile on every new connection of the engine.
+    :param engine: SQLite database engine
+    :param profile: name of profile in STORAGE_PROFILES or dict of pragmas
+    """
+    pragmas = profile
+    if isinstance(profile, str):
+        pragmas = STORAGE_PROFILES[profile]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+
+
+def use_explicit_transactions(engine):
+    """
+    Stop pysqlite from beginning and committing transactions by itself and
+    begin them explicitly on every connection of the engine. pysqlite does
+    not begin a transaction before SAVEPOINT, so releasing a savepoint would
+    commit everything written before it.
+    :param engine: SQLite database engine
+    """
+    def disable_implicit_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    def begin_transaction(connection):
+        connection.exec_driver_sql('BEGIN')
+
+    event.listen(engine, 'connect', disable_implicit_transactions)
+    event.listen(engine, 'begin', begin_transaction)
+
+
+# database used when none is given, file path or MEMORY_DATABASE
+DATABASE_ENV = 'SBTTK_DATABASE'
+DEFAULT_DATABASE = 'data.db'
+MEMORY_DATABASE = ':memory:'
 
-db_path = 'sqlite:///data.db'
-# db_path = 'sqlite://'
-engine = create_engine(db_path)  # create engine
 Base = declarative_base()  # create declarative base class
-Session = sessionmaker(bind=engine)  # create session maker
+# bound to the configured engine by configure_database
+Session = sessionmaker()  # create session maker
+engine = None
+
+
+def database_url(database, read_only=False, shared_cache=False):
+    """
+    Create SQLite URL for a database.
+    :param database: file path or MEMORY_DATABASE, shared cache in memory
+    databases are shared by all engines of the process
+    :param read_only: open the database file read only
+    :param shared_cache: share page cache between connections of the process
+    :return: database URL
+    """
+    options = []
+    if database == MEMORY_DATABASE:
+        if not shared_cache:
+            return 'sqlite://'
+        database = 'memdb'
+        options.append('mode=memory')
+    elif read_only:
+        options.append('mode=ro')
+    if shared_cache:
+        options.append('cache=shared')
+    if not options:
+        return f'sqlite:///{database}'
+    return f'sqlite:///file:{database}?{"&".join(options)}&uri=true'
+
+
+def create_database_engine(database=None, read_only=False, shared_cache=False,
+                           profile=None):
+    """
+    Create an engine for a database with storage profile applied.
+    :param database: file path or MEMORY_DATABASE, defaults to SBTTK_DATABASE
+    environment variable or data.db
+    :param read_only: open the database file read only
+    :param shared_cache: share page cache between connections of the process
+    :param profile: storage profile, defaults to SBTTK_STORAGE_PROFILE
+    environment variable or 'default'
+    :return: database engine
+    """
+    if database is None:
+        database = os.environ.get(DATABASE_ENV, DEFAULT_DATABASE)
+    if profile is None:
+        profile = os.environ.get('SBTTK_STORAGE_PROFILE', 'default')
+    url = database_url(database, read_only, shared_cache)
+    if database == MEMORY_DATABASE:
+        # every connection of the engine must see the same database
+        database_engine = create_engine(
+            url, poolclass=StaticPool,
+            connect_args={'check_same_thread': False})
+    else:
+        database_engine = create_engine(url)
+    pragmas = profile
+    if isinstance(profile, str):
+        pragmas = STORAGE_PROFILES[profile]
+    if read_only:
+        # journal mode can not be changed without writing
+        pragmas = {name: value for name, value in pragmas.items()
+                   if name != 'journal_mode'}
+    apply_storage_profile(database_engine, pragmas)
+    use_explicit_transactions(database_engine)
+    track_money_storage(database_engine)
+    return database_engine
+
+
+def configure_database(database=None, read_only=False, shared_cache=False,
+                       profile=None):
+    """
+    Create the application engine and bind Session to it. Modules using
+    Session use the new database from then on.
+    :param database: see create_database_engine
+    :param read_only: open the database file read only
+    :param shared_cache: share page cache between connections of the process
+    :param profile: see create_database_engine
+    :return: database engine
+    """
+    return use_engine(create_database_engine(database, read_only,
+                                             shared_cache, profile))
+
+
+def use_engine(database_engine):
+    """
+    Make an existing engine the application engine and bind Session to it.
+    :param database_engine: database engine
+    :return: database engine
+    """
+    global engine
+    engine = database_engine
+    Session.configure(bind=engine)
+    return engine
+
+
+def get_database_path():
+    """
+    Return file path of the application database
+    :return: database file path or None for in memory databases
+    """
+    database = get_engine().url.database
+    if not database or database == MEMORY_DATABASE:
+        return None
+    if database.startswith('file:'):
+        database = database[len('file:'):]
+    return database
+
+
+def get_engine():
+    """
+    Return the application engine, configuring the default database if no
+    database is configured yet.
+    :return: database engine
+    """
+    if engine is None:
+        configure_database()
+    return engine
+
+
+def is_money_in_paisa(dialect):
+    """
+    Whether money of the engine owning the dialect is stored as integer
+    paisa, see track_money_storage
+    :param dialect: dialect of a database engine
+    :return: True if money is stored as paisa
+    """
+    return getattr(dialect, 'money_in_paisa', False)
+
+
+class Money(TypeDecorator):
+    """
+    Decimal rupees stored as Numeric(13, 2) or, when money_in_paisa is
+    enabled for the database, as integer paisa.
+    """
+    impl = Numeric(13, 2)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not is_money_in_paisa(dialect):
+            return value
+        return int((Decimal(value) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+    def process_result_value(self, value, dialect):
+        if value is None or not is_money_in_paisa(dialect):
+            return value
+        return (Decimal(value) / 100).quantize(Decimal('0.01'))
 
 
 class Member(Base):
@@ -40,15 +252,24 @@ class RinLagani(Base):
 
     id = Column(Integer, primary_key=True)
     date = Column(String(10), nullable=False)
-    amount = Column(Numeric(13, 2), nullable=False, default=Decimal(0))
+    date_ordinal = Column(Integer, index=True)
+    amount = Column(Money(), nullable=False, default=Decimal(0))
     is_alya_rin = Column(Boolean, default=False)
-    kista_per_month = Column(Numeric(13, 2), nullable=False)
+    kista_per_month = Column(Money(), nullable=False)
     remarks = Column(String)
     member_id = Column(Integer, ForeignKey('members.id'), nullable=False)
+    # maintained by triggers, see BANKI_SAWA_TRIGGERS
+    banki_sawa = Column(Money(), nullable=False, server_default='0',
+                        server_onupdate=FetchedValue())
 
     member = relationship('Member', back_populates='rin_laganis')
     sawa_asulis = relationship('SawaAsuli', back_populates='rin_lagani')
 
+    __table_args__ = (
+        Index('ix_rinlaganis_member_id_date_ordinal', 'member_id',
+              'date_ordinal'),
+    )
+
     def __repr__(self):
         if self.id is None or self.date is None or self.amount is None:
             return 'RinLagani<>'
@@ -61,10 +282,11 @@ class SawaAsuli(Base):
 
     id = Column(Integer, primary_key=True)
     date = Column(String(10), nullable=False)
-    amount = Column(Numeric(13, 2), nullable=False, default=Decimal(0))
-    byaj = Column(Numeric(13, 2), nullable=False, default=Decimal(0))
-    harjana = Column(Numeric(13, 2), nullable=False, default=Decimal(0))
-    bachat = Column(Numeric(13, 2), nullable=False, default=Decimal(0))
+    date_ordinal = Column(Integer, index=True)
+    amount = Column(Money(), nullable=False, default=Decimal(0))
+    byaj = Column(Money(), nullable=False, default=Decimal(0))
+    harjana = Column(Money(), nullable=False, default=Decimal(0))
+    bachat = Column(Money(), nullable=False, default=Decimal(0))
     remarks = Column(String())
     rin_lagani_id = Column(Integer, ForeignKey('rinlaganis.id'))
     member_id = Column(Integer, ForeignKey('members.id'))
@@ -72,6 +294,13 @@ class SawaAsuli(Base):
     member = relationship('Member', back_populates='sawa_asulis')
     rin_lagani = relationship('RinLagani', back_populates='sawa_asulis')
 
+    __table_args__ = (
+        Index('ix_sawaasulis_member_id_date_ordinal', 'member_id',
+              'date_ordinal'),
+        Index('ix_sawaasulis_rin_lagani_id_date_ordinal', 'rin_lagani_id',
+              'date_ordinal'),
+    )
+
     def __repr__(self):
         if not (self.id is None or self.date is None or self.amount is None
                 or self.harjana is None or self.bachat is None):
@@ -93,7 +322,8 @@ class BankTransaction(Base):
 
     id = Column(Integer, primary_key=True)
     date = Column(String(10), nullable=False)
-    amount = Column(Numeric(13, 2), nullable=False, default=Decimal(0))
+    date_ordinal = Column(Integer, index=True)
+    amount = Column(Money(), nullable=False, default=Decimal(0))
     type = Column(Enum(BankTransactionTypes), nullable=False)
     remarks = Column(String())
 
@@ -104,9 +334,759 @@ class BankTransaction(Base):
         self.date, self.amount, self.type)
 
 
+class MemberTotals(Base):
+    """Lifetime ledger totals of a member, maintained by triggers"""
+    __tablename__ = 'member_totals'
+
+    member_id = Column(Integer, ForeignKey('members.id'), primary_key=True)
+    alya_rin = Column(Money(), nullable=False, server_default='0')
+    rin_lagani = Column(Money(), nullable=False, server_default='0')
+    sawa_asuli = Column(Money(), nullable=False, server_default='0')
+    byaj = Column(Money(), nullable=False, server_default='0')
+    harjana = Column(Money(), nullable=False, server_default='0')
+    bachat = Column(Money(), nullable=False, server_default='0')
+    banki_sawa = Column(Money(), nullable=False, server_default='0')
+    last_transaction_date = Column(String(10))
+    last_transaction_ordinal = Column(Integer)
+
+
+class DailyRollup(Base):
+    """
+    Totals of a single day along with cumulative totals of all the days up to
+    and including it, maintained by triggers
+    """
+    __tablename__ = 'daily_rollups'
+
+    day_ordinal = Column(Integer, primary_key=True, autoincrement=False)
+    sawa_asuli = Column(Money(), nullable=False, server_default='0')
+    byaj = Column(Money(), nullable=False, server_default='0')
+    harjana = Column(Money(), nullable=False, server_default='0')
+    bachat = Column(Money(), nullable=False, server_default='0')
+    rin_lagani = Column(Money(), nullable=False, server_default='0')
+    deposit = Column(Money(), nullable=False, server_default='0')
+    cum_sawa_asuli = Column(Money(), nullable=False, server_default='0')
+    cum_byaj = Column(Money(), nullable=False, server_default='0')
+    cum_harjana = Column(Money(), nullable=False, server_default='0')
+    cum_bachat = Column(Money(), nullable=False, server_default='0')
+    cum_rin_lagani = Column(Money(), nullable=False, server_default='0')
+    cum_deposit = Column(Money(), nullable=False, server_default='0')
+
+
 class Settings(Base):
     __tablename__ = 'settings'
 
     id = Column(Integer, primary_key=True)
     total_kista_months = Column(Integer, nullable=False)
     account_no = Column(String, nullable=False)
+    money_in_paisa = Column(Boolean, nullable=False, server_default='0')
+
+
+class Archive(Base):
+    """Read only database holding history of a closed year, see archive.py"""
+    __tablename__ = 'archives'
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False, unique=True)
+    year_start_date = Column(String(10), nullable=False)
+    # ordinal span of the transactions moved to the archive
+    start_ordinal = Column(Integer)
+    end_ordinal = Column(Integer, nullable=False)
+
+
+class AccrualSnapshot(Base):
+    """
+    Byaj accrued on all rin laganis as of a day, see accrual.py. Removed by
+    triggers when a transaction on or before the day changes.
+    """
+    __tablename__ = 'accrual_snapshots'
+
+    as_of_ordinal = Column(Integer, primary_key=True, autoincrement=False)
+    as_of_date = Column(String(10), nullable=False)
+    banki_sawa = Column(Money(), nullable=False)
+    byaj = Column(Money(), nullable=False)
+
+
+class AccrualSnapshotRow(Base):
+    """Byaj accrued on a single rin lagani as of a snapshot's day"""
+    __tablename__ = 'accrual_snapshot_rows'
+
+    as_of_ordinal = Column(Integer, ForeignKey(
+        'accrual_snapshots.as_of_ordinal'), primary_key=True,
+                           autoincrement=False)
+    rin_lagani_id = Column(Integer, primary_key=True, autoincrement=False)
+    member_id = Column(Integer, nullable=False)
+    banki_sawa = Column(Money(), nullable=False)
+    start_ordinal = Column(Integer, nullable=False)
+    days = Column(Integer, nullable=False)
+    byaj = Column(Money(), nullable=False)
+
+
+class SchemaVersion(Base):
+    """Applied schema migration, see migrations.py"""
+    __tablename__ = 'schema_versions'
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+
+
+def update_date_ordinal(mapper, connection, target):
+    """Keep date_ordinal in sync with the date string before every write."""
+    target.date_ordinal = date_to_ordinal(target.date)
+
+
+for model in (RinLagani, SawaAsuli, BankTransaction):
+    event.listen(model, 'before_insert', update_date_ordinal)
+    event.listen(model, 'before_update', update_date_ordinal)
+
+
+# keep rinlaganis.banki_sawa equal to amount minus its sawa asulis. Rupees
+# are stored as REAL, so every running balance is rounded to paisa or the
+# float error of each change would pile up.
+BANKI_SAWA_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS rinlaganis_banki_sawa_insert
+    AFTER INSERT ON rinlaganis
+    BEGIN
+        UPDATE rinlaganis SET banki_sawa = ROUND(NEW.amount - (
+            SELECT COALESCE(SUM(amount), 0) FROM sawaasulis
+            WHERE rin_lagani_id = NEW.id), 2)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS rinlaganis_banki_sawa_update
+    AFTER UPDATE OF amount ON rinlaganis
+    BEGIN
+        UPDATE rinlaganis
+        SET banki_sawa = ROUND(banki_sawa + NEW.amount - OLD.amount, 2)
+        WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sawaasulis_banki_sawa_insert
+    AFTER INSERT ON sawaasulis
+    WHEN NEW.rin_lagani_id IS NOT NULL
+    BEGIN
+        UPDATE rinlaganis SET banki_sawa = ROUND(banki_sawa - NEW.amount, 2)
+        WHERE id = NEW.rin_lagani_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sawaasulis_banki_sawa_update
+    AFTER UPDATE OF amount, rin_lagani_id ON sawaasulis
+    BEGIN
+        UPDATE rinlaganis SET banki_sawa = ROUND(banki_sawa + OLD.amount, 2)
+        WHERE id = OLD.rin_lagani_id;
+        UPDATE rinlaganis SET banki_sawa = ROUND(banki_sawa - NEW.amount, 2)
+        WHERE id = NEW.rin_lagani_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sawaasulis_banki_sawa_delete
+    AFTER DELETE ON sawaasulis
+    WHEN OLD.rin_lagani_id IS NOT NULL
+    BEGIN
+        UPDATE rinlaganis SET banki_sawa = ROUND(banki_sawa + OLD.amount, 2)
+        WHERE id = OLD.rin_lagani_id;
+    END
+    """,
+]
+
+
+def member_totals_change(sign, row, table):
+    """
+    Create an UPDATE statement adding (sign='+') or subtracting (sign='-')
+    the amounts of a trigger row to the member's totals.
+    :param sign: '+' or '-'
+    :param row: trigger row, NEW or OLD
+    :param table: 'rinlaganis' or 'sawaasulis'
+    :return: UPDATE statement
+    """
+    if table == 'rinlaganis':
+        changes = (
+            f'alya_rin = ROUND(alya_rin {sign} CASE WHEN {row}.is_alya_rin '
+            f'THEN {row}.amount ELSE 0 END, 2), '
+            f'rin_lagani = ROUND(rin_lagani {sign} CASE WHEN '
+            f'{row}.is_alya_rin THEN 0 ELSE {row}.amount END, 2)')
+    else:
+        changes = (f'sawa_asuli = ROUND(sawa_asuli {sign} {row}.amount, 2), '
+                   f'byaj = ROUND(byaj {sign} {row}.byaj, 2), '
+                   f'harjana = ROUND(harjana {sign} {row}.harjana, 2), '
+                   f'bachat = ROUND(bachat {sign} {row}.bachat, 2)')
+    return (f'UPDATE member_totals SET {changes} '
+            f'WHERE member_id = {row}.member_id;')
+
+
+def latest_transaction_of(member_id):
+    """
+    Create a sub query selecting date_ordinal and date of a member's latest
+    RinLagani or SawaAsuli.
+    :param member_id: SQL expression of member id
+    :return: SELECT statement
+    """
+    return f"""
+        SELECT date_ordinal, date FROM (
+            SELECT * FROM (
+                SELECT date_ordinal, date FROM rinlaganis
+                WHERE member_id = {member_id}
+                ORDER BY date_ordinal DESC LIMIT 1)
+            UNION ALL
+            SELECT * FROM (
+                SELECT date_ordinal, date FROM sawaasulis
+                WHERE member_id = {member_id}
+                ORDER BY date_ordinal DESC LIMIT 1))
+        ORDER BY date_ordinal DESC LIMIT 1"""
+
+
+def member_totals_last_transaction(row):
+    """
+    Create an UPDATE statement refreshing the member's latest transaction.
+    :param row: trigger row, NEW or OLD
+    :return: UPDATE statement
+    """
+    return (f'UPDATE member_totals '
+            f'SET (last_transaction_ordinal, last_transaction_date) = '
+            f'({latest_transaction_of(row + ".member_id")}) '
+            f'WHERE member_id = {row}.member_id;')
+
+
+def member_totals_triggers(table):
+    """
+    Create triggers keeping member_totals up to date with the given table.
+    :param table: 'rinlaganis' or 'sawaasulis'
+    :return: list of CREATE TRIGGER statements
+    """
+    if table == 'rinlaganis':
+        update_of = 'amount, is_alya_rin, member_id, date_ordinal'
+    else:
+        update_of = 'amount, byaj, harjana, bachat, member_id, date_ordinal'
+    ensure_row = ('INSERT OR IGNORE INTO member_totals (member_id) '
+                  'VALUES (NEW.member_id);')
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_member_totals_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            {ensure_row}
+            {member_totals_change('+', 'NEW', table)}
+            {member_totals_last_transaction('NEW')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_member_totals_update
+        AFTER UPDATE OF {update_of} ON {table}
+        BEGIN
+            {ensure_row}
+            {member_totals_change('-', 'OLD', table)}
+            {member_totals_change('+', 'NEW', table)}
+            {member_totals_last_transaction('OLD')}
+            {member_totals_last_transaction('NEW')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_member_totals_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {member_totals_change('-', 'OLD', table)}
+            {member_totals_last_transaction('OLD')}
+        END
+        """,
+    ]
+
+
+# keep member_totals equal to the aggregate of every member's transactions
+MEMBER_TOTALS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS members_member_totals_insert
+    AFTER INSERT ON members
+    BEGIN
+        INSERT OR IGNORE INTO member_totals (member_id) VALUES (NEW.id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS members_member_totals_delete
+    AFTER DELETE ON members
+    BEGIN
+        DELETE FROM member_totals WHERE member_id = OLD.id;
+    END
+    """,
+    # member banki sawa is the sum of banki sawa of its rin laganis
+    """
+    CREATE TRIGGER IF NOT EXISTS rinlaganis_member_totals_banki_sawa
+    AFTER UPDATE OF banki_sawa ON rinlaganis
+    BEGIN
+        UPDATE member_totals
+        SET banki_sawa = ROUND(banki_sawa - OLD.banki_sawa + NEW.banki_sawa, 2)
+        WHERE member_id = NEW.member_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS rinlaganis_member_totals_banki_sawa_delete
+    AFTER DELETE ON rinlaganis
+    BEGIN
+        UPDATE member_totals
+        SET banki_sawa = ROUND(banki_sawa - OLD.banki_sawa, 2)
+        WHERE member_id = OLD.member_id;
+    END
+    """,
+    *member_totals_triggers('rinlaganis'),
+    *member_totals_triggers('sawaasulis'),
+]
+
+
+ROLLUP_COLUMNS = ['sawa_asuli', 'byaj', 'harjana', 'bachat', 'rin_lagani',
+                  'deposit']
+
+
+def rollup_amounts(table, row):
+    """
+    Map daily rollup columns to the amounts a trigger row contributes.
+    :param table: 'rinlaganis', 'sawaasulis' or 'banktransactions'
+    :param row: trigger row, NEW or OLD
+    :return: dict of rollup column and SQL expression
+    """
+    if table == 'rinlaganis':
+        return {'rin_lagani': f'{row}.amount'}
+    if table == 'sawaasulis':
+        return {'sawa_asuli': f'{row}.amount', 'byaj': f'{row}.byaj',
+                'harjana': f'{row}.harjana', 'bachat': f'{row}.bachat'}
+    return {'deposit': f"CASE WHEN {row}.type = 'DEPOSIT' "
+                       f"THEN {row}.amount ELSE 0 END"}
+
+
+def daily_rollup_change(sign, row, table):
+    """
+    Create statements adding (sign='+') or subtracting (sign='-') the
+    amounts of a trigger row to its day and to the cumulative totals of its
+    day and all the days after it.
+    :param sign: '+' or '-'
+    :param row: trigger row, NEW or OLD
+    :param table: 'rinlaganis', 'sawaasulis' or 'banktransactions'
+    :return: statements
+    """
+    day = f'{row}.date_ordinal'
+    amounts = rollup_amounts(table, row)
+    cum_columns = ', '.join(f'cum_{c}' for c in ROLLUP_COLUMNS)
+    previous_cums = ', '.join(f'COALESCE(previous.cum_{c}, 0)'
+                              for c in ROLLUP_COLUMNS)
+    daily = ', '.join(f'{c} = ROUND({c} {sign} {amount}, 2)'
+                      for c, amount in amounts.items())
+    cumulative = ', '.join(f'cum_{c} = ROUND(cum_{c} {sign} {amount}, 2)'
+                           for c, amount in amounts.items())
+    return f"""
+        INSERT OR IGNORE INTO daily_rollups (day_ordinal, {cum_columns})
+        SELECT {day}, {previous_cums} FROM (SELECT 1) LEFT JOIN (
+            SELECT * FROM daily_rollups WHERE day_ordinal < {day}
+            ORDER BY day_ordinal DESC LIMIT 1) AS previous;
+        UPDATE daily_rollups SET {daily} WHERE day_ordinal = {day};
+        UPDATE daily_rollups SET {cumulative} WHERE day_ordinal >= {day};"""
+
+
+def daily_rollup_triggers(table):
+    """
+    Create triggers keeping daily_rollups up to date with the given table.
+    :param table: 'rinlaganis', 'sawaasulis' or 'banktransactions'
+    :return: list of CREATE TRIGGER statements
+    """
+    update_of = {
+        'rinlaganis': 'date_ordinal, amount',
+        'sawaasulis': 'date_ordinal, amount, byaj, harjana, bachat',
+        'banktransactions': 'date_ordinal, amount, type',
+    }[table]
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_daily_rollups_insert
+        AFTER INSERT ON {table}
+        WHEN NEW.date_ordinal IS NOT NULL
+        BEGIN
+            {daily_rollup_change('+', 'NEW', table)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_daily_rollups_update
+        AFTER UPDATE OF {update_of} ON {table}
+        WHEN OLD.date_ordinal IS NOT NULL AND NEW.date_ordinal IS NOT NULL
+        BEGIN
+            {daily_rollup_change('-', 'OLD', table)}
+            {daily_rollup_change('+', 'NEW', table)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_daily_rollups_delete
+        AFTER DELETE ON {table}
+        WHEN OLD.date_ordinal IS NOT NULL
+        BEGIN
+            {daily_rollup_change('-', 'OLD', table)}
+        END
+        """,
+    ]
+
+
+# keep daily_rollups equal to the per day totals of all transactions
+DAILY_ROLLUP_TRIGGERS = [
+    *daily_rollup_triggers('rinlaganis'),
+    *daily_rollup_triggers('sawaasulis'),
+    *daily_rollup_triggers('banktransactions'),
+]
+
+
+def accrual_snapshot_triggers(table):
+    """
+    Create triggers removing accrual snapshots a change of the given table
+    makes stale, the ones as of the changed day or later.
+    :param table: 'rinlaganis' or 'sawaasulis'
+    :return: list of CREATE TRIGGER statements
+    """
+    update_of = {
+        'rinlaganis': 'date_ordinal, amount',
+        'sawaasulis': 'date_ordinal, amount, rin_lagani_id',
+    }[table]
+
+    def remove_snapshots(day):
+        return f"""
+            DELETE FROM accrual_snapshot_rows WHERE as_of_ordinal >= {day};
+            DELETE FROM accrual_snapshots WHERE as_of_ordinal >= {day};"""
+
+    # earlier of the old and new day, either may be NULL
+    changed_day = ('MIN(COALESCE(OLD.date_ordinal, NEW.date_ordinal), '
+                   'COALESCE(NEW.date_ordinal, OLD.date_ordinal))')
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_accrual_snapshots_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            {remove_snapshots('NEW.date_ordinal')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_accrual_snapshots_update
+        AFTER UPDATE OF {update_of} ON {table}
+        BEGIN
+            {remove_snapshots(changed_day)}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_accrual_snapshots_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {remove_snapshots('OLD.date_ordinal')}
+        END
+        """,
+    ]
+
+
+# keep accrual_snapshots equal to the byaj accrued on the current ledger
+ACCRUAL_SNAPSHOT_TRIGGERS = [
+    *accrual_snapshot_triggers('rinlaganis'),
+    *accrual_snapshot_triggers('sawaasulis'),
+]
+
+
+def member_check(row):
+    """
+    Create a statement aborting the write if the row's member does not exist.
+    :param row: trigger row, NEW
+    :return: SELECT RAISE statement
+    """
+    return (f"SELECT RAISE(ABORT, 'invalid_member') WHERE NOT EXISTS ("
+            f'SELECT 1 FROM members WHERE id = {row}.member_id);')
+
+
+def later_transaction_exists(table, row):
+    """
+    Create a condition true if the member of an updated row has another
+    RinLagani or SawaAsuli dated on or after the row's date.
+    :param table: 'rinlaganis' or 'sawaasulis', table of the updated row
+    :param row: trigger row, OLD or NEW
+    :return: EXISTS condition
+    """
+    parts = []
+    for other in ('rinlaganis', 'sawaasulis'):
+        other_row = f'AND id != {row}.id' if other == table else ''
+        parts.append(f"""
+            SELECT 1 FROM {other} WHERE member_id = {row}.member_id
+            AND date_ordinal >= {row}.date_ordinal {other_row}""")
+    return f'EXISTS ({" UNION ALL ".join(parts)})'
+
+
+# columns edited by users, banki_sawa of older rin laganis is updated by
+# BANKI_SAWA_TRIGGERS
+LEDGER_COLUMNS = {
+    'rinlaganis': 'date, date_ordinal, amount, is_alya_rin, kista_per_month, '
+                  'remarks, member_id',
+    'sawaasulis': 'date, date_ordinal, amount, byaj, harjana, bachat, '
+                  'remarks, rin_lagani_id, member_id',
+}
+
+
+def ledger_date_triggers(table):
+    """
+    Create triggers keeping transactions of a member in date order. A new
+    transaction must be dated after the member's latest transaction and only
+    the latest transaction can be edited.
+    :param table: 'rinlaganis' or 'sawaasulis'
+    :return: list of CREATE TRIGGER statements
+    """
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ledger_insert
+        BEFORE INSERT ON {table}
+        BEGIN
+            {member_check('NEW')}
+            SELECT RAISE(ABORT, 'transaction_date')
+            WHERE NEW.date_ordinal <= (
+                SELECT last_transaction_ordinal FROM member_totals
+                WHERE member_id = NEW.member_id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_ledger_update
+        BEFORE UPDATE OF {LEDGER_COLUMNS[table]} ON {table}
+        BEGIN
+            {member_check('NEW')}
+            SELECT RAISE(ABORT, 'not_latest')
+            WHERE {later_transaction_exists(table, 'OLD')};
+            SELECT RAISE(ABORT, 'transaction_date')
+            WHERE {later_transaction_exists(table, 'NEW')};
+        END
+        """,
+    ]
+
+
+# a sawa asuli paying principal, byaj or harjana
+PAYS_RIN = 'NEW.amount > 0 OR NEW.byaj > 0 OR NEW.harjana > 0'
+
+# ledger rules checked before every write, the RAISE message names the
+# broken rule, see database_access.LEDGER_ERRORS
+LEDGER_TRIGGERS = [
+    *ledger_date_triggers('rinlaganis'),
+    *ledger_date_triggers('sawaasulis'),
+    # previous rin lagani must be cleared before a new one, balances are
+    # compared in paisa
+    """
+    CREATE TRIGGER IF NOT EXISTS rinlaganis_ledger_cleared
+    BEFORE INSERT ON rinlaganis
+    WHEN ROUND((SELECT banki_sawa FROM member_totals
+                WHERE member_id = NEW.member_id), 2) > 0
+    BEGIN
+        SELECT RAISE(ABORT, 'rin_lagani_not_cleared');
+    END
+    """,
+    # member's other rin laganis when a rin lagani is edited
+    """
+    CREATE TRIGGER IF NOT EXISTS rinlaganis_ledger_cleared_update
+    BEFORE UPDATE OF amount, member_id ON rinlaganis
+    WHEN (SELECT ROUND(COALESCE(SUM(banki_sawa), 0), 2) FROM rinlaganis
+          WHERE member_id = NEW.member_id AND id != NEW.id) > 0
+    BEGIN
+        SELECT RAISE(ABORT, 'rin_lagani_not_cleared');
+    END
+    """,
+    # sawa asuli without banki sawa to pay can only have bachat
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sawaasulis_ledger_bachat_insert
+    BEFORE INSERT ON sawaasulis
+    WHEN ({PAYS_RIN}) AND ROUND(COALESCE((
+        SELECT banki_sawa FROM rinlaganis
+        WHERE id = NEW.rin_lagani_id), 0), 2) <= 0
+    BEGIN
+        SELECT RAISE(ABORT, 'bachat_only');
+    END
+    """,
+    # banki sawa before the update includes the row's old amount
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sawaasulis_ledger_bachat_update
+    BEFORE UPDATE OF amount, byaj, harjana, rin_lagani_id ON sawaasulis
+    WHEN ({PAYS_RIN}) AND ROUND(COALESCE((
+        SELECT banki_sawa + CASE WHEN id = OLD.rin_lagani_id
+                                 THEN OLD.amount ELSE 0 END
+        FROM rinlaganis WHERE id = NEW.rin_lagani_id), 0), 2) <= 0
+    BEGIN
+        SELECT RAISE(ABORT, 'bachat_only');
+    END
+    """,
+]
+
+
+def create_triggers(connection):
+    """
+    Create triggers maintaining denormalised columns and checking ledger
+    rules if they do not exist.
+    :param connection: database connection
+    """
+    for trigger in (BANKI_SAWA_TRIGGERS + MEMBER_TOTALS_TRIGGERS
+                    + DAILY_ROLLUP_TRIGGERS + ACCRUAL_SNAPSHOT_TRIGGERS
+                    + LEDGER_TRIGGERS):
+        connection.execute(text(trigger))
+
+
+def drop_triggers(connection):
+    """
+    Drop all triggers in the database.
+    :param connection: database connection
+    """
+    triggers = connection.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'")).fetchall()
+    for trigger in triggers:
+        connection.execute(text(f'DROP TRIGGER IF EXISTS {trigger.name}'))
+
+
+event.listen(Base.metadata, 'after_create',
+             lambda target, connection, **kw: create_triggers(connection))
+
+# banki sawa of every rin lagani calculated from its sawa asulis
+CALCULATED_BANKI_SAWA = """
+    ROUND(rinlaganis.amount - (SELECT COALESCE(SUM(sawaasulis.amount), 0)
+                               FROM sawaasulis
+                               WHERE sawaasulis.rin_lagani_id = rinlaganis.id),
+          2)
+"""
+
+
+def verify_banki_sawa(connection):
+    """
+    Find RinLaganis whose stored banki sawa does not match their sawa asulis.
+    :param connection: database connection or session
+    :return: list of RinLagani ids with wrong banki sawa
+    """
+    rows = connection.execute(text(
+        'SELECT id FROM rinlaganis '
+        f'WHERE ROUND(banki_sawa, 2) != ROUND({CALCULATED_BANKI_SAWA}, 2)'))
+    return [row.id for row in rows]
+
+
+def rebuild_banki_sawa(connection):
+    """
+    Recalculate stored banki sawa of every RinLagani from its sawa asulis.
+    :param connection: database connection or session
+    """
+    connection.execute(text(
+        f'UPDATE rinlaganis SET banki_sawa = {CALCULATED_BANKI_SAWA}'))
+
+
+def rebuild_member_totals(connection):
+    """
+    Recalculate member_totals of every member from its transactions.
+    :param connection: database connection or session
+    """
+    connection.execute(text('DELETE FROM member_totals'))
+    connection.execute(text("""
+        INSERT INTO member_totals (
+            member_id, alya_rin, rin_lagani, sawa_asuli, byaj, harjana, bachat,
+            banki_sawa, last_transaction_ordinal, last_transaction_date)
+        SELECT members.id,
+               ROUND(COALESCE(laganis.alya_rin, 0), 2),
+               ROUND(COALESCE(laganis.rin_lagani, 0), 2),
+               ROUND(COALESCE(asulis.sawa_asuli, 0), 2),
+               ROUND(COALESCE(asulis.byaj, 0), 2),
+               ROUND(COALESCE(asulis.harjana, 0), 2),
+               ROUND(COALESCE(asulis.bachat, 0), 2),
+               ROUND(COALESCE(laganis.banki_sawa, 0), 2), NULL, NULL
+        FROM members
+        LEFT JOIN (
+            SELECT member_id,
+                   SUM(CASE WHEN is_alya_rin THEN amount ELSE 0 END)
+                       AS alya_rin,
+                   SUM(CASE WHEN is_alya_rin THEN 0 ELSE amount END)
+                       AS rin_lagani,
+                   SUM(banki_sawa) AS banki_sawa
+            FROM rinlaganis GROUP BY member_id) AS laganis
+            ON laganis.member_id = members.id
+        LEFT JOIN (
+            SELECT member_id, SUM(amount) AS sawa_asuli, SUM(byaj) AS byaj,
+                   SUM(harjana) AS harjana, SUM(bachat) AS bachat
+            FROM sawaasulis GROUP BY member_id) AS asulis
+            ON asulis.member_id = members.id
+    """))
+    connection.execute(text(
+        'UPDATE member_totals '
+        'SET (last_transaction_ordinal, last_transaction_date) = '
+        f'({latest_transaction_of("member_totals.member_id")})'))
+
+
+def rebuild_daily_rollups(connection):
+    """
+    Recalculate daily_rollups from all the transactions.
+    :param connection: database connection or session
+    """
+    daily = ', '.join(f'ROUND(SUM({c}), 2) AS {c}' for c in ROLLUP_COLUMNS)
+    cumulative = ', '.join(f'ROUND(SUM({c}) OVER (ORDER BY day_ordinal), 2)'
+                           for c in ROLLUP_COLUMNS)
+    columns = ', '.join(ROLLUP_COLUMNS)
+    cum_columns = ', '.join(f'cum_{c}' for c in ROLLUP_COLUMNS)
+    connection.execute(text('DELETE FROM daily_rollups'))
+    connection.execute(text(f"""
+        INSERT INTO daily_rollups (day_ordinal, {columns}, {cum_columns})
+        SELECT day_ordinal, {columns}, {cumulative} FROM (
+            SELECT day_ordinal, {daily} FROM (
+                SELECT date_ordinal AS day_ordinal, amount AS sawa_asuli,
+                       byaj, harjana, bachat, 0 AS rin_lagani, 0 AS deposit
+                FROM sawaasulis
+                UNION ALL
+                SELECT date_ordinal, 0, 0, 0, 0, amount, 0 FROM rinlaganis
+                UNION ALL
+                SELECT date_ordinal, 0, 0, 0, 0, 0, amount
+                FROM banktransactions WHERE type = 'DEPOSIT')
+            WHERE day_ordinal IS NOT NULL
+            GROUP BY day_ordinal)
+    """))
+
+
+def money_columns():
+    """
+    Find all the columns storing money.
+    :return: list of (table, column) of Money columns
+    """
+    return [(table, column) for table in Base.metadata.sorted_tables
+            for column in table.columns if isinstance(column.type, Money)]
+
+
+def read_money_in_paisa(dbapi_connection):
+    """
+    Read money storage setting of a database
+    :param dbapi_connection: sqlite3 connection
+    :return: True if money is stored as integer paisa
+    """
+    try:
+        row = dbapi_connection.execute(
+            'SELECT money_in_paisa FROM settings LIMIT 1').fetchone()
+    except sqlite3.OperationalError:
+        # new database without settings or older one without the column
+        return False
+    return row is not None and bool(row[0])
+
+
+def track_money_storage(engine):
+    """
+    Store money of the engine as configured in its own database settings.
+    The setting is kept on the engine's dialect, so databases and archives
+    storing rupees and paisa can be open at the same time.
+    :param engine: database engine
+    """
+    def load_setting(dbapi_connection, connection_record):
+        engine.dialect.money_in_paisa = read_money_in_paisa(dbapi_connection)
+
+    event.listen(engine, 'first_connect', load_setting)
+
+
+def convert_money_to_paisa(engine):
+    """
+    Convert all money columns from rupees to integer paisa and enable integer
+    paisa money storage for the database. Sums of integer paisa are exact in
+    SQL and avoid per row decimal conversion.
+    :param engine: database engine
+    """
+    with engine.begin() as connection:
+        if connection.execute(text(
+                'SELECT money_in_paisa FROM settings LIMIT 1')).scalar():
+            engine.dialect.money_in_paisa = True
+            return
+        # triggers would apply the converted amounts as changes
+        drop_triggers(connection)
+        for table, column in money_columns():
+            connection.execute(text(
+                f'UPDATE {table.name} SET {column.name} = '
+                f'CAST(ROUND({column.name} * 100) AS INTEGER)'))
+        connection.execute(text('UPDATE settings SET money_in_paisa = 1'))
+        create_triggers(connection)
+    engine.dialect.money_in_paisa = True
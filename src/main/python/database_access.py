@@ -1,11 +1,18 @@
 from decimal import Decimal
 
 from dataclasses import dataclass
-from sqlalchemy import and_
+from sqlalchemy import and_, case, exc, func, literal, select, union_all
+from sqlalchemy.orm import aliased
 
-from database import (Member, RinLagani, SawaAsuli, Settings,
-                      BankTransactionTypes, BankTransaction)
-from util import (str_to_date, get_month_start, get_month_end)
+from database import (Archive, Member, RinLagani, SawaAsuli, Settings,
+                      BankTransactionTypes, BankTransaction, MemberTotals,
+                      DailyRollup, AccrualSnapshot, AccrualSnapshotRow,
+                      Money, create_triggers, drop_triggers,
+                      rebuild_banki_sawa, rebuild_member_totals,
+                      rebuild_daily_rollups)
+from bs_calendar import ordinal_to_str
+from util import (str_to_date, date_to_ordinal, get_month_start,
+                  get_month_end)
 
 
 @dataclass
@@ -144,33 +151,20 @@ def to_rin_lagani(rin_lagani_dto):
                      member_id=rin_lagani_dto.member_id)
 
 
-def validate_rin_lagani(session, rin_lagani, latest_tx, latest_rin_lagani):
+def validate_rin_lagani(rin_lagani):
+    """
+    Check a RinLagani before saving it. Rules depending on the member's
+    ledger are checked by the database, see LEDGER_ERRORS.
+    :param rin_lagani: RinLagani to be saved
+    :return: errors if any
+    """
     errors = {}
     # rin lagani amount cannot be negetive or zero
     if rin_lagani.amount <= Decimal(0):
         errors['rin_lagani'] = 'Rin lagani amount not valid.'
     # check validity of date
-    date = str_to_date(rin_lagani.date)
-    if date is None:
+    if date_to_ordinal(rin_lagani.date) is None:
         errors['date'] = 'Invalid date'
-        return errors
-    # check if member exists with given member_id
-    if get_member_by_id(session, rin_lagani.member_id) is None:
-        errors['member_id'] = 'Invalid member.'
-        return errors
-    # if there is no transaction yet then allow save
-    if latest_tx is None:
-        return errors
-    # check if it is the latest transaction
-    if str_to_date(rin_lagani.date) <= str_to_date(latest_tx.date):
-        errors['date'] = 'Date cannot be in the past than latest transaction.'
-        return errors
-    # if there are no rin laganis allow save
-    if latest_rin_lagani is None:
-        return errors
-    # calculate if previous banki sawa are cleared
-    if calculate_banki_sawa(latest_rin_lagani) > Decimal(0):
-        errors['rin_lagani'] = 'Previous rin lagani not cleared.'
     return errors
 
 
@@ -181,20 +175,7 @@ def save_or_update_rin_lagani(session, rin_lagani):
     :param rin_lagani: RinLagani to be saved.
     :return: errors if any
     """
-    if rin_lagani.id is None:
-        # while persisting new rin lagani latest is the last transaction
-        latest_tx = get_latest_transaction(session,
-                                           rin_lagani.member_id)
-        latest_rin_lagani = get_latest_rin_lagani(session, rin_lagani.member_id)
-    else:
-        # while updating existing rin lagani latest is the 2nd last transaction
-        latest_tx = get_second_last_transaction(session,
-                                                rin_lagani.member_id)
-        latest_rin_lagani = get_second_last_rin_lagani(session,
-                                                       rin_lagani.member_id)
-    # validate rin lagani
-    errors = validate_rin_lagani(session, rin_lagani, latest_tx,
-                                 latest_rin_lagani)
+    errors = validate_rin_lagani(rin_lagani)
     if len(errors) > 0:
         return errors
 
@@ -202,7 +183,7 @@ def save_or_update_rin_lagani(session, rin_lagani):
     settings = session.query(Settings).first()
     rin_lagani.kista_per_month = rin_lagani.amount / settings.total_kista_months
     # save or update rin lagani
-    session.merge(rin_lagani)
+    return merge_checked(session, rin_lagani)
 
 
 def get_rin_lagani_by_id(session, id):
@@ -290,30 +271,22 @@ def to_sawa_asuli(sawa_asuli_dto):
                      member_id=sawa_asuli_dto.member_id)
 
 
-def validate_sawa_asuli(session, sawa_asuli, latest_tx):
+def validate_sawa_asuli(sawa_asuli):
+    """
+    Check a SawaAsuli before saving it. Rules depending on the member's
+    ledger are checked by the database, see LEDGER_ERRORS.
+    :param sawa_asuli: SawaAsuli to be saved
+    :return: errors if any
+    """
     errors = {}
+    # check validity of amounts
     zero = Decimal(0)
-    # check if sawa asuli date is before than the latest transaction date
-    latest_tx_date = str_to_date(latest_tx.date)
-    sawa_asuli_date = str_to_date(sawa_asuli.date)
-    if sawa_asuli_date <= latest_tx_date:
-        errors['date'] = 'Date cannot be in the past than latest transaction.'
-        return errors
-    # check if latest rin lagani is cleared
-    rin_lagani = get_latest_rin_lagani(session, sawa_asuli.member_id)
-    banki_sawa = zero
-    if not rin_lagani is None:
-        banki_sawa = calculate_banki_sawa(rin_lagani)
-        # while editing latest sawa asuli do not count its sawa asuli when calulating banki sawa
-        if not sawa_asuli.id is None:
-            # get the sawa asuli being edited from the database
-            asuli = get_sawa_asuli_by_id(session, sawa_asuli.id)
-            banki_sawa += sawa_asuli.amount
-    # bachat only sawa asuli can only have rin bachat
-    if rin_lagani is None or banki_sawa == zero:
-        if (sawa_asuli.amount > zero or sawa_asuli.byaj > zero
-                or sawa_asuli.harjana > zero):
-            errors['amount'] = 'Invalid amounts for bachat only sawa asuli'
+    if (sawa_asuli.amount < zero or sawa_asuli.byaj < zero
+            or sawa_asuli.harjana < zero or sawa_asuli.bachat < zero):
+        errors['amount'] = 'Invalid amount, byaj, harjana or bachat'
+    # check validity of date
+    if date_to_ordinal(sawa_asuli.date) is None:
+        errors['date'] = 'Invalid date.'
     return errors
 
 
@@ -324,37 +297,44 @@ def save_or_update_sawa_asuli(session, sawa_asuli):
     :param sawa_asuli: sawa asuli to be saved
     :return: err if any
     """
-    if sawa_asuli.id is None:
-        latest_tx = get_latest_transaction(session,
-                                           sawa_asuli.member_id)
-    else:
-        latest_tx = get_second_last_transaction(session,
-                                                sawa_asuli.member_id)
-    # simple validations
-    errors = {}
-    # check validity of amounts
-    zero = Decimal(0)
-    if (sawa_asuli.amount < zero or sawa_asuli.byaj < zero
-            or sawa_asuli.harjana < zero or sawa_asuli.bachat < zero):
-        errors['amount'] = 'Invalid amount, byaj, harjana or bachat'
-    # check validity of date
-    if str_to_date(sawa_asuli.date) is None:
-        errors['date'] = 'Invalid date.'
-        return errors
-    # check if member exists with given member_id
-    if get_member_by_id(session, sawa_asuli.member_id) is None:
-        errors['member_id'] = ['Invalid member.']
-        return errors
-    # if there are no latest transactions allow saving sawa asuli
-    if latest_tx is None:
-        return errors
-    # further validate sawa asuli
-    errors = validate_sawa_asuli(session, sawa_asuli, latest_tx)
+    errors = validate_sawa_asuli(sawa_asuli)
     if len(errors) > 0:
         return errors
 
     # save or update sawa asuli
-    session.merge(sawa_asuli)
+    return merge_checked(session, sawa_asuli)
+
+
+# RAISE messages of database.LEDGER_TRIGGERS and the errors shown for them
+LEDGER_ERRORS = {
+    'invalid_member': ('member_id', 'Invalid member.'),
+    'transaction_date': ('date',
+                         'Date cannot be in the past than latest transaction.'),
+    'not_latest': ('date', 'Can only edit latest transaction'),
+    'rin_lagani_not_cleared': ('rin_lagani',
+                               'Previous rin lagani not cleared.'),
+    'bachat_only': ('amount', 'Invalid amounts for bachat only sawa asuli'),
+}
+
+
+def merge_checked(session, entity):
+    """
+    Save or update a RinLagani or SawaAsuli in a savepoint. If the database
+    rejects it for breaking a ledger rule the savepoint is rolled back and the
+    rest of the session's transaction is kept.
+    :param session: current database session
+    :param entity: RinLagani or SawaAsuli
+    :return: errors if any
+    """
+    try:
+        with session.begin_nested():
+            session.merge(entity)
+    except exc.IntegrityError as e:
+        rule = str(e.orig)
+        if rule not in LEDGER_ERRORS:
+            raise
+        field, message = LEDGER_ERRORS[rule]
+        return {field: message}
 
 
 def get_sawa_asuli_by_id(session, id):
@@ -414,6 +394,57 @@ def get_sawa_asulis_without_rin_lagani(session, id):
         and_(SawaAsuli.member_id == id, SawaAsuli.rin_lagani_id == None))
 
 
+def member_transactions(member_id, limit, rin_lagani_id=None,
+                        sawa_asuli_id=None):
+    """
+    Create a UNION ALL of the latest RinLaganis and SawaAsulis for a member.
+    Each part reads at most limit rows from (member_id, date_ordinal) index.
+    :param member_id: Member id
+    :param limit: number of latest rows to take from each table
+    :param rin_lagani_id: optional RinLagani id to leave out
+    :param sawa_asuli_id: optional SawaAsuli id to leave out
+    :return: subquery with is_rin_lagani, id, date_ordinal, date and
+    member_id columns
+    """
+    rin_laganis = select(
+        literal(True).label('is_rin_lagani'), RinLagani.id,
+        RinLagani.date_ordinal, RinLagani.date, RinLagani.member_id).where(
+        RinLagani.member_id == member_id).order_by(
+        RinLagani.date_ordinal.desc(), RinLagani.id.desc()).limit(limit)
+    if rin_lagani_id is not None:
+        rin_laganis = rin_laganis.where(RinLagani.id != rin_lagani_id)
+    sawa_asulis = select(
+        literal(False).label('is_rin_lagani'), SawaAsuli.id,
+        SawaAsuli.date_ordinal, SawaAsuli.date, SawaAsuli.member_id).where(
+        SawaAsuli.member_id == member_id).order_by(
+        SawaAsuli.date_ordinal.desc(), SawaAsuli.id.desc()).limit(limit)
+    if sawa_asuli_id is not None:
+        sawa_asulis = sawa_asulis.where(SawaAsuli.id != sawa_asuli_id)
+    return union_all(rin_laganis.subquery().select(),
+                     sawa_asulis.subquery().select()).subquery()
+
+
+def get_nth_latest_transaction(session, member_id, n):
+    """
+    Find the nth latest RinLagani or SawaAsuli for given Member id, n = 0 is
+    the latest transaction.
+    :param session: current database session
+    :param member_id: Member id
+    :param n: position from the latest transaction
+    :return: RinLagani or SawaAsuli or None
+    """
+    transactions = member_transactions(member_id, n + 1)
+    row = session.query(transactions).order_by(
+        transactions.c.date_ordinal.desc(),
+        transactions.c.is_rin_lagani.asc(),
+        transactions.c.id.desc()).offset(n).first()
+    if row is None:
+        return None
+    if row.is_rin_lagani:
+        return session.get(RinLagani, row.id)
+    return session.get(SawaAsuli, row.id)
+
+
 def get_latest_transaction(session, member_id):
     """
     Find the latest RinLagani or SawaAsuli for given Member id
@@ -421,12 +452,7 @@ def get_latest_transaction(session, member_id):
     :param member_id: Member id
     :return: latest RinLagani or SawaAsuli
     """
-    rin_laganis = get_rin_laganis_by_member_id(session, member_id)
-    sawa_asulis = get_sawa_asulis_by_member_id(session, member_id)
-    rin_laganis.extend(sawa_asulis)
-    if len(rin_laganis) == 0:
-        return None
-    return max(rin_laganis, key=lambda tx: str_to_date(tx.date))
+    return get_nth_latest_transaction(session, member_id, 0)
 
 
 def get_second_last_transaction(session, member_id):
@@ -436,14 +462,7 @@ def get_second_last_transaction(session, member_id):
     :param member_id: Member id
     :return: second last RinLagani or SawaAsuli
     """
-    rin_laganis = get_rin_laganis_by_member_id(session, member_id)
-    sawa_asulis = get_sawa_asulis_by_member_id(session, member_id)
-    rin_laganis.extend(sawa_asulis)
-    if len(rin_laganis) < 2:
-        return None
-    else:
-        rin_laganis.sort(key=lambda tx: str_to_date(tx.date))
-        return rin_laganis[-2]
+    return get_nth_latest_transaction(session, member_id, 1)
 
 
 def get_latest_rin_lagani(session, member_id):
@@ -453,10 +472,9 @@ def get_latest_rin_lagani(session, member_id):
     :param member_id: Member id
     :return: latest RinLagani
     """
-    rin_laganis = get_rin_laganis_by_member_id(session, member_id)
-    if len(rin_laganis) == 0:
-        return None
-    return max(rin_laganis, key=lambda lagani: str_to_date(lagani.date))
+    return session.query(RinLagani).filter(
+        RinLagani.member_id == member_id).order_by(
+        RinLagani.date_ordinal.desc(), RinLagani.id.desc()).first()
 
 
 def get_second_last_rin_lagani(session, member_id):
@@ -466,12 +484,215 @@ def get_second_last_rin_lagani(session, member_id):
     :param member_id: Member id
     :return: RinLagani previous to latest RinLagani
     """
-    rin_laganis = get_rin_laganis_by_member_id(session, member_id)
-    if len(rin_laganis) < 2:
-        return None
+    return session.query(RinLagani).filter(
+        RinLagani.member_id == member_id).order_by(
+        RinLagani.date_ordinal.desc(), RinLagani.id.desc()).offset(1).first()
+
+
+@dataclass
+class EntryContextDto:
+    """Everything the RinLagani and SawaAsuli entry windows start from"""
+    member_id: int
+    member_name: str
+    # latest transaction of the member other than the one being edited
+    previous_date: str
+    previous_is_rin_lagani: bool
+    # latest rin lagani other than the one being edited
+    rin_lagani_id: int
+    # banki sawa of rin lagani without the amount of sawa asuli being edited
+    banki_sawa: Decimal
+    kista_per_month: Decimal
+    edited: object  # RinLaganiDto or SawaAsuliDto being edited or None
+
+
+def get_entry_context(session, member_id, rin_lagani_id=None,
+                      sawa_asuli_id=None):
+    """
+    Load the member, its previous transaction, its rin lagani and the
+    transaction being edited in a single query.
+    :param session: current database session
+    :param member_id: Member id
+    :param rin_lagani_id: id of RinLagani being edited, None if not editing
+    :param sawa_asuli_id: id of SawaAsuli being edited, None if not editing
+    :return: EntryContextDto or None if the member does not exist
+    """
+    transactions = member_transactions(member_id, 1, rin_lagani_id,
+                                       sawa_asuli_id)
+    previous = select(transactions).order_by(
+        transactions.c.date_ordinal.desc(),
+        transactions.c.is_rin_lagani.asc(),
+        transactions.c.id.desc()).limit(1).subquery()
+    rin_lagani = select(
+        RinLagani.id, RinLagani.banki_sawa, RinLagani.kista_per_month,
+        RinLagani.member_id).where(
+        RinLagani.member_id == member_id).order_by(
+        RinLagani.date_ordinal.desc(), RinLagani.id.desc()).limit(1)
+    if rin_lagani_id is not None:
+        rin_lagani = rin_lagani.where(RinLagani.id != rin_lagani_id)
+    rin_lagani = rin_lagani.subquery()
+    if sawa_asuli_id is not None:
+        edited, edited_id = aliased(SawaAsuli), sawa_asuli_id
     else:
-        rin_laganis.sort(key=lambda r: str_to_date(r.date))
-        return rin_laganis[-2]
+        edited, edited_id = aliased(RinLagani), rin_lagani_id
+    row = session.execute(
+        select(Member.id, Member.name, previous.c.date,
+               previous.c.is_rin_lagani, rin_lagani.c.id,
+               rin_lagani.c.banki_sawa, rin_lagani.c.kista_per_month,
+               edited).select_from(Member).outerjoin(
+            previous, previous.c.member_id == Member.id).outerjoin(
+            rin_lagani, rin_lagani.c.member_id == Member.id).outerjoin(
+            edited, and_(edited.id == edited_id,
+                         edited.member_id == Member.id)).where(
+            Member.id == member_id)).first()
+    if row is None:
+        return None
+    banki_sawa = row[5] if row[5] is not None else Decimal(0)
+    edited = row[7]
+    if isinstance(edited, SawaAsuli):
+        # the edited sawa asuli is already paid towards its rin lagani
+        if edited.rin_lagani_id is not None and \
+                edited.rin_lagani_id == row[4]:
+            banki_sawa += edited.amount
+        edited = to_sawa_asuli_dto(edited)
+    elif edited is not None:
+        edited = to_rin_lagani_dto(edited)
+    return EntryContextDto(
+        member_id=row[0], member_name=row[1], previous_date=row[2],
+        previous_is_rin_lagani=bool(row[3]), rin_lagani_id=row[4],
+        banki_sawa=banki_sawa,
+        kista_per_month=row[6] if row[6] is not None else Decimal(0),
+        edited=edited)
+
+
+@dataclass
+class LedgerStateDto:
+    """State of a member's ledger a new sawa asuli is checked against"""
+    member_id: int
+    account_no: int
+    member_name: str
+    rin_lagani_id: int  # latest rin lagani, None without any
+    banki_sawa: Decimal
+    kista_per_month: Decimal
+    last_transaction_date: str  # None without any transaction
+    last_transaction_ordinal: int
+    last_is_rin_lagani: bool
+
+    def start_date(self):
+        """
+        Return first day byaj is charged for, the rin lagani date or the day
+        after the last sawa asuli
+        :return: date in format %Y-%m-%d or None without any transaction
+        """
+        if self.last_transaction_date is None or self.last_is_rin_lagani:
+            return self.last_transaction_date
+        return ordinal_to_str(self.last_transaction_ordinal + 1)
+
+
+def get_ledger_states(session):
+    """
+    Load ledger state of every member in a single query
+    :param session: current database session
+    :return: dict of member id and LedgerStateDto ordered by account number
+    """
+    latest = select(
+        RinLagani.member_id, RinLagani.id, RinLagani.banki_sawa,
+        RinLagani.kista_per_month, RinLagani.date_ordinal,
+        func.row_number().over(
+            partition_by=RinLagani.member_id,
+            order_by=(RinLagani.date_ordinal.desc(), RinLagani.id.desc())
+        ).label('position')).subquery()
+    rows = session.execute(select(
+        Member.id, Member.account_no, Member.name, latest.c.id,
+        latest.c.banki_sawa, latest.c.kista_per_month, latest.c.date_ordinal,
+        MemberTotals.last_transaction_date,
+        MemberTotals.last_transaction_ordinal).outerjoin(
+        latest, and_(latest.c.member_id == Member.id,
+                     latest.c.position == 1)).outerjoin(
+        MemberTotals, MemberTotals.member_id == Member.id).order_by(
+        Member.account_no))
+    zero = Decimal(0)
+    states = {}
+    for (member_id, account_no, name, rin_lagani_id, banki_sawa,
+         kista_per_month, rin_lagani_ordinal, last_date,
+         last_ordinal) in rows:
+        # transactions of a member are on different days
+        states[member_id] = LedgerStateDto(
+            member_id=member_id, account_no=account_no, member_name=name,
+            rin_lagani_id=rin_lagani_id,
+            banki_sawa=zero if banki_sawa is None else banki_sawa,
+            kista_per_month=(zero if kista_per_month is None
+                             else kista_per_month),
+            last_transaction_date=last_date,
+            last_transaction_ordinal=last_ordinal,
+            last_is_rin_lagani=(rin_lagani_ordinal is not None
+                                and rin_lagani_ordinal == last_ordinal))
+    return states
+
+
+def validate_sawa_asulis_bulk(sawa_asulis, states):
+    """
+    Check new sawa asulis against ledger states and each other, the same
+    rules as save_or_update_sawa_asuli without reading the database. Rin
+    lagani of each sawa asuli is set to the member's rin lagani and states
+    are updated as if the sawa asulis were saved.
+    :param sawa_asulis: SawaAsuliDto list in date order for each member
+    :param states: dict of member id and LedgerStateDto
+    :return: dict of list index and errors of invalid sawa asulis
+    """
+    zero = Decimal(0)
+    row_errors = {}
+    for index, sawa_asuli in enumerate(sawa_asulis):
+        errors = validate_sawa_asuli(sawa_asuli)
+        state = states.get(sawa_asuli.member_id)
+        if state is None:
+            errors['member_id'] = LEDGER_ERRORS['invalid_member'][1]
+        if errors:
+            row_errors[index] = errors
+            continue
+        date_ordinal = date_to_ordinal(sawa_asuli.date)
+        if state.last_transaction_ordinal is not None and \
+                date_ordinal <= state.last_transaction_ordinal:
+            field, message = LEDGER_ERRORS['transaction_date']
+            row_errors[index] = {field: message}
+            continue
+        sawa_asuli.rin_lagani_id = None
+        if state.banki_sawa > zero:
+            sawa_asuli.rin_lagani_id = state.rin_lagani_id
+        elif (sawa_asuli.amount > zero or sawa_asuli.byaj > zero
+              or sawa_asuli.harjana > zero):
+            field, message = LEDGER_ERRORS['bachat_only']
+            row_errors[index] = {field: message}
+            continue
+        # later sawa asulis of the member follow this one
+        state.last_transaction_date = sawa_asuli.date
+        state.last_transaction_ordinal = date_ordinal
+        state.last_is_rin_lagani = False
+        state.banki_sawa -= sawa_asuli.amount
+    return row_errors
+
+
+def save_sawa_asulis_bulk(session, sawa_asulis):
+    """
+    Validate new sawa asulis together and insert them with a single
+    executemany. Nothing is saved if any of them is invalid.
+    :param session: current database session
+    :param sawa_asulis: SawaAsuliDto list in date order for each member
+    :return: dict of list index and errors, empty if saved
+    """
+    row_errors = validate_sawa_asulis_bulk(sawa_asulis,
+                                           get_ledger_states(session))
+    if row_errors or not sawa_asulis:
+        return row_errors
+    # core insert skips the mapper events, date_ordinal is set here
+    session.execute(SawaAsuli.__table__.insert(), [
+        {'date': sawa_asuli.date,
+         'date_ordinal': date_to_ordinal(sawa_asuli.date),
+         'amount': sawa_asuli.amount, 'byaj': sawa_asuli.byaj,
+         'harjana': sawa_asuli.harjana, 'bachat': sawa_asuli.bachat,
+         'remarks': sawa_asuli.remarks,
+         'rin_lagani_id': sawa_asuli.rin_lagani_id,
+         'member_id': sawa_asuli.member_id} for sawa_asuli in sawa_asulis])
+    return {}
 
 
 def get_rin_laganis_in_month(session, member_id, date):
@@ -508,18 +729,18 @@ def get_sawa_asulis_in_month(session, member_id, date):
     return filtered_sawa_asulis
 
 
-def calculate_banki_sawa(rin_lagani):
+# yearly byaj on banki sawa
+BYAJ_RATE = Decimal('0.12')
+
+
+def calculate_byaj(banki_sawa, days):
     """
-    Calculate banki sawa for a RinLagani. If rin_lagani is None return zero.
-    :param rin_lagani: RinLagani
-    :return: banki sawa for the given RinLagani
+    Calculate byaj on banki sawa for the given number of days
+    :param banki_sawa: banki sawa byaj is charged on
+    :param days: number of days
+    :return: byaj
     """
-    if rin_lagani is None:
-        return Decimal(0)
-    banki_sawa = rin_lagani.amount
-    for sawa_asuli in rin_lagani.sawa_asulis:
-        banki_sawa -= sawa_asuli.amount
-    return banki_sawa
+    return banki_sawa * BYAJ_RATE / Decimal('365') * days
 
 
 @dataclass
@@ -581,7 +802,7 @@ def save_or_update_bank_transaction(session, transaction):
     :return:
     """
     errors = {}
-    if str_to_date(transaction.date) is None:
+    if date_to_ordinal(transaction.date) is None:
         errors['date'] = 'Invalid date'
     # check errors in amount
     if transaction.amount is None or transaction.amount <= Decimal(0):
@@ -660,6 +881,7 @@ class TransactionDto:
     is_rin_lagani: bool
     is_alya_rin: bool
     total: Decimal
+    is_archived: bool = False  # read from an archive of a closed year
 
 
 def rin_lagani_to_transaction_dto(rin_lagani):
@@ -704,6 +926,47 @@ def get_transactions_by_member_id(session, member_id):
     :return: list of TransactionDto for given member and total
     """
     zero = Decimal(0)
+    zero_amount = literal(zero, Money())
+    # rin laganis add to and sawa asulis subtract from the banki sawa
+    rin_laganis = select(
+        RinLagani.id, RinLagani.date, RinLagani.date_ordinal,
+        literal(True).label('is_rin_lagani'), RinLagani.is_alya_rin,
+        RinLagani.amount.label('rin_lagani'),
+        zero_amount.label('sawa_asuli'), zero_amount.label('byaj'),
+        zero_amount.label('harjana'), zero_amount.label('bachat'),
+        RinLagani.remarks, RinLagani.id.label('rin_lagani_id'),
+        RinLagani.amount.label('change')).where(
+        RinLagani.member_id == member_id)
+    sawa_asulis = select(
+        SawaAsuli.id, SawaAsuli.date, SawaAsuli.date_ordinal,
+        literal(False), literal(False), zero_amount, SawaAsuli.amount,
+        SawaAsuli.byaj, SawaAsuli.harjana, SawaAsuli.bachat,
+        SawaAsuli.remarks, SawaAsuli.rin_lagani_id, -SawaAsuli.amount).where(
+        SawaAsuli.member_id == member_id)
+    ledger = union_all(rin_laganis, sawa_asulis).subquery()
+    order = (ledger.c.date_ordinal, ledger.c.is_rin_lagani.desc(),
+             ledger.c.id)
+    # running banki sawa of every rin lagani, bachat only rows have none
+    banki_sawa = case(
+        (ledger.c.rin_lagani_id == None, zero_amount),
+        else_=func.sum(ledger.c.change).over(
+            partition_by=ledger.c.rin_lagani_id, order_by=order))
+    rows = session.query(ledger, banki_sawa.label('banki_sawa')).order_by(
+        *order)
+
+    transactions = []
+    for row in rows:
+        if row.is_rin_lagani:
+            total = row.rin_lagani
+        else:
+            total = row.sawa_asuli + row.byaj + row.harjana + row.bachat
+        transactions.append(TransactionDto(
+            id=row.id, date=row.date, rin_lagani=row.rin_lagani,
+            sawa_asuli=row.sawa_asuli, byaj=row.byaj, harjana=row.harjana,
+            bachat=row.bachat, banki_sawa=row.banki_sawa, remarks=row.remarks,
+            is_rin_lagani=bool(row.is_rin_lagani),
+            is_alya_rin=bool(row.is_alya_rin), total=total))
+    # totals are read from member totals maintained by database triggers
     totals = {
         'lagani_total': zero,
         'asuli_total': zero,
@@ -713,38 +976,20 @@ def get_transactions_by_member_id(session, member_id):
         'banki_sawa': zero,
         'grand_total': zero
     }
-    transactions = []
-    rin_laganis = get_rin_laganis_by_member_id(session, member_id)
-    for rin_lagani in rin_laganis:
-        # convert to transaction dto
-        transactions.append(rin_lagani_to_transaction_dto(rin_lagani))
-        # get sawa asulis for this rin lagani
-        sawa_asulis = get_sawa_asulis_by_rin_lagani_id(session, rin_lagani.id)
-        # calculate rin lagani total
-        totals['lagani_total'] += rin_lagani.amount
-        # initialize banki sawa
-        banki_sawa = rin_lagani.amount
-        # set banki sawa to latest banki sawa
-        totals['banki_sawa'] = banki_sawa
-        for sawa_asuli in sawa_asulis:
-            # convert to transaction dto
-            sawa_asuli_dto = sawa_asuli_to_transaction_dto(sawa_asuli)
-            totals['grand_total'] += sawa_asuli_dto.total
-            banki_sawa -= sawa_asuli_dto.sawa_asuli
-            sawa_asuli_dto.banki_sawa = banki_sawa
-            transactions.append(sawa_asuli_dto)
-            # calculate totals
-            totals['asuli_total'] += sawa_asuli.amount
-            totals['byaj_total'] += sawa_asuli.byaj
-            totals['harjana_total'] += sawa_asuli.harjana
-            totals['bachat_total'] += sawa_asuli.bachat
-            # set banki sawa to latest banki sawa
-            totals['banki_sawa'] = banki_sawa
-    # remainining sawa asulis which only have bachat
-    for sawa_asuli in get_sawa_asulis_without_rin_lagani(session, member_id):
-        transactions.append(sawa_asuli_to_transaction_dto(sawa_asuli))
-    # sort transactions according to date
-    transactions.sort(key=lambda tx: str_to_date(tx.date))
+    member_totals = None
+    if member_id is not None:
+        member_totals = session.get(MemberTotals, member_id)
+    if member_totals is not None:
+        totals['lagani_total'] = (member_totals.alya_rin
+                                  + member_totals.rin_lagani)
+        totals['asuli_total'] = member_totals.sawa_asuli
+        totals['byaj_total'] = member_totals.byaj
+        totals['harjana_total'] = member_totals.harjana
+        totals['bachat_total'] = member_totals.bachat
+        totals['banki_sawa'] = member_totals.banki_sawa
+        totals['grand_total'] = (member_totals.sawa_asuli + member_totals.byaj
+                                 + member_totals.harjana
+                                 + member_totals.bachat)
     return transactions, totals
 
 
@@ -774,7 +1019,7 @@ def get_bank_transactions_and_rin_laganis(session):
         transactions.append(rin_lagani_to_bank_transaction_dto(rin_lagani))
         totals['debit_total'] += rin_lagani.amount
     # sort by date
-    transactions.sort(key=lambda tx: str_to_date(tx.date))
+    transactions.sort(key=lambda tx: date_to_ordinal(tx.date))
     # return transactions
     return transactions, totals
 
@@ -794,61 +1039,74 @@ def get_date_range_summary(session, start_date, end_date):
     :end date: end date inclusive
     :return: MemberTransactionDtos for rin laganis, MemberTransactionDtos for sawa asulis,  BankTransactionDtos for deposits, totals
     """
+    start, end = start_date.toordinal(), end_date.toordinal()
     zero = Decimal(0)
-    totals = {
-        'rin_lagani': zero,
-        'sawa_asuli': zero,
-        'byaj': zero,
-        'harjana': zero,
-        'bachat': zero,
-        'grand_total': zero,
-        'deposit': zero
-    }
+    # get all rin laganis in given date range along with member name
     rin_laganis = []
-    # get all rin laganis in given date range
-    for rin_lagani in session.query(RinLagani).all():
-        rin_lagani_date = str_to_date(rin_lagani.date)
-        if rin_lagani_date >= start_date and rin_lagani_date <= end_date:
-            dto = rin_lagani_to_transaction_dto(rin_lagani)
-            # create MemberTransactionDto from TransactionDto
-            rin_laganis.append(
-                MemberTransactionDto(rin_lagani.member.name, dto))
-            # update lagani total
-            totals['rin_lagani'] += rin_lagani.amount
-    # sort rin laganis
-    rin_laganis.sort(key=lambda tx: str_to_date(tx.transaction_dto.date))
-    # get all sawa sulis in given date range
+    rows = session.query(RinLagani, Member.name).join(Member).filter(
+        RinLagani.date_ordinal.between(start, end)).order_by(
+        RinLagani.date_ordinal, RinLagani.id)
+    for rin_lagani, member_name in rows:
+        dto = rin_lagani_to_transaction_dto(rin_lagani)
+        rin_laganis.append(MemberTransactionDto(member_name, dto))
+    # get all sawa sulis in given date range along with member name
     sawa_asulis = []
-    for sawa_asuli in session.query(SawaAsuli).all():
-        sawa_asuli_date = str_to_date(sawa_asuli.date)
-        if sawa_asuli_date >= start_date and sawa_asuli_date <= end_date:
-            dto = sawa_asuli_to_transaction_dto(sawa_asuli)
-            # create MemberTransactionDto from TransactionDto
-            sawa_asulis.append(
-                MemberTransactionDto(sawa_asuli.member.name, dto))
-            # update totals
-            totals['sawa_asuli'] += sawa_asuli.amount
-            totals['byaj'] += sawa_asuli.amount
-            totals['harjana'] += sawa_asuli.amount
-            totals['bachat'] += sawa_asuli.amount
-            totals['grand_total'] += dto.total
-    # sort sawa asuli
-    sawa_asulis.sort(key=lambda tx: str_to_date(tx.transaction_dto.date))
-    # get all bank transactions in given date range
-    bank_transactions = []
-    for bank_tx in session.query(BankTransaction).all():
-        # ignore if not a deposit
-        if bank_tx.type != BankTransactionTypes.DEPOSIT:
-            continue
-        bank_tx_date = str_to_date(bank_tx.date)
-        if bank_tx_date >= start_date and bank_tx_date <= end_date:
-            bank_transactions.append(to_bank_transaction_dto(bank_tx))
-            totals['deposit'] += bank_tx.amount
-    bank_transactions.sort(key=lambda tx: str_to_date(tx.date))
-
+    rows = session.query(SawaAsuli, Member.name).join(Member).filter(
+        SawaAsuli.date_ordinal.between(start, end)).order_by(
+        SawaAsuli.date_ordinal, SawaAsuli.id)
+    for sawa_asuli, member_name in rows:
+        dto = sawa_asuli_to_transaction_dto(sawa_asuli)
+        sawa_asulis.append(MemberTransactionDto(member_name, dto))
+    # get all deposits in given date range
+    bank_transactions = list(map(
+        to_bank_transaction_dto,
+        session.query(BankTransaction).filter(
+            BankTransaction.type == BankTransactionTypes.DEPOSIT,
+            BankTransaction.date_ordinal.between(start, end)).order_by(
+            BankTransaction.date_ordinal, BankTransaction.id)))
+    # totals are read from daily rollups maintained by database triggers
+    totals = get_range_totals(session, start, end)
     return rin_laganis, sawa_asulis, bank_transactions, totals
 
 
+def get_cumulative_totals(session, day_ordinal):
+    """
+    Get cumulative totals of all the days up to and including given day.
+    :param session: current database session
+    :param day_ordinal: day ordinal
+    :return: dict of cumulative totals of daily rollup columns
+    """
+    row = session.query(
+        DailyRollup.cum_rin_lagani, DailyRollup.cum_sawa_asuli,
+        DailyRollup.cum_byaj, DailyRollup.cum_harjana, DailyRollup.cum_bachat,
+        DailyRollup.cum_deposit).filter(
+        DailyRollup.day_ordinal <= day_ordinal).order_by(
+        DailyRollup.day_ordinal.desc()).first()
+    keys = ['rin_lagani', 'sawa_asuli', 'byaj', 'harjana', 'bachat',
+            'deposit']
+    if row is None:
+        return dict.fromkeys(keys, Decimal(0))
+    return dict(zip(keys, row))
+
+
+def get_range_totals(session, start_ordinal, end_ordinal):
+    """
+    Get totals of transactions between given day ordinals using the
+    cumulative totals of daily rollups.
+    :param session: current database session
+    :param start_ordinal: start day ordinal inclusive
+    :param end_ordinal: end day ordinal inclusive
+    :return: dict of rin_lagani, sawa_asuli, byaj, harjana, bachat,
+    grand_total and deposit totals
+    """
+    end_totals = get_cumulative_totals(session, end_ordinal)
+    start_totals = get_cumulative_totals(session, start_ordinal - 1)
+    totals = {key: end_totals[key] - start_totals[key] for key in end_totals}
+    totals['grand_total'] = (totals['sawa_asuli'] + totals['byaj']
+                             + totals['harjana'] + totals['bachat'])
+    return totals
+
+
 def get_monthly_transactions(session, date):
     """
     Get date range summary for given date's month
@@ -885,6 +1143,13 @@ def get_member_wise_summary(session):
     :return: MemberSummaryDto list and totals
     """
     zero = Decimal(0)
+    rows = session.query(
+        Member.name, MemberTotals.alya_rin, MemberTotals.rin_lagani,
+        MemberTotals.sawa_asuli, MemberTotals.byaj, MemberTotals.harjana,
+        MemberTotals.bachat, MemberTotals.banki_sawa).join(
+        MemberTotals, MemberTotals.member_id == Member.id).order_by(
+        Member.account_no)
+
     totals = {
         'alya_rin': zero,
         'total_rin_lagani': zero,
@@ -895,28 +1160,8 @@ def get_member_wise_summary(session):
         'banki_sawa': zero
     }
     member_summaries = []
-    # for every member
-    for member in session.query(Member).all():
-        dto = MemberSummaryDto.default()
-        dto.name = member.name
-        # for every rin lagani for member
-        for lagani in member.rin_laganis:
-            if lagani.is_alya_rin:
-                dto.alya_rin += lagani.amount
-            else:
-                dto.total_rin_lagani += lagani.amount
-            dto.banki_sawa += lagani.amount
-            # for every sawa asuli for the rin lagani
-            for asuli in lagani.sawa_asulis:
-                dto.total_sawa_asuli += asuli.amount
-                dto.total_byaj += asuli.byaj
-                dto.total_harjana += asuli.harjana
-                dto.total_bachat += asuli.bachat
-                dto.banki_sawa -= asuli.amount
-        # for every sawa asuli not related to rin lagani
-        for asuli in get_sawa_asulis_without_rin_lagani(session, member.id):
-            # it will only contain bachat
-            dto.total_bachat += asuli.bachat
+    for row in rows:
+        dto = MemberSummaryDto(*row)
         # add members total to overall total
         totals['alya_rin'] += dto.alya_rin
         totals['total_rin_lagani'] += dto.total_rin_lagani
@@ -925,34 +1170,136 @@ def get_member_wise_summary(session):
         totals['total_harjana'] += dto.total_harjana
         totals['total_bachat'] += dto.total_bachat
         totals['banki_sawa'] += dto.banki_sawa
-        # apeend dto to member_summaries
         member_summaries.append(dto)
 
     return member_summaries, totals
 
 
-def complete_year(session, year_start_date):
+@dataclass
+class CarryForwardDto:
+    """Alya rin carried forward to the next year for a member"""
+    member_id: int
+    account_no: int
+    name: str
+    alya_rin: Decimal
+    kista_per_month: Decimal
+    remarks: str
+
+
+def carry_forward_rows():
+    """
+    Create a select of the alya rin to carry forward for every member: the
+    banki sawa of the member's latest RinLagani when it is not cleared.
+    :return: subquery with member_id, alya_rin, kista_per_month and remarks
+    """
+    latest = select(
+        RinLagani.member_id, RinLagani.banki_sawa.label('alya_rin'),
+        RinLagani.kista_per_month, RinLagani.remarks,
+        func.row_number().over(
+            partition_by=RinLagani.member_id,
+            order_by=(RinLagani.date_ordinal.desc(), RinLagani.id.desc())
+        ).label('position')).where(
+        RinLagani.member_id.in_(select(Member.id))).subquery()
+    # rounded to paisa, float residue of a cleared rin lagani is not alya rin
+    return select(latest.c.member_id, latest.c.alya_rin,
+                  latest.c.kista_per_month, latest.c.remarks).where(
+        latest.c.position == 1,
+        func.round(latest.c.alya_rin, 2) > 0).subquery()
+
+
+def preview_complete_year(session):
+    """
+    Dry run of complete_year, find alya rin which would be carried forward
+    without changing anything.
+    :param session: current database session
+    :return: CarryForwardDto list ordered by account number
+    """
+    carry_forward = carry_forward_rows()
+    rows = session.query(carry_forward, Member.account_no, Member.name).join(
+        Member, Member.id == carry_forward.c.member_id).order_by(
+        Member.account_no).all()
+    return [CarryForwardDto(member_id=row.member_id,
+                            account_no=row.account_no, name=row.name,
+                            alya_rin=row.alya_rin,
+                            kista_per_month=row.kista_per_month,
+                            remarks=row.remarks) for row in rows]
+
+
+def complete_year(session, year_start_date, progress=None, archive_path=None):
+    """
+    Close the year: replace every member's RinLaganis and SawaAsulis with a
+    single alya rin of the latest RinLagani's banki sawa. Runs as a few set
+    based statements in the session's transaction.
+    :param session: current database session
+    :param year_start_date: date of the alya rin in format %Y-%m-%d
+    :param progress: optional callable taking step, total steps and message
+    :param archive_path: archive created by archive.archive_year to catalogue
+    :return: error message or None
+    """
     # check if date is valid
-    if str_to_date(year_start_date) is None:
+    year_start_ordinal = date_to_ordinal(year_start_date)
+    if year_start_ordinal is None:
         return 'Invalid year start date'
-    # for every member calculate alya rin
-    for member in get_member_list(session):
-        # create alya rin
-        rin_lagani = get_latest_rin_lagani(session, member.id)
-        alya_lagani = None
-        if not rin_lagani is None:
-            banki_sawa = calculate_banki_sawa(rin_lagani)
-            if banki_sawa > Decimal(0):
-                alya_lagani = RinLagani(date=year_start_date, amount=banki_sawa,
-                                       is_alya_rin=True,
-                                       kista_per_month=rin_lagani.kista_per_month,
-                                       remarks=rin_lagani.remarks,
-                                       member_id=member.id)
-        # delete all rin laganis for member
-        member.rin_laganis = []
-        # create alya rin lagani
-        if not alya_lagani is None:
-            session.add(alya_lagani)
-        # delete all sawa asulis of the member
-        for sawa_asuli in member.sawa_asulis:
-            session.delete(sawa_asuli)
+
+    steps = 5
+
+    def report(step, message):
+        if progress is not None:
+            progress(step, steps, message)
+
+    rin_laganis = RinLagani.__table__
+    sawa_asulis = SawaAsuli.__table__
+    member_ids = select(Member.id)
+    report(0, 'Preparing')
+    # rollups are rebuilt at the end, clearing them first also starts the
+    # transaction so that dropping triggers is rolled back on failure
+    session.execute(DailyRollup.__table__.delete())
+    # accrual snapshots are of the history deleted below
+    session.execute(AccrualSnapshotRow.__table__.delete())
+    session.execute(AccrualSnapshot.__table__.delete())
+    # row triggers would update totals once for every deleted row
+    drop_triggers(session)
+    last_id = session.execute(select(func.max(rin_laganis.c.id))).scalar()
+    if archive_path is not None:
+        ordinals = union_all(select(rin_laganis.c.date_ordinal),
+                             select(sawa_asulis.c.date_ordinal)).subquery()
+        first_ordinal = session.execute(
+            select(func.min(ordinals.c.date_ordinal))).scalar()
+        session.add(Archive(path=archive_path, year_start_date=year_start_date,
+                            start_ordinal=first_ordinal,
+                            end_ordinal=year_start_ordinal - 1))
+    report(1, 'Creating alya rin')
+    carry_forward = carry_forward_rows()
+    session.execute(rin_laganis.insert().from_select(
+        ['date', 'date_ordinal', 'amount', 'is_alya_rin', 'kista_per_month',
+         'remarks', 'member_id', 'banki_sawa'],
+        select(literal(year_start_date), literal(year_start_ordinal),
+               carry_forward.c.alya_rin, literal(True),
+               carry_forward.c.kista_per_month, carry_forward.c.remarks,
+               carry_forward.c.member_id,
+               carry_forward.c.alya_rin.label('banki_sawa'))))
+    report(2, 'Deleting sawa asulis')
+    session.execute(sawa_asulis.delete().where(
+        sawa_asulis.c.member_id.in_(member_ids)))
+    report(3, 'Deleting rin laganis')
+    if last_id is not None:
+        session.execute(rin_laganis.delete().where(
+            rin_laganis.c.member_id.in_(member_ids),
+            rin_laganis.c.id <= last_id))
+    report(4, 'Rebuilding ledger totals')
+    create_triggers(session)
+    rebuild_ledger_totals(session)
+    # objects loaded before closing the year are stale now
+    session.expire_all()
+    report(5, 'Completed')
+
+
+def rebuild_ledger_totals(session):
+    """
+    Rebuild banki sawa of every RinLagani, totals of every member and daily
+    rollups from the transactions.
+    :param session: current database session
+    """
+    rebuild_banki_sawa(session)
+    rebuild_member_totals(session)
+    rebuild_daily_rollups(session)
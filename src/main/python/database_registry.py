@@ -0,0 +1,158 @@
+"""
+Databases of several savings groups open in one process. The most recently
+used databases are kept open along with their member list, so switching back
+to one of them does not read the disk.
+"""
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import exc
+
+from database import (Session, MEMORY_DATABASE, create_database_engine,
+                      use_engine)
+from database_access import get_member_list, to_member_dto
+from migrations import initialize_database
+from working_copy import OPEN_COPIES
+
+
+@dataclass
+class OpenDatabase:
+    """Engine of an open database along with its cached data"""
+    path: str
+    engine: object
+    initialized: bool = False
+    member_list: list = None  # MemberDto list, None when not loaded
+    pinned: bool = False  # engine can not be reopened, never closed for space
+
+
+class DatabaseRegistry:
+    """Least recently used databases open in the process"""
+
+    def __init__(self, capacity=3, read_only=False, shared_cache=False,
+                 profile=None):
+        """
+        :param capacity: number of databases kept open besides pinned ones
+        :param read_only: open every database file read only
+        :param shared_cache: share page cache between connections of the
+        process
+        :param profile: storage profile, see create_database_engine
+        """
+        self.capacity = capacity
+        self.read_only = read_only
+        self.shared_cache = shared_cache
+        self.profile = profile
+        self.databases = OrderedDict()
+        self.current = None
+
+    def add(self, engine, initialized=True):
+        """
+        Register an already configured engine and make it current. The engine
+        is pinned, it may be an in memory database or a working copy that can
+        not be opened again from its path.
+        :param engine: database engine
+        :param initialized: whether initialize_database was run for it
+        :return: OpenDatabase
+        """
+        path = engine.url.database or MEMORY_DATABASE
+        if path.startswith('file:'):
+            # URI of read only, shared cache and shared memory databases
+            path = path[len('file:'):]
+            if engine.url.query.get('mode') == 'memory':
+                path = MEMORY_DATABASE
+        if path != MEMORY_DATABASE:
+            path = os.path.abspath(path)
+        self.databases[path] = OpenDatabase(path, engine, initialized,
+                                            pinned=True)
+        return self.switch(path)
+
+    def open(self, path):
+        """
+        Make the database at path current, opening it if it is not open. A
+        newly opened database must be initialized with initialize_current.
+        :param path: database file path
+        :return: OpenDatabase
+        """
+        if path != MEMORY_DATABASE:
+            path = os.path.abspath(path)
+        if path not in self.databases:
+            copy = OPEN_COPIES.get(path)
+            if copy is not None:
+                # reads of the file must go through its working copy
+                self.databases[path] = OpenDatabase(path, copy.engine,
+                                                    initialized=True,
+                                                    pinned=True)
+            else:
+                engine = create_database_engine(path, self.read_only,
+                                                self.shared_cache,
+                                                self.profile)
+                # in memory database is lost when its engine is disposed
+                self.databases[path] = OpenDatabase(
+                    path, engine, pinned=path == MEMORY_DATABASE)
+        return self.switch(path)
+
+    def switch(self, path):
+        opened = self.databases[path]
+        self.databases.move_to_end(path)
+        # close least recently used databases, pinned ones are not counted
+        unpinned = [path for path, database in self.databases.items()
+                    if not database.pinned]
+        for evicted in unpinned[:max(len(unpinned) - self.capacity, 0)]:
+            close_database(self.databases.pop(evicted))
+        self.current = opened
+        use_engine(opened.engine)
+        return opened
+
+    def initialize_current(self):
+        """
+        Create or upgrade the schema of the current database if needed. Read
+        only databases are used as they are.
+        """
+        if not self.current.initialized:
+            if not self.read_only:
+                initialize_database(self.current.engine)
+            self.current.initialized = True
+
+    def member_list(self):
+        """
+        Get cached member list of the current database. Works before the
+        database is initialized as long as it has the members table.
+        :return: MemberDto list
+        """
+        if self.current.member_list is None:
+            try:
+                with Session.begin() as session:
+                    member_list = list(map(to_member_dto,
+                                           get_member_list(session)))
+            except exc.OperationalError:
+                # new database without tables
+                return []
+            self.current.member_list = member_list
+        return self.current.member_list
+
+    def set_member_list(self, member_list):
+        """
+        Replace cached member list of the current database after members
+        are changed
+        :param member_list: MemberDto list
+        """
+        self.current.member_list = member_list
+
+    def close_all(self):
+        for opened in self.databases.values():
+            close_database(opened)
+        self.databases.clear()
+        self.current = None
+
+
+def close_database(opened):
+    """
+    Close the engine of an open database. A working copy is closed with its
+    queued writes written to the file.
+    :param opened: OpenDatabase
+    """
+    copy = OPEN_COPIES.get(opened.path)
+    if copy is not None and copy.engine is opened.engine:
+        copy.close()
+    else:
+        opened.engine.dispose()
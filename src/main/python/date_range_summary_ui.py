@@ -10,9 +10,10 @@ from PySide2.QtWidgets import (QMainWindow, QWidget, QTableView, QVBoxLayout,
 from nepali_datetime import date
 from openpyxl import Workbook
 
-from database import Session
-from database_access import get_monthly_transactions, get_date_range_summary
-from util import str_to_date, table_models_to_excel_sheet
+from database import get_engine
+from federated import get_federated_date_range_summary
+from util import (str_to_date, get_month_start, get_month_end,
+                  table_models_to_excel_sheet)
 
 
 class SawaAsuliModel(QAbstractTableModel):
@@ -300,9 +301,9 @@ class DateRangeSummaryWindow(QMainWindow):
         # load data
         dt = nepali_datetime.date(self.years[year_index],
                                   self.months[month_index], 1)
-        with Session.begin() as session:
-            transactions = get_monthly_transactions(session, dt)
-            rin_laganis, sawa_asulis, bank_transactions, totals = transactions
+        transactions = get_federated_date_range_summary(
+            get_engine(), get_month_start(dt), get_month_end(dt))
+        rin_laganis, sawa_asulis, bank_transactions, totals = transactions
         # update data
         self.update_data(rin_laganis, sawa_asulis, bank_transactions, totals)
 
@@ -313,10 +314,10 @@ class DateRangeSummaryWindow(QMainWindow):
         # if start date or end date is invalid ignore
         if start_date is None or end_date is None:
             return
-        # load date
-        with Session.begin() as session:
-            transactions = get_date_range_summary(session, start_date, end_date)
-            rin_laganis, sawa_asulis, bank_transactions, totals = transactions
+        # load date including archived years
+        transactions = get_federated_date_range_summary(get_engine(),
+                                                        start_date, end_date)
+        rin_laganis, sawa_asulis, bank_transactions, totals = transactions
         # update data
         self.update_data(rin_laganis, sawa_asulis, bank_transactions,
                          totals)
@@ -0,0 +1,108 @@
+"""
+Expected collection of every member on a collection day. Ledger state of all
+the members is loaded in one query, then days, byaj, kista and banki sawa are
+computed column by column over integer paisa arrays, so amounts are exact and
+no Decimal arithmetic is done per member.
+"""
+from array import array
+from dataclasses import dataclass
+from decimal import Decimal
+
+from database_access import BYAJ_RATE, SawaAsuliDto, get_ledger_states
+from util import date_to_ordinal
+
+DAYS_IN_YEAR = 365
+
+
+@dataclass
+class ExpectedCollectionDto:
+    member_id: int
+    account_no: int
+    member_name: str
+    rin_lagani_id: int  # None if nothing is left to pay
+    banki_sawa: Decimal
+    start_date: str  # first day byaj is charged for, None without rin
+    days: int
+    kista: Decimal
+    byaj: Decimal
+    banki_sawa_after: Decimal  # banki sawa once kista is paid
+
+
+def to_paisa(values):
+    """
+    Convert rupees to an array of integer paisa
+    :param values: iterable of Decimal rupees
+    :return: array of paisa
+    """
+    return array('q', (int(value * 100) for value in values))
+
+
+def to_rupees(paisa):
+    return Decimal(paisa).scaleb(-2)
+
+
+def calculate_byaj_paisa(banki_sawa, days, rate=BYAJ_RATE):
+    """
+    Calculate byaj of every member rounded half up to paisa
+    :param banki_sawa: array of banki sawa in paisa
+    :param days: array of days byaj is charged for
+    :param rate: yearly byaj rate
+    :return: array of byaj in paisa
+    """
+    # rate as an exact fraction, 0.12 = 12 / 100
+    numerator, denominator = rate.as_integer_ratio()
+    denominator *= DAYS_IN_YEAR
+    return array('q', ((b * d * numerator * 2 + denominator)
+                       // (denominator * 2)
+                       for b, d in zip(banki_sawa, days)))
+
+
+def get_expected_collections(session, date, rate=BYAJ_RATE):
+    """
+    Calculate kista and byaj due from every member on a collection day
+    :param session: current database session
+    :param date: collection date in format %Y-%m-%d
+    :param rate: yearly byaj rate
+    :return: ExpectedCollectionDto list ordered by account number
+    """
+    date_ordinal = date_to_ordinal(date)
+    if date_ordinal is None:
+        raise ValueError('Invalid collection date')
+    states = list(get_ledger_states(session).values())
+    banki_sawa = to_paisa(state.banki_sawa for state in states)
+    kista_per_month = to_paisa(state.kista_per_month for state in states)
+    # byaj runs from the rin lagani date or the day after last sawa asuli
+    start = array('q', (
+        (state.last_transaction_ordinal or 0)
+        + (0 if state.last_is_rin_lagani else 1) for state in states))
+    days = array('q', (
+        max(date_ordinal - s + 1, 0) if b > 0 else 0
+        for s, b in zip(start, banki_sawa)))
+    byaj = calculate_byaj_paisa(banki_sawa, days, rate)
+    kista = array('q', (min(k, max(b, 0))
+                        for k, b in zip(kista_per_month, banki_sawa)))
+    banki_sawa_after = array('q', (b - k for b, k in zip(banki_sawa, kista)))
+    return [ExpectedCollectionDto(
+        member_id=state.member_id, account_no=state.account_no,
+        member_name=state.member_name,
+        rin_lagani_id=state.rin_lagani_id if banki_sawa[i] > 0 else None,
+        banki_sawa=to_rupees(banki_sawa[i]),
+        start_date=state.start_date() if banki_sawa[i] > 0 else None,
+        days=days[i], kista=to_rupees(kista[i]), byaj=to_rupees(byaj[i]),
+        banki_sawa_after=to_rupees(banki_sawa_after[i]))
+        for i, state in enumerate(states)]
+
+
+def to_sawa_asulis(collections, date):
+    """
+    Create sawa asulis pre-filled with the expected kista and byaj
+    :param collections: ExpectedCollectionDto list
+    :param date: collection date in format %Y-%m-%d
+    :return: SawaAsuliDto list in order of collections
+    """
+    zero = Decimal(0)
+    return [SawaAsuliDto(id=None, date=date, amount=collection.kista,
+                         byaj=collection.byaj, harjana=zero, bachat=zero,
+                         remarks='', rin_lagani_id=collection.rin_lagani_id,
+                         member_id=collection.member_id)
+            for collection in collections]
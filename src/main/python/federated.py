@@ -0,0 +1,143 @@
+"""
+Read functions of database_access spanning the live database and archives of
+closed years. Every database is read in its own thread with its own read only
+connection and the ordered results are merged.
+"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from sqlalchemy.orm import sessionmaker
+
+from archive import open_archive
+from database import Archive, MemberTotals
+from database_access import get_transactions_by_member_id, get_date_range_summary
+from util import date_to_ordinal
+
+# maximum databases read at the same time
+MAX_WORKERS = 4
+
+
+def archive_paths(session, start_ordinal=None, end_ordinal=None):
+    """
+    Find archives having transactions between given day ordinals. Archives
+    outside the range are pruned using the catalogue without opening them.
+    :param session: live database session
+    :param start_ordinal: start day ordinal inclusive, None for no limit
+    :param end_ordinal: end day ordinal inclusive, None for no limit
+    :return: archive paths, oldest first
+    """
+    query = session.query(Archive.path).filter(
+        Archive.start_ordinal.isnot(None))
+    if start_ordinal is not None:
+        query = query.filter(Archive.end_ordinal >= start_ordinal)
+    if end_ordinal is not None:
+        query = query.filter(Archive.start_ordinal <= end_ordinal)
+    return [row.path for row in query.order_by(Archive.end_ordinal)]
+
+
+def read_archive(path, read):
+    """
+    Call read with a session of a read only archive
+    :param path: archive file path
+    :param read: callable taking a session
+    :return: result of read
+    """
+    engine = open_archive(path)
+    try:
+        with sessionmaker(bind=engine).begin() as session:
+            return read(session)
+    finally:
+        engine.dispose()
+
+
+def read_all(engine, start_ordinal, end_ordinal, read):
+    """
+    Call read on the archives in range and on the live database in parallel
+    :param engine: live database engine
+    :param start_ordinal: start day ordinal inclusive, None for no limit
+    :param end_ordinal: end day ordinal inclusive, None for no limit
+    :param read: callable taking a session
+    :return: results of archives oldest first, followed by live database's
+    """
+    live_session = sessionmaker(bind=engine)
+    with live_session.begin() as session:
+        paths = archive_paths(session, start_ordinal, end_ordinal)
+
+    def read_live():
+        with live_session.begin() as session:
+            return read(session)
+
+    if not paths:
+        return [read_live()]
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [executor.submit(read_archive, path, read) for path in paths]
+        futures.append(executor.submit(read_live))
+        return [future.result() for future in futures]
+
+
+def transaction_order(transaction):
+    return date_to_ordinal(transaction.date), not transaction.is_rin_lagani
+
+
+def get_federated_transactions_by_member_id(engine, member_id,
+                                            start_ordinal=None,
+                                            end_ordinal=None):
+    """
+    Get transactions of a member across the live database and archives
+    :param engine: live database engine
+    :param member_id: Member id
+    :param start_ordinal: only read years after this day ordinal if given
+    :param end_ordinal: only read years before this day ordinal if given
+    :return: list of TransactionDto for given member and totals
+    """
+    def read(session):
+        transactions, totals = get_transactions_by_member_id(session,
+                                                             member_id)
+        member_totals = session.get(MemberTotals, member_id)
+        alya_rin = Decimal(0)
+        if member_totals is not None:
+            alya_rin = member_totals.alya_rin
+        return transactions, totals, alya_rin
+
+    results = read_all(engine, start_ordinal, end_ordinal, read)
+    # ids of archived transactions may be reused by the live database
+    for result in results[:-1]:
+        for transaction in result[0]:
+            transaction.is_archived = True
+    transactions = list(heapq.merge(*[result[0] for result in results],
+                                    key=transaction_order))
+    totals = {key: sum((result[1][key] for result in results), Decimal(0))
+              for key in results[-1][1]}
+    # alya rin of later years is carried forward from the earlier years
+    totals['lagani_total'] -= sum((result[2] for result in results[1:]),
+                                  Decimal(0))
+    totals['banki_sawa'] = results[-1][1]['banki_sawa']
+    return transactions, totals
+
+
+def get_federated_date_range_summary(engine, start_date, end_date):
+    """
+    Find all the transactions between given date across the live database
+    and archives
+    :param engine: live database engine
+    :param start_date: start date inclusive
+    :param end_date: end date inclusive
+    :return: MemberTransactionDtos for rin laganis, MemberTransactionDtos for sawa asulis,  BankTransactionDtos for deposits, totals
+    """
+    results = read_all(
+        engine, start_date.toordinal(), end_date.toordinal(),
+        lambda session: get_date_range_summary(session, start_date, end_date))
+
+    def merge(index):
+        return list(heapq.merge(
+            *[result[index] for result in results],
+            key=lambda tx: date_to_ordinal(tx.transaction_dto.date)))
+
+    rin_laganis, sawa_asulis = merge(0), merge(1)
+    # bank transactions are kept in the live database
+    bank_transactions = results[-1][2]
+    totals = {key: sum((result[3][key] for result in results), Decimal(0))
+              for key in results[-1][3]}
+    totals['deposit'] = results[-1][3]['deposit']
+    return rin_laganis, sawa_asulis, bank_transactions, totals
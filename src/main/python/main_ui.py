@@ -1,14 +1,21 @@
-from PySide2.QtCore import QSize, Qt, Slot
+import os
+
+from PySide2.QtCore import QSize, Qt, Slot, QTimer
 from PySide2.QtGui import QIcon, QKeySequence
 from PySide2.QtWidgets import (
     QMainWindow, QHBoxLayout, QWidget, QScrollArea, QStatusBar, QAction, QMenu,
-    QToolBar
+    QToolBar, QFileDialog
 )
 
+from backup import BackupService
+from database import get_engine, get_database_path
+
 from member_detail_ui import MemberDetailView
 from member_list_ui import MemberListView
 from settings_ui import SettingsWindow, AboutDialog
 from bank_transaction_ui import BankTransactionsWindow
+from accrual_ui import AccrualWindow
+from collection_ui import CollectionWindow
 from date_range_summary_ui import DateRangeSummaryWindow
 from member_wise_summary import MemberWiseSummaryWindow
 
@@ -16,7 +23,7 @@ from member_wise_summary import MemberWiseSummaryWindow
 class MainWindow(QMainWindow):
     """This is application's main window."""
 
-    def __init__(self, app_ctxt, *args, **kwargs):
+    def __init__(self, app_ctxt, registry, *args, **kwargs):
         super(MainWindow, self).__init__(*args, **kwargs)
         self.app_ctxt = app_ctxt
         self.settings_window = None
@@ -24,11 +31,23 @@ class MainWindow(QMainWindow):
         self.bank_transactions_window = None
         self.date_range_summary_window = None
         self.member_wise_summary_window = None
+        self.collection_window = None
+        self.accrual_window = None
+        # databases open in the application, the configured one is current
+        self.registry = registry
+        self.registry.add(get_engine())
+        self.registry.initialize_current()
         self.__setup_ui()
+        # back up current database on a schedule
+        self.backup_service = BackupService(get_database_path, parent=self)
+        self.backup_service.backup_finished.connect(
+            lambda path: self.update_status_bar(f'Backed up to {path}', 5000))
+        self.backup_service.backup_failed.connect(
+            lambda error: self.update_status_bar(f'Backup failed: {error}'))
 
     def __setup_ui(self):
         """Sets up main UI"""
-        self.setWindowTitle('SBTTK')
+        self.update_window_title()
         self.setMinimumSize(QSize(800, 600))
         stylesheet = open(self.app_ctxt.get_resource('style.qss'), 'r').read()
         self.setStyleSheet(stylesheet)
@@ -43,7 +62,7 @@ class MainWindow(QMainWindow):
         self.hbox_layout.setContentsMargins(0, 0, 0, 0)
         self.hbox_layout.setSpacing(0)
         # create member list view
-        self.member_list_view = MemberListView()
+        self.member_list_view = MemberListView(self.registry.member_list())
         self.hbox_layout.addWidget(self.member_list_view)
         # create member detail view
         self.member_details_view = MemberDetailView(self.app_ctxt)
@@ -55,6 +74,9 @@ class MainWindow(QMainWindow):
         self.member_details_view.member_data_changed.connect(
             self.member_list_view.update_member_list
         )
+        self.member_details_view.member_data_changed.connect(
+            self.cache_member_list
+        )
         self.member_details_view.status_bar_updated.connect(
             self.update_status_bar
         )
@@ -85,11 +107,18 @@ class MainWindow(QMainWindow):
 
     def __create_actions(self):
         """Creates actions and connects their signals to slots"""
-        # member
+        # database
+        self.open_database = QAction('&Open database...', self)
+        self.open_database.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_O))
+        self.open_database.triggered.connect(self.handle_open_database)
         # member
         self.add_member = QAction(self.add_member_icon, '&Add member', self)
         self.add_member.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_A))
         self.add_member.triggered.connect(self.handle_add_member)
+        # sawa asulis of all members for a day
+        self.collection_day = QAction(self.add_icon, '&Collection day', self)
+        self.collection_day.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_L))
+        self.collection_day.triggered.connect(self.handle_collection_day)
         # monthly summary
         self.date_range_summary = QAction(self.summary_icon,
                                           '&Date range summary', self)
@@ -102,6 +131,10 @@ class MainWindow(QMainWindow):
         self.member_wise_summary.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_M))
         self.member_wise_summary.triggered.connect(
             self.handle_member_wise_summary)
+        # accrued byaj
+        self.accrued_byaj = QAction(self.summary_icon, 'Accrued b&yaj', self)
+        self.accrued_byaj.setShortcut(QKeySequence(Qt.CTRL + Qt.Key_Y))
+        self.accrued_byaj.triggered.connect(self.handle_accrued_byaj)
         # view bank transactions
         self.view_bank_transactions = QAction(self.bank_icon,
                                               '&View bank transactions',
@@ -129,13 +162,17 @@ class MainWindow(QMainWindow):
 
     def __setup_menu_and_toolbar(self):
         """Creates menu and toolbar for the main UI."""
+        # create database menu, recent databases are listed when it is shown
+        self.database_menu = QMenu('Database')
+        self.database_menu.aboutToShow.connect(self.update_database_menu)
         # craete member menu
         member_menu = QMenu('Member')
-        member_menu.addAction(self.add_member)
+        member_menu.addActions([self.add_member, self.collection_day])
         # create summary menu
         summary_menu = QMenu('Summary')
         summary_menu.addActions(
-            [self.date_range_summary, self.member_wise_summary])
+            [self.date_range_summary, self.member_wise_summary,
+             self.accrued_byaj])
         # create bank transaction menu
         bank_transaction_menu = QMenu('Bank transaction')
         bank_transaction_menu.addAction(self.view_bank_transactions)
@@ -146,6 +183,7 @@ class MainWindow(QMainWindow):
              self.exit_app])
         # create main menu
         menu = self.menuBar()
+        menu.addMenu(self.database_menu)
         menu.addMenu(member_menu)
         menu.addMenu(summary_menu)
         menu.addMenu(bank_transaction_menu)
@@ -172,6 +210,74 @@ class MainWindow(QMainWindow):
         else:
             self.statusBar().showMessage(message, timeout=time)
 
+    def update_window_title(self):
+        name = os.path.basename(self.registry.current.path)
+        self.setWindowTitle(f'SBTTK - {name}')
+
+    @Slot()
+    def update_database_menu(self):
+        """List open databases, most recently used first."""
+        self.database_menu.clear()
+        self.database_menu.addAction(self.open_database)
+        self.database_menu.addSeparator()
+        for path in reversed(self.registry.databases):
+            action = self.database_menu.addAction(path)
+            action.setCheckable(True)
+            action.setChecked(path == self.registry.current.path)
+            action.triggered.connect(
+                lambda checked=False, path=path: self.switch_database(path))
+
+    @Slot()
+    def handle_open_database(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, 'Open database', '', 'Database (*.db)',
+            options=QFileDialog.DontConfirmOverwrite)
+        if path:
+            self.switch_database(path)
+
+    def switch_database(self, path):
+        """
+        Show the database at path. Member list is shown first, a newly opened
+        database is initialized after the window is repainted.
+        :param path: database file path
+        """
+        opened = self.registry.open(path)
+        # windows showing data of the previous database
+        for window in (self.settings_window, self.bank_transactions_window,
+                       self.date_range_summary_window,
+                       self.member_wise_summary_window,
+                       self.collection_window, self.accrual_window):
+            if window is not None:
+                window.close()
+        self.settings_window = None
+        self.bank_transactions_window = None
+        self.date_range_summary_window = None
+        self.member_wise_summary_window = None
+        self.collection_window = None
+        self.accrual_window = None
+        # clear member details without reloading member list from database
+        self.member_details_view.blockSignals(True)
+        self.member_details_view.set_member(None)
+        self.member_details_view.blockSignals(False)
+        self.member_list_view.set_member_list(self.registry.member_list())
+        self.update_window_title()
+        if not opened.initialized:
+            self.update_status_bar('Loading database...')
+            QTimer.singleShot(0, self.finish_opening_database)
+        else:
+            self.update_status_bar(f'Switched to {opened.path}', 5000)
+
+    @Slot()
+    def finish_opening_database(self):
+        self.registry.initialize_current()
+        # a new database gets its tables only now
+        self.member_list_view.set_member_list(self.registry.member_list())
+        self.update_status_bar(f'Opened {self.registry.current.path}', 5000)
+
+    @Slot()
+    def cache_member_list(self):
+        self.registry.set_member_list(self.member_list_view.model.member_list)
+
     @Slot()
     def handle_add_member(self):
         self.member_details_view.set_member(None)
@@ -214,4 +320,17 @@ class MainWindow(QMainWindow):
     def handle_member_wise_summary(self):
         self.member_wise_summary_window = None
         self.member_wise_summary_window = MemberWiseSummaryWindow(parent=self)
-        self.member_wise_summary_window.showMaximized()
\ No newline at end of file
+        self.member_wise_summary_window.showMaximized()
+
+    @Slot()
+    def handle_accrued_byaj(self):
+        self.accrual_window = None
+        self.accrual_window = AccrualWindow(parent=self)
+        self.accrual_window.showMaximized()
+
+    @Slot()
+    def handle_collection_day(self):
+        self.collection_window = CollectionWindow(self.app_ctxt, parent=self)
+        self.collection_window.collections_saved.connect(
+            self.member_details_view.handle_rin_lagani_or_sawa_asuli_changed)
+        self.collection_window.showMaximized()
@@ -7,11 +7,12 @@ from PySide2.QtWidgets import (QVBoxLayout, QLabel, QWidget, QTableView,
                                QFormLayout, QMessageBox, QFileDialog)
 from openpyxl import Workbook
 
-from database import Session, RinLagani, SawaAsuli
+from database import Session, RinLagani, SawaAsuli, get_engine
 from database_access import (MemberDto, to_member, to_member_dto,
                              get_member_by_id, save_or_update_member,
-                             delete_member_by_id, get_transactions_by_member_id,
-                             delete_rin_lagani_by_id, delete_sawa_asuli_by_id)
+                             delete_member_by_id, delete_rin_lagani_by_id,
+                             delete_sawa_asuli_by_id)
+from federated import get_federated_transactions_by_member_id
 from rin_lagani_ui import RinLaganiWindow
 from sawa_asuli_ui import SawaAsuliWindow
 from util import table_models_to_excel_sheet
@@ -27,9 +28,10 @@ class TransactionsTableModel(QAbstractTableModel):
         self.load_data()
 
     def load_data(self):
-        with Session.begin() as session:
-            self.transactions, self.totals = get_transactions_by_member_id(
-                session, self.member_id)
+        # closed years are read from their archives
+        self.transactions, self.totals = \
+            get_federated_transactions_by_member_id(get_engine(),
+                                                    self.member_id)
 
     def data(self, index, role):
         if role == Qt.DisplayRole:
@@ -212,13 +214,14 @@ class MemberDetailView(QWidget):
         indexes = self.transactions_table.selectedIndexes()
         if not indexes is None and len(indexes) > 0:
             row = indexes[0].row()
-            # can view any transaction
-            if row < len(self.model.transactions):
+            # archived transactions can not be opened from live database
+            if (row < len(self.model.transactions)
+                    and not self.model.transactions[row].is_archived):
                 self.view_button.setEnabled(True)
-            # only allow edit and delete to last transactions
-            if row == len(self.model.transactions) - 1:
-                self.edit_button.setEnabled(True)
-                self.delete_button.setEnabled(True)
+                # only allow edit and delete to last transactions
+                if row == len(self.model.transactions) - 1:
+                    self.edit_button.setEnabled(True)
+                    self.delete_button.setEnabled(True)
 
     def clear_inputs(self):
         self.account_no_input.clear()
@@ -228,7 +231,6 @@ class MemberDetailView(QWidget):
     def update_model(self):
         self.model.member_id = self.member_dto.id
         self.model.load_data()
-        self.model.load_data()
         self.model.layoutChanged.emit()
 
     @Slot()
@@ -8,10 +8,13 @@ from database_access import get_member_list, to_member_dto
 
 
 class MemberListModel(QAbstractListModel):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, member_list=None, *args, **kwargs):
         super(MemberListModel, self).__init__(*args, **kwargs)
         self.member_list = []
-        self.load_data()
+        if member_list is None:
+            self.load_data()
+        else:
+            self.member_list = member_list
 
     def load_data(self):
         with Session.begin() as session:
@@ -31,11 +34,11 @@ class MemberListView(QWidget):
 
     member_selection_changed = Signal(int)
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, member_list=None, *args, **kwargs):
         super(MemberListView, self).__init__(*args, **kwargs)
-        self.__setup_ui()
+        self.__setup_ui(member_list)
 
-    def __setup_ui(self):
+    def __setup_ui(self, member_list):
         self.setContentsMargins(0, 0, 0, 0)
         self.setMinimumWidth(150)
         self.setMaximumWidth(300)
@@ -45,7 +48,7 @@ class MemberListView(QWidget):
         self.search_box.setPlaceholderText('Member name...')
         # create list view
         self.list_view = QListView()
-        self.model = MemberListModel()
+        self.model = MemberListModel(member_list)
         self.proxy_model = QSortFilterProxyModel()
         self.proxy_model.setSourceModel(self.model)  # proxy to filter names
         self.list_view.setModel(self.proxy_model)
@@ -86,3 +89,10 @@ class MemberListView(QWidget):
         self.model.load_data()
         self.model.layoutChanged.emit()
         self.list_view.selectionModel().clearSelection()
+
+    def set_member_list(self, member_list):
+        """Show given member list, e.g. after switching database."""
+        self.model.beginResetModel()
+        self.model.member_list = member_list
+        self.model.endResetModel()
+        self.list_view.selectionModel().clearSelection()
@@ -0,0 +1,205 @@
+"""
+Versioned schema migrations. New tables are created by create_all, migrations
+bring tables of older databases up to date with the models and fill derived
+data. Applied migrations are recorded in the schema_versions table, so a
+database which is up to date is not touched at startup.
+
+Every migration must be safe to run again, a migration interrupted by a crash
+is run again at the next start. Backfills commit in batches so that a large
+database does not hold a single long transaction.
+"""
+from sqlalchemy import func, inspect, select, text
+
+from database import (Base, Member, RinLagani, SawaAsuli, BankTransaction,
+                      Settings, SchemaVersion, create_triggers, drop_triggers,
+                      rebuild_banki_sawa, rebuild_member_totals,
+                      rebuild_daily_rollups)
+from util import date_to_ordinal
+
+# rows updated in a single backfill transaction
+BATCH_SIZE = 1000
+
+
+def add_missing_columns(connection, table):
+    """
+    Add columns of the model's table which are missing in the database.
+    :param connection: database connection
+    :param table: table of the model
+    :return: list of added column names
+    """
+    existing = [c['name'] for c in inspect(connection).get_columns(table.name)]
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        ddl = (f'ALTER TABLE {table.name} ADD COLUMN {column.name} '
+               f'{column.type.compile(connection.dialect)}')
+        if column.server_default is not None:
+            if not column.nullable:
+                ddl += ' NOT NULL'
+            ddl += f" DEFAULT '{column.server_default.arg}'"
+        connection.execute(text(ddl))
+        added.append(column.name)
+    return added
+
+
+def backfill_date_ordinals(engine, table, progress):
+    """
+    Fill date_ordinal for rows of the given table where it is missing, one
+    batch per transaction.
+    :param engine: database engine
+    :param table: table having date and date_ordinal columns
+    :param progress: callable taking message, done and total
+    """
+    missing = table.c.date_ordinal == None
+    with engine.begin() as connection:
+        total = connection.execute(
+            select(func.count()).select_from(table).where(missing)).scalar()
+    # rows with invalid dates stay missing, walk by id to skip them
+    done, last_id = 0, 0
+    while done < total:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.date).where(
+                    missing, table.c.id > last_id).order_by(
+                    table.c.id).limit(BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            connection.execute(
+                text(f'UPDATE {table.name} SET date_ordinal = :ordinal '
+                     'WHERE id = :row_id'),
+                [{'row_id': row.id, 'ordinal': date_to_ordinal(row.date)}
+                 for row in rows])
+        done, last_id = done + len(rows), rows[-1].id
+        progress(f'Filling dates of {table.name}', done, total)
+
+
+def add_date_ordinals(engine, progress):
+    for model in (RinLagani, SawaAsuli, BankTransaction):
+        table = model.__table__
+        with engine.begin() as connection:
+            add_missing_columns(connection, table)
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        backfill_date_ordinals(engine, table, progress)
+
+
+def add_banki_sawa(engine, progress):
+    with engine.begin() as connection:
+        add_missing_columns(connection, RinLagani.__table__)
+        rebuild_banki_sawa(connection)
+
+
+def fill_member_totals(engine, progress):
+    with engine.begin() as connection:
+        rebuild_member_totals(connection)
+
+
+def fill_daily_rollups(engine, progress):
+    with engine.begin() as connection:
+        rebuild_daily_rollups(connection)
+
+
+def add_money_in_paisa(engine, progress):
+    with engine.begin() as connection:
+        add_missing_columns(connection, Settings.__table__)
+
+
+def round_ledger_totals(engine, progress):
+    # totals kept by earlier triggers carry float error, triggers rounding
+    # them are created once the migration is applied
+    with engine.begin() as connection:
+        rebuild_banki_sawa(connection)
+        rebuild_member_totals(connection)
+        rebuild_daily_rollups(connection)
+
+
+def recreate_triggers(engine, progress):
+    # triggers of earlier versions exist, CREATE TRIGGER IF NOT EXISTS would
+    # keep their bodies
+    with engine.begin() as connection:
+        drop_triggers(connection)
+        create_triggers(connection)
+
+
+# version, description and function taking engine and progress callable
+MIGRATIONS = [
+    (1, 'add date ordinals', add_date_ordinals),
+    (2, 'add banki sawa', add_banki_sawa),
+    (3, 'fill member totals', fill_member_totals),
+    (4, 'fill daily rollups', fill_daily_rollups),
+    (5, 'add money in paisa setting', add_money_in_paisa),
+    (6, 'round ledger totals', round_ledger_totals),
+    (7, 'check edits of older transactions', recreate_triggers),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(connection):
+    """
+    Return version of the last applied migration
+    :param connection: database connection or session
+    :return: schema version, 0 if no migration is applied
+    """
+    return connection.execute(
+        select(func.coalesce(func.max(SchemaVersion.version), 0))).scalar()
+
+
+def migrate(engine, progress=None):
+    """
+    Apply pending migrations
+    :param engine: database engine
+    :param progress: optional callable taking message, done and total
+    :return: list of applied migration versions
+    """
+    def report(message, done, total):
+        if progress is not None:
+            progress(message, done, total)
+
+    with engine.begin() as connection:
+        version = get_schema_version(connection)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        # triggers are missing if a crash happened before they were created
+        with engine.begin() as connection:
+            create_triggers(connection)
+        return []
+    # triggers are recreated once all the columns they use exist
+    with engine.begin() as connection:
+        drop_triggers(connection)
+    for number, (version, name, migration) in enumerate(pending):
+        report(f'Upgrading database: {name}', number, len(pending))
+        migration(engine, report)
+        with engine.begin() as connection:
+            connection.execute(SchemaVersion.__table__.insert().values(
+                version=version, name=name))
+    with engine.begin() as connection:
+        create_triggers(connection)
+    report('Upgraded database', len(pending), len(pending))
+    return [m[0] for m in pending]
+
+
+def initialize_database(engine, progress=None):
+    """
+    Create missing tables, apply pending migrations and create the settings
+    of a new database.
+    :param engine: database engine
+    :param progress: optional callable taking message, done and total
+    """
+    is_new = not inspect(engine).has_table(Member.__tablename__)
+    Base.metadata.create_all(engine)
+    if is_new:
+        # tables are created at the current schema version
+        with engine.begin() as connection:
+            connection.execute(SchemaVersion.__table__.insert(), [
+                {'version': version, 'name': name}
+                for version, name, _ in MIGRATIONS])
+    else:
+        migrate(engine, progress)
+    with engine.begin() as connection:
+        settings = connection.execute(text(
+            'SELECT COUNT(*) FROM settings')).scalar()
+        if settings == 0:
+            connection.execute(Settings.__table__.insert().values(
+                total_kista_months=40,
+                account_no='00201300028079000001 (Nabjeeban Dhangadhi)'))
@@ -8,8 +8,8 @@ from PySide2.QtWidgets import (QMainWindow, QLabel, QLineEdit, QDoubleSpinBox,
                                QVBoxLayout)
 
 from database import Session
-from database_access import (RinLaganiDto, to_rin_lagani, get_rin_lagani_by_id,
-                             save_or_update_rin_lagani, get_member_by_id)
+from database_access import (RinLaganiDto, to_rin_lagani, get_entry_context,
+                             save_or_update_rin_lagani)
 
 
 class RinLaganiWindow(QMainWindow):
@@ -17,13 +17,14 @@ class RinLaganiWindow(QMainWindow):
 
     def __init__(self, member_id, rin_lagani_id, app_ctxt, *args, **kwargs):
         super(RinLaganiWindow, self).__init__(*args, **kwargs)
-        # check if member exists
+        # load member and the rin lagani being edited
         with Session.begin() as session:
-            member = get_member_by_id(session, member_id)
-            if member is None:
+            self.context = get_entry_context(session, member_id,
+                                             rin_lagani_id=rin_lagani_id)
+            if self.context is None:
                 self.close()
             else:
-                self.member_name = member.name
+                self.member_name = self.context.member_name
         # initialize app context
         self.app_ctxt = app_ctxt
         # intialize RinLaganiDto
@@ -85,13 +86,12 @@ class RinLaganiWindow(QMainWindow):
         self.statusBar().showMessage(msg, 5000)
 
     def load_data(self):
-        with Session.begin() as session:
-            rin_lagani = get_rin_lagani_by_id(session,
-                                              self.rin_lagani_dto.member_id)
-            if not rin_lagani is None:
-                self.date_input.setText(rin_lagani.date)
-                self.amount_input.setValue(rin_lagani.amount)
-                self.remarks_input.setText(rin_lagani.remarks)
+        rin_lagani = self.context.edited
+        if not rin_lagani is None:
+            self.rin_lagani_dto.is_alya_rin = rin_lagani.is_alya_rin
+            self.date_input.setText(rin_lagani.date)
+            self.amount_input.setValue(rin_lagani.amount)
+            self.remarks_input.setText(rin_lagani.remarks)
 
     @Slot()
     def save_rin_lagani(self):
@@ -1,4 +1,3 @@
-from datetime import timedelta
 from decimal import Decimal
 from sys import float_info
 
@@ -9,12 +8,10 @@ from PySide2.QtWidgets import (QMainWindow, QWidget, QLabel, QLineEdit,
                                QPushButton, QVBoxLayout)
 
 from database import Session, SawaAsuli
-from database_access import (get_member_by_id, get_sawa_asuli_by_id,
-                             get_latest_rin_lagani, calculate_banki_sawa,
-                             get_latest_transaction,
-                             get_second_last_transaction,
-                             save_or_update_sawa_asuli)
-from util import str_to_date
+from database_access import (get_entry_context, save_or_update_sawa_asuli,
+                             calculate_byaj)
+from bs_calendar import ordinal_to_str
+from util import date_to_ordinal
 
 
 class SawaAsuliWindow(QMainWindow):
@@ -22,13 +19,14 @@ class SawaAsuliWindow(QMainWindow):
 
     def __init__(self, member_id, app_ctxt, asuli_id, *args, **kwargs):
         super(SawaAsuliWindow, self).__init__(*args, **kwargs)
-        # check if member exists
+        # load member, its rin lagani and the sawa asuli being edited
         with Session.begin() as session:
-            member = get_member_by_id(session, member_id)
-            if member is None:
+            self.context = get_entry_context(session, member_id,
+                                             sawa_asuli_id=asuli_id)
+            if self.context is None:
                 self.close()
             else:
-                self.member_name = member.name
+                self.member_name = self.context.member_name
         self.asuli_id = asuli_id
         self.member_id = member_id
         self.rin_lagani_id = None
@@ -149,46 +147,36 @@ class SawaAsuliWindow(QMainWindow):
                             self.sizeHint().height() + 100)
 
     def init_values(self):
-        with Session.begin() as session:
-            # set latest transaction based on if the sawa asuli is new or being updated.
-            if self.asuli_id is None:
-                latest_tx = get_latest_transaction(session, self.member_id)
-            else:
-                latest_tx = get_second_last_transaction(session,
-                                                        self.member_id)
-            # load latest rin lagani calculate banki sawa
-            rin_lagani = get_latest_rin_lagani(session, self.member_id)
-            self.lagani_rin = calculate_banki_sawa(rin_lagani)
-            # if sawa asuli already exists load its values
-            if not self.asuli_id is None:
-                sawa_asuli = get_sawa_asuli_by_id(session, self.asuli_id)
-                self.amount_input.setValue(sawa_asuli.amount)
-                self.byaj_input.setValue(sawa_asuli.byaj)
-                self.harjana_input.setValue(sawa_asuli.harjana)
-                self.bachat_input.setValue(sawa_asuli.bachat)
-                self.remarks_input.setText(sawa_asuli.remarks)
-                # while editing latest sawa asuli do not count its sawa asuli when calulating banki sawa
-                self.lagani_rin += sawa_asuli.amount
-            # check if the sawa asuli should be bachat only
-            if rin_lagani is None or self.lagani_rin == Decimal(0):
-                self.start_date_input.setText('')
-                self.is_bachat_only = True
-                self.rin_lagani_id = None
-                self.kista_per_month = Decimal(0)
-                self.amount_input.setEnabled(False)
+        context = self.context
+        self.lagani_rin = context.banki_sawa
+        # if sawa asuli already exists load its values
+        sawa_asuli = context.edited
+        if sawa_asuli is not None:
+            self.amount_input.setValue(sawa_asuli.amount)
+            self.byaj_input.setValue(sawa_asuli.byaj)
+            self.harjana_input.setValue(sawa_asuli.harjana)
+            self.bachat_input.setValue(sawa_asuli.bachat)
+            self.remarks_input.setText(sawa_asuli.remarks)
+        # check if the sawa asuli should be bachat only
+        if context.rin_lagani_id is None or self.lagani_rin == Decimal(0):
+            self.start_date_input.setText('')
+            self.is_bachat_only = True
+            self.rin_lagani_id = None
+            self.kista_per_month = Decimal(0)
+            self.amount_input.setEnabled(False)
+        else:
+            if context.previous_is_rin_lagani:
+                start_date = context.previous_date
             else:
-                if type(latest_tx) == SawaAsuli:
-                    start_date = str(
-                        str_to_date(latest_tx.date) + timedelta(days=1))
-                else:
-                    start_date = latest_tx.date
-                self.start_date_input.setText(start_date)
-                self.rin_lagani_id = rin_lagani.id
-                self.kista_per_month = rin_lagani.kista_per_month
-            # set initial values to input fields
-            self.lagani_rin_input.setValue(self.lagani_rin)
-            self.kista_per_month_input.setValue(self.kista_per_month)
-            self.calculate_values()
+                start_date = ordinal_to_str(
+                    date_to_ordinal(context.previous_date) + 1)
+            self.start_date_input.setText(start_date)
+            self.rin_lagani_id = context.rin_lagani_id
+            self.kista_per_month = context.kista_per_month
+        # set initial values to input fields
+        self.lagani_rin_input.setValue(self.lagani_rin)
+        self.kista_per_month_input.setValue(self.kista_per_month)
+        self.calculate_values()
 
     @Slot()
     def calculate_values(self):
@@ -199,23 +187,21 @@ class SawaAsuliWindow(QMainWindow):
             self.grand_total_input.setValue(self.bachat_input.value())
             return
         # calculate start and end dates
-        start_date = str_to_date(self.start_date_input.text())
-        end_date = str_to_date(self.end_date_input.text())
+        start_date = date_to_ordinal(self.start_date_input.text())
+        end_date = date_to_ordinal(self.end_date_input.text())
         if start_date is None or end_date is None:
             self.status_bar_message('Invalid dates.')
             return
         if end_date < start_date:
             self.status_bar_message('End date is less than start date.')
             return
-        time_delta = end_date - start_date
-        days = time_delta.days + 1
+        days = end_date - start_date + 1
         # update days_input value
         self.days_input.setText(str(days))
-        # byaj per day = (previous banki sawa(lagani rin) / 0.12) / 365
-        byaj_per_day = (self.lagani_rin * Decimal('0.12')) / Decimal('365')
-        self.byaj_per_day_input.setValue(byaj_per_day)
+        # byaj per day = (previous banki sawa(lagani rin) * 0.12) / 365
+        self.byaj_per_day_input.setValue(calculate_byaj(self.lagani_rin, 1))
         # calculate byaj = byaj per day * days
-        self.byaj_input.setValue(byaj_per_day * days)
+        self.byaj_input.setValue(calculate_byaj(self.lagani_rin, days))
         # calculate grand total
         self.grand_total_input.setValue(
             Decimal(str(self.amount_input.value()))
@@ -1,31 +1,87 @@
+import argparse
 import sys
 
+from PySide2.QtCore import Qt
+from PySide2.QtWidgets import QApplication, QProgressDialog
 from fbs_runtime.application_context.PySide2 import ApplicationContext
 
-from database import engine, Base, Session, Settings
+from database import MEMORY_DATABASE, configure_database, use_engine
+from database_registry import DatabaseRegistry
 from main_ui import MainWindow
+from migrations import initialize_database
+from working_copy import WorkingCopy
 
 
-def initialize_database():
-    """Initializes database"""
-    Base.metadata.create_all(engine)
-    with Session.begin() as session:
-        settings = session.query(Settings).first()
-        if settings is None:
-            settings = Settings(
-                total_kista_months=40,
-                account_no='00201300028079000001 (Nabjeeban Dhangadhi)'
-            )
-            session.add(settings)
+def parse_arguments(argv):
+    """
+    Parse database options from command line, other arguments are left for Qt
+    :param argv: command line arguments without program name
+    :return: parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database',
+                        help=f'database file or {MEMORY_DATABASE}, '
+                             'defaults to SBTTK_DATABASE or data.db')
+    parser.add_argument('--read-only', action='store_true')
+    parser.add_argument('--shared-cache', action='store_true')
+    parser.add_argument('--storage-profile')
+    parser.add_argument('--in-memory', choices=['sync', 'write-behind'],
+                        help='serve reads from an in memory working copy '
+                             'and mirror writes to the database file')
+    arguments, _ = parser.parse_known_args(argv)
+    return arguments
+
+
+class MigrationProgress:
+    """Progress dialog shown only when the database is upgraded"""
+
+    def __init__(self):
+        self.dialog = None
+
+    def __call__(self, message, done, total):
+        if self.dialog is None:
+            self.dialog = QProgressDialog(message, None, 0, total)
+            self.dialog.setWindowTitle('Upgrading database')
+            self.dialog.setWindowModality(Qt.ApplicationModal)
+            self.dialog.setMinimumDuration(0)
+        self.dialog.setLabelText(message)
+        self.dialog.setMaximum(total)
+        self.dialog.setValue(done)
+        QApplication.processEvents()
+
+    def close(self):
+        if self.dialog is not None:
+            self.dialog.close()
 
 
 if __name__ == '__main__':
     app_ctxt = ApplicationContext()  # 1. Instantiate ApplicationContext
 
-    initialize_database()  # init database
+    arguments = parse_arguments(sys.argv[1:])
+    engine = configure_database(arguments.database, arguments.read_only,
+                                arguments.shared_cache,
+                                arguments.storage_profile)
+    if not arguments.read_only:
+        progress = MigrationProgress()
+        initialize_database(engine, progress)  # init database
+        progress.close()
+    working_copy = None
+    if arguments.in_memory and not arguments.read_only:
+        # load initialized database into memory
+        engine.dispose()
+        working_copy = WorkingCopy(
+            engine.url.database, arguments.in_memory == 'write-behind',
+            arguments.storage_profile or 'default')
+        use_engine(working_copy.engine)
 
-    window = MainWindow(app_ctxt)
+    # databases opened from the main window use the same options
+    registry = DatabaseRegistry(read_only=arguments.read_only,
+                                shared_cache=arguments.shared_cache,
+                                profile=arguments.storage_profile)
+    window = MainWindow(app_ctxt, registry)
     window.showMaximized()
 
     exit_code = app_ctxt.app.exec_()  # 2. Invoke appctxt.app.exec_()
+    if working_copy is not None:
+        working_copy.close()  # write queued changes
     sys.exit(exit_code)
@@ -1,12 +1,21 @@
+import sqlite3
+from decimal import Decimal
+
 from PySide2.QtCore import Slot, Signal
 from PySide2.QtGui import QIcon, Qt
 from PySide2.QtWidgets import (QDialog, QFormLayout, QLabel, QSpinBox,
                                QLineEdit, QPushButton,
                                QVBoxLayout, QMainWindow, QWidget, QStatusBar,
-                               QMessageBox)
+                               QMessageBox, QProgressDialog, QApplication)
+from sqlalchemy import exc
 
-from database import Session, Settings
-from database_access import complete_year
+from archive import archive_year, remove_archive
+from backup import backup_database
+from database import (get_engine, get_database_path, Session, Settings,
+                      convert_money_to_paisa)
+from database_access import (complete_year, preview_complete_year,
+                             rebuild_ledger_totals)
+from util import date_to_ordinal
 
 
 class SettingsWindow(QMainWindow):
@@ -36,6 +45,15 @@ class SettingsWindow(QMainWindow):
         self.year_start_date_input.setInputMask('9999-00-00')
         complete_year_button = QPushButton('Complete year')
         complete_year_button.clicked.connect(self.handle_complete_year)
+        # back up database file
+        backup_button = QPushButton('Backup now')
+        backup_button.clicked.connect(self.handle_backup)
+        # rebuild totals maintained by the database
+        rebuild_totals_button = QPushButton('Rebuild ledger totals')
+        rebuild_totals_button.clicked.connect(self.handle_rebuild_totals)
+        # opt in to integer paisa money storage
+        self.money_in_paisa_button = QPushButton('Store money as paisa')
+        self.money_in_paisa_button.clicked.connect(self.handle_money_in_paisa)
         # create layout
         form_layout = QFormLayout()
         form_layout.addRow(total_kista_months_label,
@@ -44,6 +62,9 @@ class SettingsWindow(QMainWindow):
         form_layout.addWidget(save_button)
         form_layout.addRow(year_start_date_label, self.year_start_date_input)
         form_layout.addWidget(complete_year_button)
+        form_layout.addWidget(backup_button)
+        form_layout.addWidget(rebuild_totals_button)
+        form_layout.addWidget(self.money_in_paisa_button)
         # create wrapper widget and make it as central widget for the window
         widget = QWidget()
         widget.setLayout(form_layout)
@@ -61,6 +82,7 @@ class SettingsWindow(QMainWindow):
             settings = session.query(Settings).first()
             self.total_kista_months_input.setValue(settings.total_kista_months)
             self.account_no_input.setText(settings.account_no)
+            self.money_in_paisa_button.setEnabled(not settings.money_in_paisa)
 
     @Slot()
     def handle_save_settings(self):
@@ -72,25 +94,120 @@ class SettingsWindow(QMainWindow):
 
     @Slot()
     def handle_complete_year(self):
+        # preview alya rin which will be carried forward
+        with Session.begin() as session:
+            preview = preview_complete_year(session)
+        total = sum((p.alya_rin for p in preview), Decimal(0))
         # show confirm complete year dialog
         delete_dialog = QMessageBox(self)
         delete_dialog.setText('Are you sure you want to complete this year? '
-                              'Please check start date carefully.')
+                              'Please check start date carefully. History '
+                              'of the year will be moved to an archive.\n'
+                              f'Alya rin of {len(preview)} members totalling '
+                              f'{total} will be carried forward.')
+        delete_dialog.setDetailedText('\n'.join(
+            f'{p.account_no} {p.name}: {p.alya_rin}' for p in preview))
         delete_dialog.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
         delete_dialog.setIcon(QMessageBox.Icon.Question)
         button = delete_dialog.exec_()
         # if delete is confirmed delete the user
         if button == QMessageBox.Yes:
             date = self.year_start_date_input.text()
-            with Session.begin() as session:
-                error = complete_year(session, date)
+            if date_to_ordinal(date) is None:
+                self.statusBar().showMessage('Invalid year start date')
+                return
+            progress_dialog = QProgressDialog('Completing year', None, 0, 0,
+                                              self)
+            progress_dialog.setWindowModality(Qt.WindowModal)
+            progress_dialog.setMinimumDuration(0)
+
+            def show_progress(step, steps, message):
+                progress_dialog.setMaximum(steps)
+                progress_dialog.setValue(step)
+                progress_dialog.setLabelText(message)
+                QApplication.processEvents()
+
+            # back up and keep history of the year in a read only archive
+            try:
+                if not self.backup(show_progress):
+                    progress_dialog.close()
+                    return
+                path = archive_year(get_engine(), date)
+            except (OSError, ValueError) as e:
+                progress_dialog.close()
+                self.statusBar().showMessage(f'Could not archive year: {e}')
+                return
+            try:
+                with Session.begin() as session:
+                    error = complete_year(session, date, show_progress, path)
+            except exc.SQLAlchemyError as e:
+                error = f'Could not complete year: {e}'
+            progress_dialog.close()
             if not error is None:
+                # year is not closed, the archive would block the next try
+                remove_archive(path)
                 self.statusBar().showMessage(error)
             else:
                 self.statusBar().showMessage('Successfully completed year.')
                 self.year_completed.emit()
 
 
+    def backup(self, progress):
+        """
+        Back up database file
+        :param progress: callable taking step, total steps and message
+        :return: True if backed up or there is no file to back up
+        """
+        path = get_database_path()
+        if path is None:
+            return True
+        try:
+            backup_path = backup_database(
+                path, progress=lambda copied, total: progress(
+                    copied, total, 'Backing up database'))
+        except (OSError, sqlite3.Error) as e:
+            self.statusBar().showMessage(f'Backup failed: {e}')
+            return False
+        self.status_bar_message(f'Backed up to {backup_path}')
+        return True
+
+    @Slot()
+    def handle_backup(self):
+        progress_dialog = QProgressDialog('Backing up database', None, 0, 0,
+                                          self)
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+
+        def show_progress(copied, total, message):
+            progress_dialog.setMaximum(total)
+            progress_dialog.setValue(copied)
+            QApplication.processEvents()
+
+        self.backup(show_progress)
+        progress_dialog.close()
+
+    @Slot()
+    def handle_rebuild_totals(self):
+        with Session.begin() as session:
+            rebuild_ledger_totals(session)
+        self.status_bar_message('Ledger totals rebuilt successfully')
+
+
+    @Slot()
+    def handle_money_in_paisa(self):
+        # show confirm conversion dialog
+        convert_dialog = QMessageBox(self)
+        convert_dialog.setText('Are you sure you want to store money as '
+                               'integer paisa? This cannot be undone.')
+        convert_dialog.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        convert_dialog.setIcon(QMessageBox.Icon.Question)
+        button = convert_dialog.exec_()
+        if button == QMessageBox.Yes:
+            convert_money_to_paisa(get_engine())
+            self.money_in_paisa_button.setEnabled(False)
+            self.status_bar_message('Money is now stored as paisa')
+
+
 class AboutDialog(QDialog):
     def __init__(self, *args, **kwargs):
         super(AboutDialog, self).__init__(*args, **kwargs)
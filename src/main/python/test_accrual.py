@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from accrual import get_accruals
+from database import (Base, Member, RinLagani, SawaAsuli, AccrualSnapshot,
+                      create_database_engine)
+
+
+class TestAccrual(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session.begin() as session:
+            session.add_all([Member(id=i, account_no=i, name=f'Member {i}')
+                             for i in (1, 2)])
+            session.add(RinLagani(id=1, date='2078-01-05', amount=Decimal(3650),
+                                  kista_per_month=Decimal(100), member_id=1))
+            session.add(RinLagani(id=2, date='2078-01-10', amount=Decimal(500),
+                                  kista_per_month=Decimal(50), member_id=2))
+            self.add_sawa_asuli(session, 1, '2078-02-05', 1, Decimal(100))
+            self.add_sawa_asuli(session, 2, '2078-02-05', 2, Decimal(500))
+
+    def tearDown(self):
+        Base.metadata.drop_all(self.engine)
+
+    @staticmethod
+    def add_sawa_asuli(session, id, date, rin_lagani_id, amount):
+        session.add(SawaAsuli(id=id, date=date, amount=amount,
+                              byaj=Decimal(0), harjana=Decimal(0),
+                              bachat=Decimal(0), rin_lagani_id=rin_lagani_id,
+                              member_id=rin_lagani_id))
+
+    def snapshot_dates(self):
+        with self.Session.begin() as session:
+            return session.execute(select(AccrualSnapshot.as_of_date).order_by(
+                AccrualSnapshot.as_of_ordinal)).scalars().all()
+
+    def test_accruals(self):
+        with self.Session.begin() as session:
+            accruals, totals, from_snapshot = get_accruals(session,
+                                                           '2078-02-10')
+        self.assertFalse(from_snapshot)
+        # fully paid rin lagani accrues nothing
+        accrual, = accruals
+        self.assertEqual((accrual.banki_sawa, accrual.start_date,
+                          accrual.days), (Decimal(3550), '2078-02-06', 5))
+        # 3550 rupees for 5 days at 12%
+        self.assertEqual(accrual.byaj, Decimal('5.84'))
+        self.assertEqual(totals, {'banki_sawa': Decimal(3550),
+                                  'byaj': Decimal('5.84')})
+        # sawa asulis after the day are not counted
+        with self.Session.begin() as session:
+            accruals, totals, _ = get_accruals(session, '2078-02-01')
+        self.assertEqual([(a.account_no, a.banki_sawa) for a in accruals],
+                         [(1, Decimal(3650)), (2, Decimal(500))])
+        with self.assertRaises(ValueError):
+            with self.Session.begin() as session:
+                get_accruals(session, '2078-13-01')
+
+    def test_snapshot(self):
+        for date in ('2078-02-01', '2078-02-10'):
+            with self.Session.begin() as session:
+                get_accruals(session, date)
+        with self.Session.begin() as session:
+            accruals, totals, from_snapshot = get_accruals(session,
+                                                           '2078-02-10')
+        self.assertTrue(from_snapshot)
+        self.assertEqual((accruals[0].start_date, totals['byaj']),
+                         ('2078-02-06', Decimal('5.84')))
+        # sawa asuli removes snapshots as of its day or later
+        with self.Session.begin() as session:
+            self.add_sawa_asuli(session, 3, '2078-02-08', 1, Decimal(100))
+        self.assertEqual(self.snapshot_dates(), ['2078-02-01'])
+        with self.Session.begin() as session:
+            accruals, _, from_snapshot = get_accruals(session, '2078-02-10')
+        self.assertFalse(from_snapshot)
+        self.assertEqual(accruals[0].banki_sawa, Decimal(3450))
+
+    def test_read_only_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.db')
+            engine = create_database_engine(path)
+            Base.metadata.create_all(engine)
+            with sessionmaker(bind=engine).begin() as session:
+                session.add(Member(id=1, account_no=1, name='Member 1'))
+                session.add(RinLagani(id=1, date='2078-01-05',
+                                      amount=Decimal(3650),
+                                      kista_per_month=Decimal(100),
+                                      member_id=1))
+            engine.dispose()
+            read_only_engine = create_database_engine(path, read_only=True)
+            # accruals are calculated without saving a snapshot
+            for _ in range(2):
+                with sessionmaker(bind=read_only_engine).begin() as session:
+                    accruals, totals, from_snapshot = get_accruals(
+                        session, '2078-01-14')
+                self.assertFalse(from_snapshot)
+                self.assertEqual(totals['byaj'], Decimal('12.00'))
+            read_only_engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from archive import archive_year, open_archive, remove_archive
+from database import (Base, Member, RinLagani, SawaAsuli, Archive, Settings,
+                      convert_money_to_paisa)
+from database_access import complete_year
+from federated import (archive_paths, get_federated_transactions_by_member_id,
+                       get_federated_date_range_summary)
+from util import date_to_ordinal, str_to_date
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            f'sqlite:///{os.path.join(self.directory.name, "data.db")}')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session.begin() as session:
+            session.add(Member(id=1, account_no=1, name='Gaurab'))
+            session.add(RinLagani(id=1, date='2078-01-05', amount=Decimal(4000),
+                                  kista_per_month=Decimal(100), member_id=1))
+            session.add(SawaAsuli(id=1, date='2078-02-05', amount=Decimal(100),
+                                  byaj=Decimal(40), harjana=Decimal(5),
+                                  bachat=Decimal(50), rin_lagani_id=1,
+                                  member_id=1))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_archive_year(self):
+        path = archive_year(self.engine, '2079-01-01')
+        self.assertEqual(os.path.basename(path), 'data_until_2078-12-30.db')
+        with self.Session.begin() as session:
+            complete_year(session, '2079-01-01', archive_path=path)
+        with self.Session.begin() as session:
+            self.assertEqual(session.query(SawaAsuli).count(), 0)
+            archive = session.query(Archive).one()
+            self.assertEqual((archive.path, archive.start_ordinal,
+                              archive.end_ordinal),
+                             (path, date_to_ordinal('2078-01-05'),
+                              date_to_ordinal('2078-12-30')))
+        # history is kept in the archive, which can not be written
+        archive_engine = open_archive(path)
+        with sessionmaker(bind=archive_engine).begin() as session:
+            self.assertEqual(session.get(RinLagani, 1).banki_sawa,
+                             Decimal(3900))
+            self.assertEqual(session.get(SawaAsuli, 1).byaj, Decimal(40))
+        with self.assertRaises(OperationalError):
+            with sessionmaker(bind=archive_engine).begin() as session:
+                session.delete(session.get(SawaAsuli, 1))
+        archive_engine.dispose()
+        with self.assertRaises(FileExistsError):
+            archive_year(self.engine, '2079-01-01')
+        # archive of a failed year closing is removed so it can be retried
+        remove_archive(path)
+        self.assertEqual(archive_year(self.engine, '2079-01-01'), path)
+
+    def test_federated_queries(self):
+        path = archive_year(self.engine, '2079-01-01')
+        with self.Session.begin() as session:
+            complete_year(session, '2079-01-01', archive_path=path)
+        with self.Session.begin() as session:
+            alya_rin = session.query(RinLagani).one()
+            session.add(SawaAsuli(date='2079-02-05', amount=Decimal(200),
+                                  byaj=Decimal(30), harjana=Decimal(0),
+                                  bachat=Decimal(50), rin_lagani_id=alya_rin.id,
+                                  member_id=1))
+        with self.Session.begin() as session:
+            self.assertEqual(archive_paths(session), [path])
+            self.assertEqual(archive_paths(
+                session, date_to_ordinal('2079-01-01')), [])
+        transactions, totals = get_federated_transactions_by_member_id(
+            self.engine, 1)
+        self.assertEqual([(tx.date, tx.banki_sawa) for tx in transactions],
+                         [('2078-01-05', Decimal(4000)),
+                          ('2078-02-05', Decimal(3900)),
+                          ('2079-01-01', Decimal(3900)),
+                          ('2079-02-05', Decimal(3700))])
+        self.assertEqual([tx.is_archived for tx in transactions],
+                         [True, True, False, False])
+        self.assertEqual(totals['lagani_total'], Decimal(4000))
+        self.assertEqual(totals['asuli_total'], Decimal(300))
+        self.assertEqual(totals['byaj_total'], Decimal(70))
+        self.assertEqual(totals['banki_sawa'], Decimal(3700))
+        rin_laganis, sawa_asulis, _, totals = \
+            get_federated_date_range_summary(self.engine,
+                                             str_to_date('2078-01-01'),
+                                             str_to_date('2079-12-30'))
+        self.assertEqual([tx.transaction_dto.date for tx in sawa_asulis],
+                         ['2078-02-05', '2079-02-05'])
+        self.assertEqual(len(rin_laganis), 2)
+        self.assertEqual(totals['sawa_asuli'], Decimal(300))
+        self.assertEqual(totals['grand_total'], Decimal(475))
+
+    def test_archive_before_paisa_conversion(self):
+        with self.Session.begin() as session:
+            session.add(Settings(id=1, total_kista_months=40, account_no='1'))
+        path = archive_year(self.engine, '2079-01-01')
+        with self.Session.begin() as session:
+            complete_year(session, '2079-01-01', archive_path=path)
+        convert_money_to_paisa(self.engine)
+        # archive is read in rupees while the live database stores paisa
+        transactions, totals = get_federated_transactions_by_member_id(
+            self.engine, 1)
+        self.assertEqual([(tx.date, tx.banki_sawa) for tx in transactions],
+                         [('2078-01-05', Decimal(4000)),
+                          ('2078-02-05', Decimal(3900)),
+                          ('2079-01-01', Decimal(3900))])
+        self.assertEqual(totals['asuli_total'], Decimal(100))
+        self.assertEqual(totals['banki_sawa'], Decimal(3900))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import gzip
+import os
+import sqlite3
+import tempfile
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backup import backup_database, restore_backup
+from database import Member
+from migrations import initialize_database
+
+
+class TestBackup(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'data.db')
+        self.engine = create_engine(f'sqlite:///{self.path}')
+        initialize_database(self.engine)
+        with sessionmaker(bind=self.engine).begin() as session:
+            session.add_all([Member(account_no=i, name=f'Member {i}')
+                             for i in range(1, 2001)])
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_backup_and_restore(self):
+        steps = []
+        backup_path = backup_database(
+            self.path, progress=lambda copied, total: steps.append(copied),
+            pages=4)
+        self.assertEqual(os.path.dirname(backup_path),
+                         os.path.join(self.directory.name, 'backups'))
+        self.assertGreater(len(steps), 1)
+        restored = os.path.join(self.directory.name, 'restored.db')
+        restore_backup(backup_path, restored)
+        connection = sqlite3.connect(restored)
+        self.assertEqual(connection.execute(
+            'SELECT COUNT(*) FROM members').fetchone(), (2000,))
+        self.assertEqual(connection.execute(
+            'PRAGMA integrity_check').fetchone(), ('ok',))
+        connection.close()
+        with self.assertRaises(FileExistsError):
+            restore_backup(backup_path, restored)
+
+    def test_rotation(self):
+        directory = os.path.join(self.directory.name, 'backups')
+        paths = [backup_database(self.path, directory, keep=2)
+                 for _ in range(3)]
+        self.assertEqual(sorted(os.listdir(directory)),
+                         [os.path.basename(path) for path in paths[1:]])
+        with gzip.open(paths[-1]) as backup_file:
+            self.assertTrue(backup_file.read(16).startswith(b'SQLite format'))
+
+
+if __name__ == '__main__':
+    unittest.main()
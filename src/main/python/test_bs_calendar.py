@@ -0,0 +1,57 @@
+import datetime
+import unittest
+
+import nepali_datetime
+
+import bs_calendar
+from util import date_to_ordinal
+
+
+class TestBsCalendar(unittest.TestCase):
+    def test_parity_with_nepali_datetime(self):
+        # walk every day of the calendar and compare with nepali_datetime
+        date = nepali_datetime.date(bs_calendar.MIN_YEAR, 1, 1)
+        for ordinal in range(1, bs_calendar.MAX_ORDINAL + 1):
+            self.assertEqual(date.toordinal(), ordinal)
+            self.assertEqual(bs_calendar.from_ordinal(ordinal),
+                             (date.year, date.month, date.day))
+            self.assertEqual(
+                bs_calendar.to_ordinal(date.year, date.month, date.day),
+                ordinal)
+            date_string = date.strftime('%Y-%m-%d')
+            self.assertEqual(bs_calendar.ordinal_to_str(ordinal), date_string)
+            self.assertEqual(bs_calendar.parse_ordinal(date_string), ordinal)
+            if ordinal < bs_calendar.MAX_ORDINAL:
+                date += datetime.timedelta(days=1)
+
+    def test_month_boundaries(self):
+        for year in range(bs_calendar.MIN_YEAR, bs_calendar.MAX_YEAR + 1):
+            for month in range(1, 13):
+                days = nepali_datetime._days_in_month(year, month)
+                self.assertEqual(bs_calendar.days_in_month(year, month), days)
+                start = bs_calendar.to_ordinal(year, month, 1)
+                end = bs_calendar.to_ordinal(year, month, days)
+                for ordinal in (start, end):
+                    self.assertEqual(bs_calendar.month_start_ordinal(ordinal),
+                                     start)
+                    self.assertEqual(bs_calendar.month_end_ordinal(ordinal),
+                                     end)
+
+    def test_invalid_dates(self):
+        for date_string in ('2078-01-33', '2078-13-01', '2078-00-10',
+                            '2078-01', 'abcd-01-01', ''):
+            self.assertIsNone(bs_calendar.parse_ordinal(date_string))
+            self.assertIsNone(date_to_ordinal(date_string))
+        self.assertIsNone(date_to_ordinal(None))
+        self.assertIsNone(bs_calendar.days_between('2078-01-01', '2078-01-40'))
+        self.assertEqual(bs_calendar.days_between('2077-12-30', '2078-01-02'),
+                         bs_calendar.parse_ordinal('2078-01-02') -
+                         bs_calendar.parse_ordinal('2077-12-30'))
+        with self.assertRaises(ValueError):
+            bs_calendar.from_ordinal(0)
+        with self.assertRaises(ValueError):
+            bs_calendar.from_ordinal(bs_calendar.MAX_ORDINAL + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
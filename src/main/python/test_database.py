@@ -1,16 +1,21 @@
+import os
+import tempfile
 import unittest
 from decimal import Decimal
 
-from sqlalchemy import exc
+from sqlalchemy import create_engine, exc, text
 
-from database import engine, Base, Session, Member, RinLagani, SawaAsuli
+from database import (Base, Session, Member, RinLagani, SawaAsuli,
+                      MEMORY_DATABASE, apply_storage_profile,
+                      configure_database, create_database_engine,
+                      database_url, use_explicit_transactions)
 
 
 class TestDatabase(unittest.TestCase):
     def setUp(self):
         # print('Running setup')
-        Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
+        self.engine = configure_database(MEMORY_DATABASE)
+        Base.metadata.create_all(self.engine)
         member1 = Member(account_no=1, name='Gaurab')
         member2 = Member(account_no=2, name='Sameer')
 
@@ -35,7 +40,8 @@ class TestDatabase(unittest.TestCase):
 
     def tearDown(self):
         # print('Running teardown')
-        Base.metadata.drop_all(engine)
+        Base.metadata.drop_all(self.engine)
+        self.engine.dispose()
 
     def test_unique_account_no(self):
         with Session() as session:
@@ -84,3 +90,66 @@ class TestDatabase(unittest.TestCase):
             no_of_sawa_asulis = session.query(SawaAsuli).filter(
                 SawaAsuli.member_id == id).count()
             self.assertEqual(no_of_sawa_asulis, 0)
+
+
+class TestStorageProfile(unittest.TestCase):
+    def pragmas(self, profile):
+        with tempfile.TemporaryDirectory() as directory:
+            profile_engine = create_engine(
+                f'sqlite:///{os.path.join(directory, "data.db")}')
+            apply_storage_profile(profile_engine, profile)
+            with profile_engine.connect() as connection:
+                pragmas = [connection.execute(text(f'PRAGMA {name}')).scalar()
+                           for name in ('journal_mode', 'synchronous',
+                                        'mmap_size', 'temp_store',
+                                        'busy_timeout')]
+            profile_engine.dispose()
+        return pragmas
+
+    def test_storage_profiles(self):
+        # synchronous NORMAL = 1, FULL = 2 and temp_store MEMORY = 2
+        self.assertEqual(self.pragmas('default'),
+                         ['wal', 1, 256 * 1024 * 1024, 2, 5000])
+        self.assertEqual(self.pragmas('durability'),
+                         ['wal', 2, 0, 2, 10000])
+
+
+class TestDatabaseConfiguration(unittest.TestCase):
+    def test_database_url(self):
+        self.assertEqual(database_url(MEMORY_DATABASE), 'sqlite://')
+        self.assertEqual(database_url('data.db'), 'sqlite:///data.db')
+        self.assertEqual(database_url('data.db', read_only=True),
+                         'sqlite:///file:data.db?mode=ro&uri=true')
+        self.assertEqual(database_url('data.db', shared_cache=True),
+                         'sqlite:///file:data.db?cache=shared&uri=true')
+        self.assertEqual(
+            database_url(MEMORY_DATABASE, shared_cache=True),
+            'sqlite:///file:memdb?mode=memory&cache=shared&uri=true')
+
+    def test_read_only_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.db')
+            writable_engine = create_database_engine(path)
+            Base.metadata.create_all(writable_engine)
+            writable_engine.dispose()
+            read_only_engine = create_database_engine(path, read_only=True)
+            with read_only_engine.connect() as connection:
+                self.assertEqual(connection.execute(text(
+                    'SELECT COUNT(*) FROM members')).scalar(), 0)
+                with self.assertRaises(exc.OperationalError):
+                    connection.execute(text(
+                        "INSERT INTO members (account_no, name) "
+                        "VALUES (1, 'Gaurab')"))
+            read_only_engine.dispose()
+
+    def test_explicit_transactions(self):
+        engine = create_engine('sqlite://')
+        other_engine = create_engine('sqlite://')
+        use_explicit_transactions(engine)
+        for database_engine, isolation_level in ((engine, None),
+                                                 (other_engine, '')):
+            with database_engine.connect() as connection:
+                # other engines of the process are left alone
+                self.assertEqual(
+                    connection.connection.isolation_level, isolation_level)
+            database_engine.dispose()
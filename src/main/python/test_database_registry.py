@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from sqlalchemy import exc, inspect
+
+from database import (Session, Member, MEMORY_DATABASE, get_engine,
+                      convert_money_to_paisa, create_database_engine,
+                      is_money_in_paisa)
+from database_registry import DatabaseRegistry
+from migrations import initialize_database
+from working_copy import OPEN_COPIES, WorkingCopy
+
+
+class TestDatabaseRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.registry = DatabaseRegistry(capacity=2)
+
+    def tearDown(self):
+        self.registry.close_all()
+        self.directory.cleanup()
+
+    def open(self, name):
+        opened = self.registry.open(os.path.join(self.directory.name, name))
+        self.registry.initialize_current()
+        return opened
+
+    def test_switch_databases(self):
+        first = self.open('first.db')
+        self.assertIs(get_engine(), first.engine)
+        self.assertEqual(self.registry.member_list(), [])
+        with Session.begin() as session:
+            session.add(Member(account_no=1, name='Gaurab'))
+        self.registry.set_member_list(None)
+        self.assertEqual([m.name for m in self.registry.member_list()],
+                         ['Gaurab'])
+        second = self.open('second.db')
+        convert_money_to_paisa(second.engine)
+        self.assertEqual(self.registry.member_list(), [])
+        # switching back uses cached member list
+        self.assertIs(self.open('first.db'), first)
+        self.assertIs(get_engine(), first.engine)
+        # money storage is kept by every database's own engine
+        self.assertFalse(is_money_in_paisa(first.engine.dialect))
+        self.assertTrue(is_money_in_paisa(second.engine.dialect))
+        self.assertEqual([m.name for m in self.registry.member_list()],
+                         ['Gaurab'])
+        # least recently used database is closed
+        self.open('third.db')
+        self.assertEqual([os.path.basename(path)
+                          for path in self.registry.databases],
+                         ['first.db', 'third.db'])
+        reopened = self.open('second.db')
+        self.assertIsNot(reopened, second)
+        self.assertTrue(is_money_in_paisa(reopened.engine.dialect))
+
+    def test_pinned_databases(self):
+        # launch database in memory and a working copy of a file
+        memory = create_database_engine(MEMORY_DATABASE)
+        initialize_database(memory)
+        self.registry.add(memory)
+        with Session.begin() as session:
+            session.add(Member(account_no=1, name='Gaurab'))
+        path = os.path.join(self.directory.name, 'copy.db')
+        initialize_database(create_database_engine(path))
+        copy = WorkingCopy(path, write_behind=True)
+        self.assertIs(self.registry.open(path).engine, copy.engine)
+        for name in ('first.db', 'second.db', 'third.db'):
+            self.open(name)
+        # pinned databases are not closed for space
+        self.assertEqual([os.path.basename(path)
+                          for path in self.registry.databases],
+                         [MEMORY_DATABASE, 'copy.db', 'second.db',
+                          'third.db'])
+        self.assertIs(self.registry.open(MEMORY_DATABASE).engine, memory)
+        self.assertEqual([m.name for m in self.registry.member_list()],
+                         ['Gaurab'])
+        self.assertIs(self.open(path).engine, copy.engine)
+        # working copy is closed with its writes on the file
+        with Session.begin() as session:
+            session.add(Member(account_no=2, name='Dipesh'))
+        self.registry.close_all()
+        self.assertNotIn(os.path.abspath(path), OPEN_COPIES)
+        reopened = self.open(path)
+        with Session.begin() as session:
+            self.assertEqual(session.query(Member.name).scalar(), 'Dipesh')
+        self.assertIsNot(reopened.engine, copy.engine)
+
+    def test_read_only_databases(self):
+        path = os.path.join(self.directory.name, 'other.db')
+        sqlite3.connect(path).close()
+        registry = DatabaseRegistry(read_only=True)
+        try:
+            opened = registry.open(path)
+            registry.initialize_current()
+            # database opened in a read only session is not written
+            self.assertEqual(inspect(opened.engine).get_table_names(), [])
+            self.assertEqual(registry.member_list(), [])
+            with self.assertRaises(exc.OperationalError):
+                with opened.engine.begin() as connection:
+                    connection.exec_driver_sql('CREATE TABLE t (id INTEGER)')
+        finally:
+            registry.close_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
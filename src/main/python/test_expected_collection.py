@@ -0,0 +1,70 @@
+import unittest
+from array import array
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, Member, RinLagani, SawaAsuli
+from expected_collection import (calculate_byaj_paisa,
+                                 get_expected_collections, to_sawa_asulis)
+from util import date_to_ordinal
+
+
+class TestExpectedCollection(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session.begin() as session:
+            session.add_all([Member(id=i, account_no=i, name=f'Member {i}')
+                             for i in (1, 2, 3)])
+            session.add(RinLagani(id=1, date='2078-01-05', amount=Decimal(4000),
+                                  kista_per_month=Decimal(100), member_id=1))
+            session.add(RinLagani(id=2, date='2078-01-10', amount=Decimal(500),
+                                  kista_per_month=Decimal(50), member_id=2))
+            session.add(SawaAsuli(id=1, date='2078-02-05', amount=Decimal(460),
+                                  byaj=Decimal(0), harjana=Decimal(0),
+                                  bachat=Decimal(0), rin_lagani_id=2,
+                                  member_id=2))
+
+    def tearDown(self):
+        Base.metadata.drop_all(self.engine)
+
+    def test_calculate_byaj_paisa(self):
+        # 4000 rupees for 365 days at 12% is 480 rupees
+        self.assertEqual(calculate_byaj_paisa(array('q', [400000, 1]),
+                                              array('q', [365, 1])),
+                         array('q', [48000, 0]))
+
+    def test_expected_collections(self):
+        with self.Session.begin() as session:
+            collections = get_expected_collections(session, '2078-02-10')
+        member_1, member_2, member_3 = collections
+        # rin lagani day is charged, day of last sawa asuli is not
+        days = date_to_ordinal('2078-02-10') - date_to_ordinal('2078-01-05')
+        self.assertEqual((member_1.start_date, member_1.days, member_1.kista),
+                         ('2078-01-05', days + 1, Decimal(100)))
+        self.assertEqual(member_1.byaj, (Decimal(4000) * Decimal('0.12')
+                                         * (days + 1) / 365).quantize(
+            Decimal('0.01')))
+        # kista is at most the banki sawa
+        self.assertEqual((member_2.start_date, member_2.days, member_2.kista,
+                          member_2.byaj, member_2.banki_sawa_after),
+                         ('2078-02-06', 5, Decimal(40), Decimal('0.07'),
+                          Decimal(0)))
+        self.assertEqual((member_3.rin_lagani_id, member_3.days,
+                          member_3.kista, member_3.byaj), (None, 0, 0, 0))
+        sawa_asulis = to_sawa_asulis(collections, '2078-02-10')
+        self.assertEqual([(s.amount, s.rin_lagani_id) for s in sawa_asulis],
+                         [(Decimal(100), 1), (Decimal(40), 2),
+                          (Decimal(0), None)])
+
+    def test_invalid_date(self):
+        with self.Session.begin() as session:
+            with self.assertRaises(ValueError):
+                get_expected_collections(session, '2078-13-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, exc, text
+
+import migrations
+from migrations import SCHEMA_VERSION, get_schema_version, \
+    initialize_database, migrate
+
+# schema written by versions before date ordinals and banki sawa
+OLD_SCHEMA = """
+CREATE TABLE members (id INTEGER PRIMARY KEY, account_no INTEGER NOT NULL
+    UNIQUE, name VARCHAR NOT NULL);
+CREATE TABLE rinlaganis (id INTEGER PRIMARY KEY, date VARCHAR(10) NOT NULL,
+    amount NUMERIC(13,2) NOT NULL, is_alya_rin BOOLEAN,
+    kista_per_month NUMERIC(13,2) NOT NULL, remarks VARCHAR,
+    member_id INTEGER NOT NULL);
+CREATE TABLE sawaasulis (id INTEGER PRIMARY KEY, date VARCHAR(10) NOT NULL,
+    amount NUMERIC, byaj NUMERIC, harjana NUMERIC, bachat NUMERIC,
+    remarks VARCHAR, rin_lagani_id INTEGER, member_id INTEGER);
+CREATE TABLE banktransactions (id INTEGER PRIMARY KEY,
+    date VARCHAR(10) NOT NULL, amount NUMERIC, type VARCHAR(7) NOT NULL,
+    remarks VARCHAR);
+CREATE TABLE settings (id INTEGER PRIMARY KEY,
+    total_kista_months INTEGER NOT NULL, account_no VARCHAR NOT NULL);
+INSERT INTO members VALUES (1, 1, 'Member 1');
+INSERT INTO rinlaganis VALUES (1, '2078-01-01', 1000, 0, 25, '', 1);
+INSERT INTO settings VALUES (1, 40, '1');
+"""
+
+# ledger update triggers written by version 6, checking only date changes
+OLD_LEDGER_UPDATE_TRIGGERS = """
+DROP TRIGGER {table}_ledger_update;
+CREATE TRIGGER {table}_ledger_update
+BEFORE UPDATE OF date_ordinal, member_id ON {table}
+WHEN NEW.date_ordinal IS NOT OLD.date_ordinal
+    OR NEW.member_id IS NOT OLD.member_id
+BEGIN
+    SELECT RAISE(ABORT, 'transaction_date') WHERE EXISTS (
+        SELECT 1 FROM {table} WHERE member_id = NEW.member_id
+        AND date_ordinal >= NEW.date_ordinal AND id != NEW.id);
+END;
+"""
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'data.db')
+        self.engine = create_engine(f'sqlite:///{self.path}')
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def create_old_database(self):
+        connection = sqlite3.connect(self.path)
+        connection.executescript(OLD_SCHEMA)
+        connection.executemany(
+            'INSERT INTO sawaasulis VALUES (?, ?, 10, 1, 0, 0, "", 1, 1)',
+            [(i, f'2078-02-{i:02}') for i in range(1, 31)])
+        connection.commit()
+        connection.close()
+
+    def test_upgrade_old_database(self):
+        self.create_old_database()
+        steps = []
+        with mock.patch.object(migrations, 'BATCH_SIZE', 7):
+            initialize_database(self.engine, lambda message, done, total:
+                                steps.append((message, done, total)))
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), SCHEMA_VERSION)
+            self.assertEqual(connection.execute(text(
+                'SELECT COUNT(*) FROM sawaasulis '
+                'WHERE date_ordinal IS NULL')).scalar(), 0)
+            self.assertEqual(connection.execute(text(
+                'SELECT banki_sawa FROM rinlaganis')).scalar(), 700)
+            self.assertEqual(connection.execute(text(
+                'SELECT money_in_paisa FROM settings')).scalar(), 0)
+        # 30 sawa asulis are filled in batches of 7
+        self.assertIn(('Filling dates of sawaasulis', 7, 30), steps)
+        self.assertIn(('Filling dates of sawaasulis', 30, 30), steps)
+        self.assertEqual(migrate(self.engine), [])
+
+    def test_new_database(self):
+        initialize_database(self.engine, lambda *args: self.fail())
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), SCHEMA_VERSION)
+        self.assertEqual(migrate(self.engine), [])
+
+    def test_recreate_ledger_triggers(self):
+        initialize_database(self.engine)
+        self.create_old_ledger_triggers()
+        with self.engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO members VALUES (1, 1, 'Member 1')"))
+            connection.execute(text(
+                "INSERT INTO rinlaganis (id, date, date_ordinal, amount, "
+                "is_alya_rin, kista_per_month, member_id) VALUES "
+                "(1, '2078-01-01', 1, 1000, 0, 25, 1)"))
+            connection.execute(text(
+                "INSERT INTO sawaasulis (id, date, date_ordinal, amount, "
+                "byaj, harjana, bachat, rin_lagani_id, member_id) VALUES "
+                "(1, '2078-02-01', 2, 10, 1, 0, 0, 1, 1), "
+                "(2, '2078-02-02', 3, 10, 1, 0, 0, 1, 1)"))
+        self.assertEqual(migrate(self.engine), [7])
+        self.assert_not_latest()
+        # migration replaces the triggers by itself
+        self.create_old_ledger_triggers()
+        migrations.recreate_triggers(self.engine, None)
+        self.assert_not_latest()
+
+    def create_old_ledger_triggers(self):
+        connection = sqlite3.connect(self.path)
+        connection.executescript(
+            OLD_LEDGER_UPDATE_TRIGGERS.format(table='rinlaganis')
+            + OLD_LEDGER_UPDATE_TRIGGERS.format(table='sawaasulis')
+            + 'DELETE FROM schema_versions WHERE version = 7;')
+        connection.close()
+
+    def assert_not_latest(self):
+        # older sawa asuli can not be edited
+        with self.assertRaisesRegex(exc.IntegrityError, 'not_latest'):
+            with self.engine.begin() as connection:
+                connection.execute(text(
+                    'UPDATE sawaasulis SET amount = 20 WHERE id = 1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from bs_calendar import days_in_month
+from util import (str_to_date, date_to_str, date_cache_info,
+                  clear_date_cache, date_to_ordinal)
+
+
+class TestUtil(unittest.TestCase):
+    def setUp(self):
+        clear_date_cache()
+
+    def test_date_cache(self):
+        date = str_to_date('2078-01-05')
+        self.assertIs(str_to_date('2078-01-05'), date)
+        self.assertIsNone(str_to_date('2078-01-40'))
+        self.assertEqual(date_to_str(date), '2078-01-05')
+        self.assertEqual(date_to_str(date.replace(day=6)), '2078-01-06')
+        self.assertEqual(date_to_str(str_to_date('2078-01-05')), '2078-01-05')
+        info = date_cache_info()
+        self.assertEqual((info['str_to_date'].hits,
+                          info['str_to_date'].misses), (2, 2))
+        self.assertEqual((info['date_to_str'].hits,
+                          info['date_to_str'].misses), (1, 2))
+        clear_date_cache()
+        self.assertEqual(date_cache_info()['str_to_date'].currsize, 0)
+
+    def test_date_to_ordinal(self):
+        # last day of a month is followed by the first day of the next
+        last_day = f'2078-01-{days_in_month(2078, 1):02}'
+        self.assertEqual(date_to_ordinal(last_day) + 1,
+                         date_to_ordinal('2078-02-01'))
+        self.assertLess(date_to_ordinal('2078-01-05'),
+                        date_to_ordinal(last_day))
+        self.assertLess(date_to_ordinal('2077-12-30'),
+                        date_to_ordinal('2078-01-01'))
+        for invalid in ('2078-01-40', '2078-13-01', 'abc', '', None):
+            self.assertIsNone(date_to_ordinal(invalid))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from backup import backup_database, restore_backup
+from database import Member, RinLagani, SawaAsuli
+from migrations import initialize_database
+from working_copy import WorkingCopy
+
+
+class TestWorkingCopy(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'data.db')
+        engine = create_engine(f'sqlite:///{self.path}')
+        initialize_database(engine)
+        with sessionmaker(bind=engine).begin() as session:
+            session.add(Member(id=1, account_no=1, name='Gaurab'))
+        engine.dispose()
+        self.copies = []
+
+    def tearDown(self):
+        for copy in self.copies:
+            copy.close()
+        self.directory.cleanup()
+
+    def open(self, write_behind):
+        copy = WorkingCopy(self.path, write_behind)
+        self.copies.append(copy)
+        return copy, sessionmaker(bind=copy.engine)
+
+    def disk_rows(self, statement):
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(statement).fetchall()
+        finally:
+            connection.close()
+
+    def add_rin_lagani(self, Session, id):
+        # a member can not have two uncleared rin laganis
+        with Session.begin() as session:
+            if session.get(Member, id) is None:
+                session.add(Member(id=id, account_no=id, name=f'Member {id}'))
+            session.add(RinLagani(id=id, date='2078-01-05',
+                                  amount=Decimal(4000),
+                                  kista_per_month=Decimal(100), member_id=id))
+
+    def test_synchronous_mirroring(self):
+        copy, Session = self.open(write_behind=False)
+        with Session.begin() as session:
+            self.assertEqual(session.get(Member, 1).name, 'Gaurab')
+        self.add_rin_lagani(Session, 1)
+        with Session.begin() as session:
+            session.add(SawaAsuli(date='2078-02-05', amount=Decimal(100),
+                                  byaj=Decimal(0), harjana=Decimal(0),
+                                  bachat=Decimal(0), rin_lagani_id=1,
+                                  member_id=1))
+            # rolled back savepoint is not mirrored
+            savepoint = session.begin_nested()
+            session.add(Member(id=2, account_no=2, name='Sameer'))
+            session.flush()
+            savepoint.rollback()
+        # rolled back transaction is not mirrored
+        with self.assertRaises(ZeroDivisionError):
+            with Session.begin() as session:
+                session.add(Member(id=3, account_no=3, name='Ramesh'))
+                session.flush()
+                1 / 0
+        # file is written before commit returns, triggers ran on the file
+        self.assertEqual(self.disk_rows(
+            'SELECT id, banki_sawa FROM rinlaganis'), [(1, 3900)])
+        self.assertEqual(self.disk_rows('SELECT id FROM members'), [(1,)])
+        self.assertEqual(self.disk_rows(
+            'SELECT sawa_asuli FROM member_totals'), [(100,)])
+
+    def test_write_behind_keeps_committed_prefix(self):
+        copy, Session = self.open(write_behind=True)
+        self.add_rin_lagani(Session, 1)
+        copy.flush()
+        # hold the file lock so that the writer can not write next commit
+        lock = sqlite3.connect(self.path, isolation_level=None)
+        lock.execute('BEGIN EXCLUSIVE')
+        self.add_rin_lagani(Session, 2)
+        with Session.begin() as session:
+            self.assertEqual(session.query(RinLagani).count(), 2)
+        # a crash now leaves the file with the transactions written so far
+        self.assertEqual(lock.execute(
+            'SELECT id FROM rinlaganis').fetchall(), [(1,)])
+        lock.execute('COMMIT')
+        lock.close()
+        copy.flush()
+        self.assertEqual(self.disk_rows('SELECT id FROM rinlaganis'),
+                         [(1,), (2,)])
+        # restart loads the file again
+        copy.close()
+        self.copies.remove(copy)
+        copy, Session = self.open(write_behind=False)
+        with Session.begin() as session:
+            self.assertEqual(session.query(RinLagani).count(), 2)
+
+    def test_backup_has_write_behind_writes(self):
+        copy, Session = self.open(write_behind=True)
+        write = copy.write
+
+        def slow_write(statements):
+            time.sleep(0.2)
+            write(statements)
+
+        copy.write = slow_write
+        self.add_rin_lagani(Session, 1)
+        # backup waits for the queued write
+        backup_path = backup_database(
+            self.path, os.path.join(self.directory.name, 'backups'))
+        restored = os.path.join(self.directory.name, 'restored.db')
+        restore_backup(backup_path, restored)
+        connection = sqlite3.connect(restored)
+        try:
+            self.assertEqual(connection.execute(
+                'SELECT id FROM rinlaganis').fetchall(), [(1,)])
+        finally:
+            connection.close()
+
+    def test_synchronous_failure_rolls_back_copy(self):
+        copy, Session = self.open(write_behind=False)
+        connection = sqlite3.connect(self.path)
+        connection.execute("INSERT INTO members (id, account_no, name) "
+                           "VALUES (2, 2, 'Sameer')")
+        connection.commit()
+        connection.close()
+        with self.assertRaises(sqlite3.IntegrityError):
+            with Session.begin() as session:
+                session.add(Member(id=2, account_no=3, name='Ramesh'))
+        with Session.begin() as session:
+            self.assertIsNone(session.get(Member, 2))
+
+    def test_failed_write_stops_mirroring(self):
+        copy, Session = self.open(write_behind=True)
+        # file and copy disagree, replaying the insert fails
+        connection = sqlite3.connect(self.path)
+        connection.execute("INSERT INTO members (id, account_no, name) "
+                           "VALUES (2, 2, 'Sameer')")
+        connection.commit()
+        connection.close()
+        with Session.begin() as session:
+            session.add(Member(id=2, account_no=3, name='Ramesh'))
+        with self.assertRaises(sqlite3.IntegrityError):
+            copy.flush()
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.add_rin_lagani(Session, 1)
+        self.assertEqual(self.disk_rows('SELECT COUNT(*) FROM rinlaganis'),
+                         [(0,)])
+        self.copies.remove(copy)
+        with self.assertRaises(sqlite3.IntegrityError):
+            copy.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,16 @@
+from functools import lru_cache
+
 import nepali_datetime
 
 from PySide2.QtCore import Qt
 
+import bs_calendar
+
+
+# bounded number of distinct date strings kept by the parse and format caches,
+# a few decades of days
+DATE_CACHE_SIZE = 16384
+
 
 def date_to_str(date):
     """
@@ -9,12 +18,20 @@ def date_to_str(date):
     :param date: nepali_datetime.date object to be formatted
     :return nepali_datetime.date object formatted to string
     """
-    return date.strftime("%Y-%m-%d")
+    # nepali_datetime.date is not hashable, cache by its fields instead
+    return _format_date(date.year, date.month, date.day)
+
 
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _format_date(year, month, day):
+    return nepali_datetime.date(year, month, day).strftime("%Y-%m-%d")
 
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
 def str_to_date(date_string):
     """
-    Convert a string in format %Y-%m-%d to nepali_datetime.date object
+    Convert a string in format %Y-%m-%d to nepali_datetime.date object.
+    Results are cached, which is safe as the date objects are immutable.
     :param date_string: date string to be converted
     :return: nepali_datetime.date object
     """
@@ -30,6 +47,35 @@ def str_to_date(date_string):
     return date
 
 
+def date_cache_info():
+    """
+    Return hit and miss counters of the date parse and format caches
+    :return: dict of cache name to functools cache info
+    """
+    return {'str_to_date': str_to_date.cache_info(),
+            'date_to_str': _format_date.cache_info()}
+
+
+def clear_date_cache():
+    """
+    Empty the date parse and format caches and reset their counters
+    """
+    str_to_date.cache_clear()
+    _format_date.cache_clear()
+
+
+def date_to_ordinal(date_string):
+    """
+    Convert a string in format %Y-%m-%d to its day ordinal. Ordinals sort the
+    same way as the dates they represent.
+    :param date_string: date string to be converted
+    :return: day ordinal or None if the date string is not valid
+    """
+    if date_string is None:
+        return None
+    return bs_calendar.parse_ordinal(date_string)
+
+
 def get_previous_month_date(dt):
     """
     Return a date with month just before the given date's month
@@ -37,10 +83,10 @@ def get_previous_month_date(dt):
     :return: date with previous month
     """
     if dt.month - 1 == 0:
-        days = nepali_datetime._days_in_month(dt.year - 1, 12)
+        days = bs_calendar.days_in_month(dt.year - 1, 12)
         return dt.replace(year=dt.year - 1, month=12, day=days)
     else:
-        days = nepali_datetime._days_in_month(dt.year, dt.month - 1)
+        days = bs_calendar.days_in_month(dt.year, dt.month - 1)
         return dt.replace(month=dt.month - 1, day=days)
 
 
@@ -71,7 +117,7 @@ def get_month_end(dt):
     :param dt: nepali_datetime.date object
     :return: ending date of month
     """
-    return dt.replace(day=nepali_datetime._days_in_month(dt.year, dt.month))
+    return dt.replace(day=bs_calendar.days_in_month(dt.year, dt.month))
 
 
 def is_date_end_of_month(dt):
@@ -80,7 +126,7 @@ def is_date_end_of_month(dt):
     :param dt: nepali_datetime.date object
     :return: True of False, if the given date is the last date in the given date's month
     """
-    if dt.day == nepali_datetime._days_in_month(dt.year, dt.month):
+    if dt.day == bs_calendar.days_in_month(dt.year, dt.month):
         return True
     return False
 
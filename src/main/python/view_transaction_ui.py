@@ -1,4 +1,3 @@
-import datetime
 from decimal import Decimal
 
 from PySide2.QtCore import Qt
@@ -6,7 +5,8 @@ from PySide2.QtWidgets import QMainWindow, QLabel, QFormLayout, QWidget
 
 from database import Session, RinLagani
 from database_access import get_rin_lagani_by_id, get_sawa_asuli_by_id
-from util import str_to_date, date_to_str
+from bs_calendar import days_between, ordinal_to_str
+from util import date_to_ordinal
 
 
 class ViewTransactionWindow(QMainWindow):
@@ -112,9 +112,7 @@ class ViewTransactionWindow(QMainWindow):
                     self.lagani_rin_label.setText(str(banki_sawa))
                     self.kista_per_month_label.setText(
                         str(sawa_asuli.rin_lagani.kista_per_month))
-                    time_delta = str_to_date(sawa_asuli.date) - str_to_date(
-                        start_date)
-                    days = time_delta.days
+                    days = days_between(start_date, sawa_asuli.date)
                     self.days_label.setText(str(days))
                     byaj_per_day = ((banki_sawa * Decimal('0.12'))
                                     / Decimal('365'))
@@ -137,20 +135,19 @@ class ViewTransactionWindow(QMainWindow):
     def get_start_date_and_banki_sawa(self, sawa_asuli):
         # get date of transaction just before this transaction
         transactions = sawa_asuli.rin_lagani.sawa_asulis
-        transactions.sort(key=lambda tx: str_to_date(tx.date))
+        transactions.sort(key=lambda tx: date_to_ordinal(tx.date))
 
-        dt = str_to_date(sawa_asuli.date)
+        dt = date_to_ordinal(sawa_asuli.date)
         before_date = sawa_asuli.rin_lagani.date
         banki_sawa = sawa_asuli.rin_lagani.amount
         # ignore rin lagani in calculations
         for asuli in transactions[1:]:
-            if str_to_date(asuli.date) >= dt:
+            if date_to_ordinal(asuli.date) >= dt:
                 break
             banki_sawa -= asuli.amount
             before_date = asuli.date
         # if before transaction is sawa asuli then banki sawa is mot equal to the rin lagani amount
         if banki_sawa != sawa_asuli.rin_lagani.amount:
-            before_date = date_to_str(
-                str_to_date(before_date) + datetime.timedelta(days=1))
+            before_date = ordinal_to_str(date_to_ordinal(before_date) + 1)
 
         return before_date, banki_sawa
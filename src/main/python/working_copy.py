@@ -0,0 +1,186 @@
+"""
+In memory working copy of a database file. The file is loaded into memory
+with the sqlite3 backup API, every read is served from memory and every
+committed write is mirrored to the file.
+
+Writes are mirrored by replaying the INSERT, UPDATE, DELETE and DDL
+statements of each committed transaction on the file in a single file
+transaction. The file has the same schema and triggers as the copy, so
+replaying the statements leaves both databases equal.
+
+Crash recovery:
+
+* synchronous mode: a transaction is committed to the file before it is
+  committed in memory. If the file write fails the memory transaction is not
+  committed either. After a crash the file has every transaction that was
+  reported as saved.
+* write-behind mode: committed transactions are queued and written to the
+  file in commit order by a writer thread, each in its own file transaction.
+  After a crash the file holds a prefix of the committed transactions, never
+  a part of a transaction, so it is always consistent. Transactions still in
+  the queue are lost. flush() returns only after every queued transaction is
+  on the file. If writing a transaction fails, no later transaction is
+  written and the error is raised by the next commit or flush.
+
+No recovery step is needed after a crash, the next start loads the file
+again. Backups of the file flush the queue first, see flush_working_copy.
+"""
+import os
+import queue
+import sqlite3
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from database import (STORAGE_PROFILES, track_money_storage,
+                      use_explicit_transactions)
+
+# statements changing the database, anything else is not mirrored
+MIRRORED_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE',
+                       'DROP', 'ALTER')
+
+# open working copies by absolute path of their database file
+OPEN_COPIES = {}
+
+
+def flush_working_copy(path):
+    """
+    Wait until writes of the working copy of a database file, if one is
+    open, are on the file, so that a copy of the file taken next has them.
+    :param path: database file path
+    """
+    copy = OPEN_COPIES.get(os.path.abspath(path))
+    if copy is not None:
+        copy.flush()
+
+
+class WorkingCopy:
+    """In memory copy of a database file mirroring its writes to the file"""
+
+    def __init__(self, path, write_behind=False, profile='default'):
+        """
+        Load database file into memory
+        :param path: database file path
+        :param write_behind: queue writes to the file instead of writing them
+        before the memory commit
+        :param profile: storage profile of the file connection
+        """
+        self.path = path
+        self.write_behind = write_behind
+        self.disk = sqlite3.connect(path, isolation_level=None,
+                                    check_same_thread=False)
+        for name, value in STORAGE_PROFILES[profile].items():
+            self.disk.execute(f'PRAGMA {name} = {value}')
+        self.memory = sqlite3.connect(':memory:', check_same_thread=False)
+        self.disk.backup(self.memory)
+        # URL keeps the file path for backups and archives, connections
+        # always come from creator
+        self.engine = create_engine(f'sqlite:///{path}',
+                                    creator=lambda: self.memory,
+                                    poolclass=StaticPool)
+        use_explicit_transactions(self.engine)
+        track_money_storage(self.engine)
+        # statements of the current transaction and positions of its open
+        # savepoints, innermost last
+        self.pending = []
+        self.savepoints = []
+        self.error = None
+        self.queue = None
+        if write_behind:
+            self.queue = queue.Queue()
+            self.writer = threading.Thread(target=self.write_queued,
+                                           daemon=True)
+            self.writer.start()
+        event.listen(self.engine, 'after_cursor_execute', self.capture)
+        event.listen(self.engine, 'commit', self.on_commit)
+        event.listen(self.engine, 'rollback', self.on_rollback)
+        event.listen(self.engine, 'savepoint', self.on_savepoint)
+        event.listen(self.engine, 'rollback_savepoint',
+                     self.on_rollback_savepoint)
+        event.listen(self.engine, 'release_savepoint',
+                     self.on_release_savepoint)
+        OPEN_COPIES[os.path.abspath(path)] = self
+
+    def capture(self, connection, cursor, statement, parameters, context,
+                executemany):
+        if context is not None and \
+                not context.execution_options.get('mirror', True):
+            return
+        if statement.lstrip().upper().startswith(MIRRORED_STATEMENTS):
+            self.pending.append((statement, parameters, executemany))
+
+    def on_commit(self, connection):
+        statements, self.pending = self.pending, []
+        self.savepoints.clear()
+        if self.error is not None:
+            raise self.error
+        if not statements:
+            return
+        if self.write_behind:
+            self.queue.put(statements)
+        else:
+            self.write(statements)
+
+    def on_rollback(self, connection):
+        self.pending = []
+        self.savepoints.clear()
+
+    def on_savepoint(self, connection, name):
+        self.savepoints.append(len(self.pending))
+
+    def on_rollback_savepoint(self, connection, name, context):
+        del self.pending[self.savepoints.pop():]
+
+    def on_release_savepoint(self, connection, name, context):
+        self.savepoints.pop()
+
+    def write(self, statements):
+        """
+        Replay statements of a committed transaction on the file
+        :param statements: list of statement, parameters and executemany
+        """
+        self.disk.execute('BEGIN IMMEDIATE')
+        try:
+            for statement, parameters, executemany in statements:
+                if executemany:
+                    self.disk.executemany(statement, parameters)
+                else:
+                    self.disk.execute(statement, parameters)
+        except Exception:
+            self.disk.execute('ROLLBACK')
+            raise
+        self.disk.execute('COMMIT')
+
+    def write_queued(self):
+        while True:
+            statements = self.queue.get()
+            try:
+                if statements is None:
+                    return
+                if self.error is None:
+                    self.write(statements)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until every committed transaction is written to the file."""
+        if self.queue is not None:
+            self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Flush queued writes and close both databases."""
+        OPEN_COPIES.pop(os.path.abspath(self.path), None)
+        try:
+            self.flush()
+        finally:
+            if self.queue is not None:
+                self.queue.put(None)
+                self.writer.join()
+            self.engine.dispose()
+            self.memory.close()
+            self.disk.close()